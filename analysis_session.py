@@ -0,0 +1,78 @@
+from collections import deque
+from datetime import datetime
+
+from metrics import process as process_metrics
+
+
+class AnalysisSession:
+    """Everything one attendance check or call mutates while it is analysed.
+
+    Models and the gallery are shared, read-only and live in model_registry;
+    the per-call counters, identity results, face tracker, emotion worker and
+    a bounded list of recent events live here. Each session is driven by one
+    thread at a time, so the frame functions touch no shared mutable state
+    and need no locks.
+
+    ``voice_monitor`` is fed by the caller's audio track and is not closed by
+    ``close``; its owner does that.
+    """
+
+    __slots__ = (
+        "name",
+        "gender",
+        "name_confidence",
+        "gender_confidence",
+        "quality",
+        "lie_detected",
+        "events",
+        "frame_count",
+        "lie_signs",
+        "audio_lie_signs",
+        "tracker",
+        "quality_gate",
+        "detector",
+        "emotion_worker",
+        "voice_monitor",
+        "metrics",
+    )
+
+    def __init__(self, detector, tracker=None, emotion_worker=None, voice_monitor=None, quality_gate=None,
+                 metrics=None, max_events=500):
+        self.detector = detector
+        # Per-session timers/counters, or straight to the process totals
+        self.metrics = metrics or process_metrics
+        self.tracker = tracker
+        self.quality_gate = quality_gate
+        self.emotion_worker = emotion_worker
+        self.voice_monitor = voice_monitor
+        self.events = deque(maxlen=max_events)
+        self.reset()
+
+    def reset(self):
+        self.name = None
+        self.gender = None
+        self.name_confidence = 0.0
+        self.gender_confidence = 0.0
+        self.quality = None
+        self.lie_detected = False
+        self.events.clear()
+        self.frame_count = 0
+        self.lie_signs = 0
+        self.audio_lie_signs = 0
+        if self.tracker is not None:
+            self.tracker.reset()
+        if self.quality_gate is not None:
+            self.quality_gate.reset()
+
+    def record_event(self, info, timestamp=None):
+        timestamp = timestamp or datetime.now().strftime("%H:%M:%S")
+        self.lie_detected = True
+        self.events.append((timestamp, info))
+        return timestamp
+
+    def results(self):
+        return self.name, self.gender, self.lie_detected, list(self.events)
+
+    def close(self):
+        if self.emotion_worker is not None:
+            self.emotion_worker.close()
@@ -0,0 +1,226 @@
+"""Approximate kNN (IVF) for galleries too large to search exactly.
+
+Rows are reduced to ``dim`` dimensions with a fixed random projection and
+clustered with k-means into ``nlist`` partitions. A query visits the
+``nprobe`` partitions with the nearest centroids, ranks their rows by
+projected distance and re-ranks the best ``refine`` of them with exact
+distances on the full pixel vectors. Returned distances are therefore
+exact; only the candidate set is approximate. Raising nprobe or refine
+trades latency for recall (benchmarks/ann_bench.py measures both).
+
+The index covers the gallery segments that existed when it was built;
+segments enrolled later are searched exactly until the next build.
+
+    python ann_index.py build [--nlist 1024] [--dim 64]
+    python ann_index.py info
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from face_search import GallerySearch, SegmentedGallerySearch
+
+INDEX_FILE = 'ann_index.npz'
+
+
+def random_projection(dim_in, dim_out, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal((dim_in, dim_out)) / np.sqrt(dim_out)).astype(np.float32)
+
+
+def project(matrices, projection, chunk=4096):
+    """Project the rows of several (memory-mapped) matrices in chunks; one float32 array."""
+    rows = sum(m.shape[0] for m in matrices)
+    out = np.empty((rows, projection.shape[1]), dtype=np.float32)
+    start = 0
+    for matrix in matrices:
+        for first in range(0, matrix.shape[0], chunk):
+            block = np.asarray(matrix[first:first + chunk], dtype=np.float32)
+            out[start:start + len(block)] = block @ projection
+            start += len(block)
+    return out
+
+
+def _nearest(points, centroids, chunk=65536):
+    c_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels = np.empty(len(points), dtype=np.int64)
+    for first in range(0, len(points), chunk):
+        block = points[first:first + chunk]
+        labels[first:first + chunk] = np.argmin(c_norms[None, :] - 2.0 * (block @ centroids.T), axis=1)
+    return labels
+
+
+def kmeans(points, nlist, iterations=10, sample=256, seed=0):
+    """Lloyd's k-means on at most ``sample`` points per centroid; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    if len(points) > nlist * sample:
+        points = points[np.sort(rng.choice(len(points), nlist * sample, replace=False))]
+    centroids = points[rng.choice(len(points), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(points, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Restart empty partitions on random points
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), len(empty), replace=False)]
+    return centroids
+
+
+class IvfIndex:
+    """Partitioned projected rows of a set of gallery segments.
+
+    ``projected`` and ``rows`` are stored partition by partition, so a
+    partition is the contiguous slice ``offsets[i]:offsets[i + 1]``.
+    ``rows`` are indices into the covered segments concatenated in order.
+    """
+
+    def __init__(self, projection, centroids, offsets, rows, projected, segments):
+        self.projection = projection
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.projected = projected
+        self.segments = segments
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, matrices, segments=(), nlist=None, dim=64, iterations=10, seed=0):
+        """Index the rows of ``matrices`` (one per segment, named by ``segments``)."""
+        dim_in = matrices[0].shape[1]
+        projection = random_projection(dim_in, dim, seed)
+        points = project(matrices, projection)
+        # About 4 * sqrt(rows) partitions keeps both the centroid scan and
+        # the partitions themselves short
+        nlist = min(nlist or max(int(4 * np.sqrt(len(points))), 1), len(points))
+        centroids = kmeans(points, nlist, iterations, seed=seed)
+        labels = _nearest(points, centroids)
+        rows = np.argsort(labels, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=nlist)))).astype(np.int64)
+        return cls(projection, centroids, offsets, rows.astype(np.int64), points[rows], list(segments))
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, projection=self.projection, centroids=self.centroids, offsets=self.offsets,
+                     rows=self.rows, projected=self.projected,
+                     segments=np.array(json.dumps(self.segments)))
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['projection'], data['centroids'], data['offsets'], data['rows'],
+                       data['projected'], json.loads(str(data['segments'])))
+
+    def covers(self, segments):
+        """True when the index was built over the first segments of ``segments`` (file names)."""
+        return self.segments == list(segments[:len(self.segments)])
+
+    def candidates(self, query, nprobe, refine):
+        """Covered-row indices of the ``refine`` nearest rows (by projected distance) in the nearest partitions."""
+        q = query.astype(np.float32) @ self.projection
+        d2 = np.einsum('ij,ij->i', self.centroids - q, self.centroids - q)
+        nprobe = min(nprobe, len(d2))
+        lists = np.argpartition(d2, nprobe - 1)[:nprobe]
+        picks = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+        if len(picks) > refine:
+            diff = self.projected[picks] - q
+            picks = picks[np.argpartition(np.einsum('ij,ij->i', diff, diff), refine - 1)[:refine]]
+        return self.rows[picks]
+
+
+class AnnGallerySearch(GallerySearch):
+    """GallerySearch over the segments an IvfIndex covers, answered from the index."""
+
+    def __init__(self, index, searches, nprobe=8, refine=64):
+        self.index = index
+        self.searches = list(searches)
+        self.offsets = np.cumsum([0] + [len(s) for s in self.searches])
+        self.labels = np.concatenate([s.labels for s in self.searches])
+        self.num_classes = int(self.labels.max()) + 1 if self.labels.size else 0
+        self.nprobe = nprobe
+        self.refine = refine
+        self._exact = SegmentedGallerySearch(self.searches)
+        if len(index) != len(self):
+            raise ValueError(f"Index covers {len(index)} rows, the segments have {len(self)}")
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _rows(self, indices):
+        segment = np.searchsorted(self.offsets, indices, side='right') - 1
+        rows = np.empty((len(indices), self.searches[0].matrix.shape[1]), dtype=np.float64)
+        for s in np.unique(segment):
+            mask = segment == s
+            rows[mask] = self.searches[s].matrix[indices[mask] - self.offsets[s]]
+        return rows
+
+    def neighbours(self, queries, k=5):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+        k = min(k, len(self))
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        distances = np.empty((queries.shape[0], k), dtype=np.float64)
+        for row, query in enumerate(queries):
+            cand = self.index.candidates(query, self.nprobe, max(self.refine, k))
+            if len(cand) < k:
+                # Too few rows in the probed partitions: answer exactly
+                i, d = self._exact.neighbours(query, k)
+                indices[row], distances[row] = i[0], d[0]
+                continue
+            diff = self._rows(cand) - query
+            exact = np.einsum('ij,ij->i', diff, diff)
+            order = np.lexsort((cand, exact))[:k]
+            indices[row] = cand[order]
+            distances[row] = exact[order]
+        return indices, distances
+
+
+def index_path(gallery_dir):
+    return os.path.join(gallery_dir, INDEX_FILE)
+
+
+def build_index(gallery_dir, nlist=None, dim=64, iterations=10, seed=0):
+    """Index every segment of the current gallery snapshot and save it next to them."""
+    from face_gallery import open_snapshot
+
+    snapshot = open_snapshot(gallery_dir)
+    index = IvfIndex.build([s.matrix for s in snapshot.segments],
+                           [os.path.basename(s.path) for s in snapshot.segments],
+                           nlist, dim, iterations, seed)
+    index.save(index_path(gallery_dir))
+    return index
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import config
+
+    parser = argparse.ArgumentParser(description="Build the approximate kNN index for the face gallery")
+    parser.add_argument('command', choices=("build", "info"))
+    parser.add_argument('--gallery', default=config.GALLERY_DIR)
+    parser.add_argument('--nlist', type=int, help="partitions (default: about 4 * sqrt(rows))")
+    parser.add_argument('--dim', type=int, default=64, help="dimensions of the random projection")
+    parser.add_argument('--iterations', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = build_index(args.gallery, args.nlist, args.dim, args.iterations)
+        print(f"Indexed {len(index)} rows of {len(index.segments)} segments into {len(index.centroids)} "
+              f"partitions in {time.perf_counter() - started:.1f}s; saved {index_path(args.gallery)}. "
+              f"Set CERTICALL_ANN_INDEX=1 to use it.")
+    else:
+        index = IvfIndex.load(index_path(args.gallery))
+        sizes = np.diff(index.offsets)
+        print(f"{len(index)} rows, {len(index.centroids)} partitions of {sizes.mean():.0f} rows "
+              f"(largest {sizes.max()}), {index.projection.shape[1]} dims, segments {', '.join(index.segments)}")
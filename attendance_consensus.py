@@ -0,0 +1,107 @@
+import time
+from collections import defaultdict
+
+
+class AttendanceConsensus:
+    """Accumulates per-frame identity/gender votes until they agree.
+
+    Each frame with a face adds its name and gender, weighted by the model
+    confidences and the frame's quality score. Frames whose name confidence
+    is below ``min_confidence``, or that were skipped for poor quality, are
+    counted as seen but don't vote. The check is decided as soon as one
+    name has ``min_frames`` votes and at least ``agreement`` of the total
+    vote weight. It fails as soon as no face has been seen for
+    ``no_face_timeout_s``. When ``timeout_s`` runs out, ``finish`` returns
+    the leading name if it has at least one vote.
+    """
+
+    def __init__(self, min_frames=5, min_confidence=0.6, agreement=0.8, timeout_s=10.0,
+                 no_face_timeout_s=3.0, clock=time.monotonic):
+        self.min_frames = min_frames
+        self.min_confidence = min_confidence
+        self.agreement = agreement
+        self.timeout_s = timeout_s
+        self.no_face_timeout_s = no_face_timeout_s
+        self.clock = clock
+        self.started = self.last_face = clock()
+        self.frames = 0
+        self.face_frames = 0
+        self._name_weight = defaultdict(float)
+        self._name_votes = defaultdict(int)
+        self._gender_weight = defaultdict(lambda: defaultdict(float))
+        self.result = None
+        self.failure = None
+
+    @property
+    def done(self):
+        return self.result is not None or self.failure is not None
+
+    def add(self, name=None, gender=None, name_confidence=0.0, gender_confidence=0.0, quality=None):
+        """Record one frame; returns ``done``.
+
+        ``name`` is None when no usable face was found; pass the frame's
+        ``quality`` (None when there was no face at all) so skipped faces
+        still count as seen.
+        """
+        if self.done:
+            return True
+        now = self.clock()
+        self.frames += 1
+        if name is not None or quality is not None:
+            self.face_frames += 1
+            self.last_face = now
+        if name is not None and name_confidence >= self.min_confidence:
+            weight = 1.0 if quality is None else quality
+            self._name_weight[name] += name_confidence * weight
+            self._name_votes[name] += 1
+            self._gender_weight[name][gender] += gender_confidence * weight
+
+        leader = self.leader()
+        total = sum(self._name_weight.values())
+        if leader is not None and self._name_votes[leader] >= self.min_frames \
+                and self._name_weight[leader] >= self.agreement * total:
+            self._decide(leader)
+        elif now - self.last_face >= self.no_face_timeout_s:
+            self.failure = "no_face"
+        elif now - self.started >= self.timeout_s:
+            self.finish()
+        return self.done
+
+    def leader(self):
+        if not self._name_weight:
+            return None
+        return max(self._name_weight, key=self._name_weight.get)
+
+    def _decide(self, name):
+        genders = self._gender_weight[name]
+        self.result = (name, max(genders, key=genders.get))
+
+    def finish(self):
+        """Settle on the best result so far (or a failure); returns the result."""
+        if not self.done:
+            leader = self.leader()
+            if leader is not None:
+                self._decide(leader)
+            else:
+                self.failure = "no_face" if not self.face_frames else "low_confidence"
+        return self.result
+
+    def elapsed(self):
+        return self.clock() - self.started
+
+    def confidence(self):
+        """Vote share of the leading name so far."""
+        total = sum(self._name_weight.values())
+        leader = self.leader()
+        return self._name_weight[leader] / total if leader is not None else 0.0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "face_frames": self.face_frames,
+            "votes": dict(self._name_votes),
+            "confidence": self.confidence(),
+            "elapsed_s": self.elapsed(),
+            "result": self.result,
+            "failure": self.failure,
+        }
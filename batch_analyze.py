@@ -0,0 +1,373 @@
+"""Re-analyse recorded meetings without Streamlit.
+
+    python batch_analyze.py recordings/
+    python batch_analyze.py recordings/ --manifest recordings/manifest.csv --workers 8
+    python batch_analyze.py recordings/ --rescore      # after a model or threshold change
+
+Recordings are found as ``<dir>/<meeting_id>/<emp_id>.<video ext>`` with an
+optional ``<emp_id>.wav`` next to the video, or listed in a CSV manifest with
+meeting_id, emp_id, video and optional audio and start_time columns (paths
+relative to the directory). Without a start_time, the recording is assumed
+to end at the file's modification time.
+
+Each recording is cut into chunks of --chunk-frames frames that worker
+processes decode and analyse independently with the face_recog frame
+functions: the attendance check runs on the first ATTENDANCE_TIMEOUT_S
+seconds, the call analysis on every frame. Emotion and voice stress are
+sampled by video time rather than wall time, so results don't depend on how
+fast the machine is. Finished recordings are written in bulk, together with
+their row in batch_jobs, so an interrupted run picks up where it stopped;
+recordings already in batch_jobs with the same size and mtime are skipped
+unless --rescore is given.
+"""
+import csv
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import cv2
+import numpy as np
+
+import config
+import database as db
+
+VIDEO_EXTENSIONS = (".mp4", ".webm", ".mkv", ".avi", ".mov")
+
+
+def _recording(root, meeting_id, emp_id, video, audio=None, start_time=None):
+    video = os.path.join(root, video)
+    audio = os.path.join(root, audio) if audio else None
+    stat = os.stat(video)
+    signature = f"{stat.st_size}:{int(stat.st_mtime)}"
+    if audio:
+        audio_stat = os.stat(audio)
+        signature += f"/{audio_stat.st_size}:{int(audio_stat.st_mtime)}"
+    return {
+        "source": os.path.abspath(video),
+        "signature": signature,
+        "meeting_id": int(meeting_id),
+        "emp_id": str(emp_id),
+        "video": video,
+        "audio": audio,
+        "start_time": start_time or None,
+        "mtime": stat.st_mtime,
+    }
+
+
+def find_recordings(root, manifest=None):
+    """Every recording under ``root`` (or in ``manifest``), sorted by meeting and employee."""
+    recordings = []
+    if manifest:
+        with open(manifest, newline="") as f:
+            for row in csv.DictReader(f):
+                recordings.append(_recording(root, row["meeting_id"], row["emp_id"], row["video"],
+                                             row.get("audio"), row.get("start_time")))
+    else:
+        for meeting in sorted(os.listdir(root)):
+            folder = os.path.join(root, meeting)
+            if not (meeting.isdigit() and os.path.isdir(folder)):
+                continue
+            for fx in sorted(os.listdir(folder)):
+                emp_id, ext = os.path.splitext(fx)
+                if ext.lower() not in VIDEO_EXTENSIONS:
+                    continue
+                audio = os.path.join(meeting, emp_id + ".wav")
+                recordings.append(_recording(root, meeting, emp_id, os.path.join(meeting, fx),
+                                             audio if os.path.exists(os.path.join(root, audio)) else None))
+    return sorted(recordings, key=lambda r: (r["meeting_id"], r["emp_id"], r["source"]))
+
+
+def probe(recording):
+    """Fill in fps, frame count and the recording's start datetime."""
+    cap = cv2.VideoCapture(recording["video"])
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {recording['video']}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    recording["fps"] = fps if fps and fps > 0 else 30.0
+    # Some containers (e.g. browser-recorded webm) don't store a frame count
+    recording["frames"] = frames if frames > 0 else None
+    if recording["start_time"]:
+        recording["start"] = datetime.fromisoformat(recording["start_time"])
+    else:
+        duration = (recording["frames"] or 0) / recording["fps"]
+        recording["start"] = datetime.fromtimestamp(recording["mtime"]) - timedelta(seconds=duration)
+    return recording
+
+
+def plan_chunks(recording, chunk_frames):
+    """(first, end) frame ranges; one open-ended chunk when the length is unknown."""
+    if recording["frames"] is None:
+        return [(0, None)]
+    return [(first, min(first + chunk_frames, recording["frames"]))
+            for first in range(0, recording["frames"], chunk_frames)] or [(0, None)]
+
+
+def read_frames(path, first, end, every=1):
+    """(index, BGR frame) for every ``every``-th frame in [first, end); the rest are only grabbed."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if first:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        index = first
+        while end is None or index < end:
+            if (index - first) % every:
+                if not cap.grab():
+                    return
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                yield index, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+# Worker side: models are loaded once per worker process by _init_worker
+
+def _init_worker():
+    import face_recog
+
+    cv2.setNumThreads(1)
+    face_recog.warm_up(background=False)
+
+
+class _VideoClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def voice_events(path, first_s, end_s, monitor):
+    """(offset_s, pitch) for the stressed windows the live monitor would flag in [first_s, end_s).
+
+    The live monitor analyses the latest ``window_s`` seconds every ``hop_s``
+    seconds of new audio; the same windows are scored here, synchronously.
+    """
+    import scipy.io.wavfile as wav
+    from voice_features import to_float_mono
+
+    sr, samples = wav.read(path, mmap=True)
+    window, hop = int(monitor.window_s * sr), int(monitor.hop_s * sr)
+    limit = len(samples) if end_s is None else min(int(end_s * sr) - 1, len(samples))
+    events = []
+    # Window ends fall at window, window + hop, window + 2 * hop, ...; each
+    # chunk scores the ones inside its own span
+    step = max(int(np.ceil((first_s * sr - window) / hop)), 0)
+    while window + step * hop <= limit:
+        stop = window + step * hop
+        step += 1
+        y = to_float_mono(np.asarray(samples[stop - window:stop]))
+        if np.sqrt(np.mean(y * y)) < monitor.min_rms:
+            continue
+        pitch = float(monitor.analyze(y, sr)["pitch"])
+        if pitch > monitor.pitch_threshold:
+            events.append((stop / sr, pitch))
+    return events
+
+
+def analyze_chunk(recording, index, first, end, every, emotion_interval_s):
+    """Run the attendance check (first chunk only) and the call analysis over one chunk."""
+    import face_recog
+    from attendance_consensus import AttendanceConsensus
+    from emotion_worker import InlineEmotionWorker
+    from voice_stream import VoiceStressMonitor
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    fps = recording["fps"]
+    clock = _VideoClock()
+    call = face_recog.new_session()
+    call.emotion_worker.close()
+    call.emotion_worker = InlineEmotionWorker(lambda face: face_recog.inference_backend().emotion(face),
+                                              window_s=config.EMOTION_WINDOW_S, clock=clock,
+                                              interval_s=emotion_interval_s)
+
+    consensus = attendance = None
+    if index == 0:
+        attendance = face_recog.new_session()
+        consensus = AttendanceConsensus(
+            min_frames=config.ATTENDANCE_MIN_FRAMES,
+            min_confidence=config.ATTENDANCE_MIN_CONFIDENCE,
+            agreement=config.ATTENDANCE_AGREEMENT,
+            timeout_s=config.ATTENDANCE_TIMEOUT_S,
+            no_face_timeout_s=config.ATTENDANCE_NO_FACE_TIMEOUT_S,
+            clock=clock,
+        )
+
+    events = []
+    frames = 0
+    last = first
+    for last, frame in read_frames(recording["video"], first, end, every):
+        clock.now = last / fps
+        if consensus is not None and not consensus.done:
+            # Both frame functions draw on the frame
+            _, name, gender = face_recog.process_basic_info_frame(frame.copy(), attendance)
+            consensus.add(name, gender, attendance.name_confidence, attendance.gender_confidence,
+                          attendance.quality)
+        # The worker's update flag is consumed inside process_call_frame, so
+        # read the detection from its result
+        _, _, lie_info = face_recog.process_call_frame(frame, call)
+        if lie_info and lie_info.startswith("emotion:"):
+            events.append((clock.now, lie_info, None))
+        frames += 1
+
+    result = {
+        "index": index,
+        "frames": frames,
+        "end_s": (last + 1) / fps,
+        "emotion": call.emotion_worker.stats(),
+        "quality": face_recog.get_quality_stats(call),
+    }
+    if consensus is not None:
+        identity = consensus.finish()
+        result["identity"] = identity
+        result["attendance_failure"] = consensus.failure
+        attendance.close()
+    call.close()
+
+    if recording["audio"]:
+        end_s = end / fps if end is not None else None
+        monitor = VoiceStressMonitor(pitch_threshold=config.VOICE_PITCH_THRESHOLD_HZ)
+        events.extend((offset, "voice_stress", pitch)
+                      for offset, pitch in voice_events(recording["audio"], first / fps, end_s, monitor))
+
+    result["events"] = events
+    result["seconds"] = time.perf_counter() - started
+    result["cpu_seconds"] = time.process_time() - cpu_started
+    return result
+
+
+def merge_chunks(recording, chunks):
+    """One database result from all chunks of a recording."""
+    chunks = sorted(chunks, key=lambda c: c["index"])
+    identity = chunks[0].get("identity")
+    name, gender = identity if identity else (None, None)
+    start = recording["start"]
+    events = sorted((e for c in chunks for e in c["events"]), key=lambda e: e[0])
+    return {
+        "source": recording["source"],
+        "signature": recording["signature"],
+        "meeting_id": recording["meeting_id"],
+        "emp_id": recording["emp_id"],
+        "name": name,
+        "gender": gender,
+        "status": "identified" if identity else chunks[0].get("attendance_failure") or "unidentified",
+        "start": start,
+        "end": start + timedelta(seconds=max(c["end_s"] for c in chunks)),
+        "frames": sum(c["frames"] for c in chunks),
+        "events": [(start + timedelta(seconds=offset), info, score) for offset, info, score in events],
+    }
+
+
+def run(recordings, workers, chunk_frames=900, every=1, emotion_interval_s=0.5, commit_every=20):
+    """Analyse ``recordings`` on ``workers`` processes; returns throughput totals."""
+    jobs = []
+    for recording in recordings:
+        probe(recording)
+        recording["chunks"] = plan_chunks(recording, chunk_frames)
+        jobs.extend((recording, i, first, end) for i, (first, end) in enumerate(recording["chunks"]))
+
+    chunks = {r["source"]: [] for r in recordings}
+    remaining = {r["source"]: len(r["chunks"]) for r in recordings}
+    failed = set()
+    pending = []
+    totals = {"recordings": 0, "frames": 0, "cpu_seconds": 0.0, "failed": 0}
+
+    def flush():
+        if pending:
+            db.record_batch_results(pending)
+            pending.clear()
+
+    started = time.perf_counter()
+    # spawn: TensorFlow is not fork-safe, and the parent never loads the models
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker) as pool:
+        futures = {pool.submit(analyze_chunk, recording, i, first, end, every, emotion_interval_s): recording
+                   for recording, i, first, end in jobs}
+        try:
+            for future in as_completed(futures):
+                recording = futures[future]
+                source = recording["source"]
+                remaining[source] -= 1
+                try:
+                    chunk = future.result()
+                    chunks[source].append(chunk)
+                    totals["frames"] += chunk["frames"]
+                    totals["cpu_seconds"] += chunk["cpu_seconds"]
+                except Exception as e:
+                    print(f"Chunk of {source} failed: {e}")
+                    failed.add(source)
+                if remaining[source]:
+                    continue
+                if source in failed:
+                    # Left out of batch_jobs, so the next run retries it
+                    totals["failed"] += 1
+                    continue
+
+                result = merge_chunks(recording, chunks.pop(source))
+                pending.append(result)
+                totals["recordings"] += 1
+                who = f"{result['name']} ({result['gender']})" if result["name"] else result["status"]
+                print(f"[{totals['recordings']}/{len(recordings)}] meeting {result['meeting_id']} "
+                      f"{result['emp_id']}: {who}, {len(result['events'])} events, {result['frames']} frames")
+                if len(pending) >= commit_every:
+                    flush()
+        finally:
+            # Keep whatever finished before an interruption or error
+            flush()
+
+    totals["seconds"] = time.perf_counter() - started
+    totals["workers"] = workers
+    return totals
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Re-analyse recorded meetings and write the results to the database")
+    parser.add_argument('directory', help="recordings as <meeting_id>/<emp_id>.<ext>, or the manifest's base directory")
+    parser.add_argument('--manifest', help="CSV with meeting_id, emp_id, video[, audio, start_time] columns")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=1, help="model threads per worker process")
+    parser.add_argument('--chunk-frames', type=int, default=900, help="frames per work item")
+    parser.add_argument('--every', type=int, default=1, help="analyse every n-th frame (the rest are skipped undecoded)")
+    parser.add_argument('--emotion-interval', type=float, default=0.5,
+                        help="seconds of video between emotion analyses")
+    parser.add_argument('--commit-every', type=int, default=20, help="recordings per database transaction")
+    parser.add_argument('--rescore', action='store_true', help="re-analyse recordings that are already done")
+    parser.add_argument('--db', help="database file (default: CERTICALL_DB)")
+    args = parser.parse_args()
+
+    # Inherited by the spawned workers: one in-process model per worker,
+    # each limited to --threads so workers don't fight over cores
+    os.environ["CERTICALL_INFERENCE_SERVER"] = "0"
+    os.environ["CERTICALL_WARMUP"] = "0"
+    for var in ("CERTICALL_MODEL_THREADS", "OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ.setdefault(var, str(args.threads))
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    if args.db:
+        db.configure(args.db)
+    db.init_db()
+
+    recordings = find_recordings(args.directory, args.manifest)
+    finished = {} if args.rescore else db.get_batch_signatures()
+    todo = [r for r in recordings if finished.get(r["source"]) != r["signature"]]
+    print(f"{len(recordings)} recordings, {len(recordings) - len(todo)} already done, {len(todo)} to analyse "
+          f"on {args.workers} workers")
+    if not todo:
+        raise SystemExit(0)
+
+    totals = run(todo, args.workers, args.chunk_frames, args.every, args.emotion_interval, args.commit_every)
+    fps = totals["frames"] / totals["seconds"] if totals["seconds"] else 0.0
+    per_cpu = totals["frames"] / totals["cpu_seconds"] if totals["cpu_seconds"] else 0.0
+    print(f"{totals['recordings']} recordings, {totals['frames']} frames in {totals['seconds']:.1f}s: "
+          f"{fps:.1f} frames/s, {fps / args.workers:.1f} frames/s per worker core, "
+          f"{per_cpu:.1f} frames per CPU second")
+    if totals["failed"]:
+        raise SystemExit(f"{totals['failed']} recordings failed and will be retried on the next run")
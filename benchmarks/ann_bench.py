@@ -0,0 +1,79 @@
+"""Recall@k and query latency of the IVF index against exact GallerySearch.
+
+Synthetic galleries of growing size: every person is a shared "average face"
+plus their own offset, and every sample adds noise on top, so neighbours are
+not trivially separated. Queries are noisier copies of random samples.
+
+Run from the repository root:
+
+    python -m benchmarks.ann_bench --sizes 2000 8000 32000 --dim 3000 --nprobe 1 4 8 16
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import AnnGallerySearch, IvfIndex
+from face_search import GallerySearch
+
+
+def make_faces(rows, samples, dim, person_spread=40, noise=25, seed=0):
+    rng = np.random.default_rng(seed)
+    people = max(rows // samples, 1)
+    mean_face = rng.integers(60, 196, size=dim)
+    centers = mean_face + rng.integers(-person_spread, person_spread + 1, size=(people, dim))
+    data = np.repeat(centers, samples, axis=0)[:rows] + rng.integers(-noise, noise + 1, size=(rows, dim))
+    labels = np.repeat(np.arange(people), samples)[:rows]
+    return np.clip(data, 0, 255).astype(np.uint8), labels
+
+
+def per_query(search, queries, k):
+    results = []
+    start = time.perf_counter()
+    for q in queries:
+        results.append(search.neighbours(q, k)[0][0])
+    return np.array(results), (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 3000, 10000], help="gallery rows")
+    parser.add_argument('--samples', type=int, default=10, help="samples per person")
+    parser.add_argument('--dim', type=int, default=100 * 100 * 3)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--refine', type=int, default=64)
+    parser.add_argument('--nlist', type=int, help="partitions (default: about 4 * sqrt(rows))")
+    parser.add_argument('--proj-dim', type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'search':>10} {'ms/query':>9} {'speedup':>8} {f'recall@{args.k}':>9} {'vote':>6}")
+    for rows in args.sizes:
+        data, labels = make_faces(rows, args.samples, args.dim)
+        rng = np.random.default_rng(1)
+        picks = rng.integers(0, rows, size=args.queries)
+        queries = np.clip(data[picks].astype(np.int64) + rng.integers(-30, 31, size=(args.queries, args.dim)),
+                          0, 255).astype(np.float32)
+
+        exact = GallerySearch(data, labels)
+        del data
+        start = time.perf_counter()
+        index = IvfIndex.build([exact.matrix], nlist=args.nlist, dim=args.proj_dim)
+        build = time.perf_counter() - start
+
+        truth, exact_s = per_query(exact, queries, args.k)
+        truth_votes = [exact.vote(q, args.k)[0] for q in queries]
+        print(f"{rows:>7} {'exact':>10} {exact_s * 1000:9.2f} {'':>8} {'':>9} {'':>6}"
+              f"   (index: {len(index.centroids)} partitions, built in {build:.1f}s)")
+        for nprobe in args.nprobe:
+            ann = AnnGallerySearch(index, [exact], nprobe=nprobe, refine=args.refine)
+            found, ann_s = per_query(ann, queries, args.k)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            votes = np.mean([ann.vote(q, args.k)[0] == v for q, v in zip(queries, truth_votes)])
+            print(f"{'':>7} {f'nprobe={nprobe}':>10} {ann_s * 1000:9.2f} {exact_s / ann_s:7.1f}x "
+                  f"{recall:9.3f} {votes:6.3f}")
+
+
+if __name__ == '__main__':
+    main()
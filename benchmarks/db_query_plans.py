@@ -0,0 +1,88 @@
+"""Check that the hot database queries are served by indexes, not table scans.
+
+Builds a scratch database through database.migrate(), runs EXPLAIN QUERY PLAN
+on each query below and exits non-zero if any of them scans a whole table.
+Also upgrades a copy of an existing database when one is given, to check the
+in-place migration path.
+
+Run from the repository root:  python -m benchmarks.db_query_plans [meetings.db]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import database as db
+
+START, END = "2026-01-01 10:00:00", "2026-01-01 11:00:00"
+
+
+def _events(sql, *args, page=False, **kwargs):
+    where, params = db.event_filter(*args, **kwargs)
+    return sql.format(where=where), params + ([20, 0] if page else [])
+
+
+# Every statement with a WHERE clause that database.py runs outside migrations
+HOT_QUERIES = {
+    "verify_host": (db.VERIFY_HOST_SQL, ("a@b.c", "x")),
+    "verify_employee": (db.VERIFY_EMPLOYEE_SQL, (1, "e1", "x")),
+    "get_employee_password": (db.EMPLOYEE_PASSWORD_SQL, (1, "e1")),
+    "get_employees_for_meeting": (db.EMPLOYEES_FOR_MEETING_SQL, (1,)),
+    "get_meetings_for_host": (db.MEETINGS_FOR_HOST_SQL, (1,)),
+    "get_attendance_for_meeting": (db.ATTENDANCE_FOR_MEETING_SQL, (1,)),
+    "get_attendance_summary": (db.ATTENDANCE_SUMMARY_SQL, (1,)),
+    "get_attendance_summary (events)": (db.MEETING_EVENT_COUNT_SQL, (1,)),
+    "get_attendance_page": (db.ATTENDANCE_PAGE_SQL, (1, 25, 0)),
+    "add_suspicious_events (latest attendance)": (db.LATEST_ATTENDANCE_SQL, (1, "e1")),
+    "add_suspicious_events (flag)": (db.FLAG_ATTENDANCE_SQL, (1,)),
+    "record_batch_results (job)": (db.BATCH_JOB_SQL, ("/recordings/1/e1.mp4",)),
+    "record_batch_results (events)": (db.DELETE_ATTENDANCE_EVENTS_SQL, (1,)),
+    "record_batch_results (attendance)": (db.DELETE_ATTENDANCE_SQL, (1,)),
+    "record_batch_results (unattributed events)": (db.DELETE_UNATTRIBUTED_EVENTS_SQL, (1, "e1", START, END)),
+    "count_suspicious_events (meeting)": _events(db.EVENT_COUNT_SQL, 1),
+    "count_suspicious_events (employee)": _events(db.EVENT_COUNT_SQL, 1, "e1"),
+    "count_suspicious_events (row, range)": _events(db.EVENT_COUNT_SQL, 1, "e1", START, END, attendance_id=1),
+    "get_suspicious_events (employee)": _events(db.EVENTS_SQL, 1, "e1", START, END, page=True),
+    "get_suspicious_events (row, range)": _events(db.EVENTS_SQL, 1, "e1", START, END, attendance_id=1, page=True),
+    "get_event_range": _events(db.EVENT_RANGE_SQL, 1, "e1", attendance_id=1),
+}
+
+
+def check_plans():
+    failures = 0
+    for name, (sql, params) in HOT_QUERIES.items():
+        try:
+            plan = db.explain_query_plan(sql, params)
+        except Exception as e:
+            failures += 1
+            print(f"FAIL {name:44s} {e}")
+            continue
+        # "SCAN t" / "SCAN TABLE t" (older SQLite), also inside subqueries
+        scans = [step for step in plan if step.startswith("SCAN") and step != "SCAN CONSTANT ROW"]
+        status = "FAIL" if scans else "ok"
+        failures += bool(scans)
+        print(f"{status:4s} {name:44s} {' | '.join(plan)}")
+    return failures
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "meetings.db")
+        if len(sys.argv) > 1:
+            shutil.copy(sys.argv[1], path)
+        db.configure(path)
+        before = db.schema_version()
+        after = db.migrate()
+        print(f"schema version {before} -> {after}")
+        failures = check_plans()
+        db.close_connection()
+    finally:
+        shutil.rmtree(workdir)
+    if failures:
+        print(f"{failures} of {len(HOT_QUERIES)} hot queries failed the plan check")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare the reference knn() loop with GallerySearch on a synthetic gallery.
+
+Run from the repository root:  python -m benchmarks.knn_bench --people 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_search import GallerySearch, knn
+
+
+def make_gallery(people, samples, dim, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.integers(0, 256, size=(people, dim))
+    data = np.repeat(centers, samples, axis=0) + rng.integers(-20, 21, size=(people * samples, dim))
+    labels = np.repeat(np.arange(people), samples).reshape(-1, 1)
+    return np.clip(data, 0, 255).astype(np.uint8), labels
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--people', type=int, default=200)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--dim', type=int, default=100 * 100 * 3)
+    parser.add_argument('--queries', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    data, labels = make_gallery(args.people, args.samples, args.dim)
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, data.shape[0], size=args.queries)
+    queries = np.clip(data[picks].astype(np.int64) + rng.integers(-30, 31, size=(args.queries, args.dim)), 0, 255).astype(np.uint8)
+
+    start = time.perf_counter()
+    search = GallerySearch(data, labels)
+    build = time.perf_counter() - start
+
+    train = np.hstack((data, labels))
+    expected = [knn(train, q) for q in queries]
+    got = search.query(queries)
+    assert list(got) == [int(e) for e in expected], "GallerySearch disagrees with knn()"
+
+    old = timed(lambda: [knn(np.hstack((data, labels)), q) for q in queries], args.repeat) / args.queries
+    single = timed(lambda: [search.query(q) for q in queries], args.repeat) / args.queries
+    batched = timed(lambda: search.query(queries), args.repeat) / args.queries
+
+    print(f"gallery: {data.shape[0]} rows x {args.dim} dims, build {build * 1000:.1f} ms")
+    print(f"knn() per query:                {old * 1000:9.2f} ms")
+    print(f"GallerySearch per query:        {single * 1000:9.2f} ms  ({old / single:.0f}x)")
+    print(f"GallerySearch batched per query:{batched * 1000:9.2f} ms  ({old / batched:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Compare the old per-consumer face preprocessing with FacePreprocessor.
+
+"before" repeats what identify_face and the emotion path used to do per face:
+two 100x100 resizes, float64 /255 copies, a 96x96 resize for gender and a
+full-size crop copy for emotion. "after" fills the reused float32 buffers.
+Time is measured without tracing. Allocations are traced separately with
+tracemalloc, as the peak bytes allocated while handling one face (numpy and
+OpenCV arrays both report to it).
+
+Run from the repository root:  python -m benchmarks.preprocess_bench
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from face_preprocess import FacePreprocessor
+
+
+def before(face_roi):
+    flat = cv2.resize(face_roi, (100, 100)).flatten()
+    recognizer = cv2.resize(face_roi, (100, 100)) / 255.0
+    gender = cv2.resize(face_roi, (96, 96)) / 255.0
+    emotion = face_roi.copy()
+    return flat, recognizer, gender, emotion
+
+
+def after(preprocessor):
+    def run(face_roi):
+        inputs = preprocessor.prepare(face_roi)
+        emotion = inputs.face.copy()
+        return inputs.pixels, inputs.recognizer, inputs.gender, emotion
+    return run
+
+
+def make_faces(count, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    faces = []
+    for _ in range(count):
+        size = int(rng.integers(80, 260))
+        x, y = int(rng.integers(0, 640 - size)), int(rng.integers(0, 480 - size))
+        faces.append(frame[y:y + size, x:x + size])
+    return faces
+
+
+def per_frame_time(fn, faces, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for face in faces:
+            fn(face)
+        best = min(best, time.perf_counter() - start)
+    return best / len(faces)
+
+
+def per_frame_allocations(fn, faces):
+    fn(faces[0])
+    tracemalloc.start()
+    try:
+        total = 0
+        for face in faces:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            fn(face)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - base
+    finally:
+        tracemalloc.stop()
+    return total / len(faces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--faces', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    faces = make_faces(args.faces)
+    new = after(FacePreprocessor())
+    for label, fn in (("before", before), ("after", new)):
+        elapsed = per_frame_time(fn, faces, args.repeat)
+        allocated = per_frame_allocations(fn, faces)
+        print(f"{label:>6}: {elapsed * 1e6:8.1f} us/frame, {allocated / 1024:8.1f} KiB peak allocation/frame")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,15 @@
+"""Replay recorded or synthetic frames through the face_recog hot paths.
+
+No webcam, microphone, browser or model files are needed: frames come from a
+video file or are synthesised, call-mode audio comes from a WAV file or a
+synthetic voice, and the models, gallery and emotion analysis are stubs
+unless ``--models real`` is given. Every stage (detect, locate, quality,
+preprocess, recognize, gender, knn, emotion, voice and the whole frame) is
+timed, and latency percentiles, fps and peak RSS are saved as JSON so runs
+from different versions can be compared.
+
+Run from the repository root:
+
+    python -m benchmarks.replay --frames 600 --output before.json
+    python -m benchmarks.replay --video call.mp4 --audio call.wav --compare before.json
+"""
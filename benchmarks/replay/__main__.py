@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import face_recog
+from benchmarks.replay import sources, stubs
+from benchmarks.replay.timing import StageTimer, compare, print_summary
+from voice_features import VoiceAnalyzer
+from voice_stream import VoiceStressMonitor
+
+MODES = ("attendance", "call")
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def frames_for(args):
+    if args.video:
+        return sources.video_frames(args.video, args.frames, loop=args.loop)
+    return sources.synthetic_frames(args.frames)
+
+
+def audio_for(args, fps):
+    if args.no_audio:
+        return None
+    if args.audio:
+        samples, sr = sources.wav_audio(args.audio)
+    else:
+        samples, sr = sources.synthetic_audio(args.frames / fps + 1)
+    return sources.audio_chunks(samples, sr, fps), sr
+
+
+def replay(mode, args, timer, fps):
+    voice_monitor = None
+    audio = None
+    if mode == "call":
+        voice_monitor = VoiceStressMonitor(analyze=timer.wrap("voice", VoiceAnalyzer().features))
+        audio = audio_for(args, fps)
+    session = face_recog.new_session(voice_monitor=voice_monitor)
+    detector = stubs.BlobDetector() if args.detector == "blob" else None
+    stubs.instrument_session(session, timer, detector)
+
+    process = face_recog.process_basic_info_frame if mode == "attendance" else face_recog.process_call_frame
+    frame_timer = timer.wrap("frame", process)
+    count = 0
+    started = time.perf_counter()
+    for frame in frames_for(args):
+        if audio is not None:
+            chunks, sr = audio
+            chunk = next(chunks, None)
+            if chunk is not None:
+                voice_monitor.push(chunk, sr)
+        frame_timer(frame, session)
+        count += 1
+    elapsed = time.perf_counter() - started
+
+    # Let the background analyses finish before reading their stats
+    session.close()
+    result = {
+        "frames": count,
+        "seconds": elapsed,
+        "fps": count / elapsed if elapsed else 0.0,
+        "tracking": face_recog.get_tracking_stats(session),
+        "quality": face_recog.get_quality_stats(session),
+        "emotion": session.emotion_worker.stats(),
+    }
+    if voice_monitor is not None:
+        voice_monitor.close()
+        result["voice"] = voice_monitor.stats()
+    result["stages"] = timer.summary()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.replay",
+        description="Replay recorded or synthetic frames (and audio) through the face_recog frame functions")
+    parser.add_argument('--video', help="recorded video file; synthetic frames when omitted")
+    parser.add_argument('--audio', help="WAV file fed to the voice monitor in call mode (synthetic voice by default)")
+    parser.add_argument('--no-audio', action='store_true')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--loop', action='store_true', help="loop the video until --frames")
+    parser.add_argument('--fps', type=float, help="frame rate used to pace audio (default: the video's, or 30)")
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--models', choices=("stub", "real"), default="stub",
+                        help="stub models, gallery and emotion, or the configured real ones")
+    parser.add_argument('--classes', type=int, default=20, help="identities of the stub recogniser and gallery")
+    parser.add_argument('--emotion-ms', type=float, default=0.0, help="simulated latency of the stub emotion model")
+    parser.add_argument('--detector', choices=("config", "blob"),
+                        help="configured detector or the synthetic-face finder (default: blob for synthetic frames)")
+    parser.add_argument('--output', default="replay_results.json")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    args.detector = args.detector or ("config" if args.video else "blob")
+    fps = args.fps or (sources.video_fps(args.video) if args.video else 30.0)
+    if args.models == "stub":
+        stubs.install_stubs(args.classes, args.emotion_ms)
+    timer = StageTimer()
+    stubs.instrument(timer)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "machine": platform.platform(),
+        "args": vars(args),
+        "modes": {},
+    }
+    for mode in args.modes:
+        timer.reset()
+        result = replay(mode, args, timer, fps)
+        report["modes"][mode] = result
+        print_summary(f"{mode}: {result['frames']} frames, {result['fps']:.1f} fps, "
+                      f"peak RSS {result['peak_rss_mb']:.0f} MB", result["stages"])
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Saved {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        for mode, result in report["modes"].items():
+            before = previous.get("modes", {}).get(mode)
+            if not before:
+                continue
+            print(f"{mode} vs {args.compare} ({previous.get('revision')}): "
+                  f"{before['fps']:.1f} -> {result['fps']:.1f} fps")
+            for stage, old, new, change in compare(before["stages"], result["stages"]):
+                print(f"  {stage:<12} p50 {old:8.2f} -> {new:8.2f} ms ({change:+.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import cv2
+import numpy as np
+import scipy.io.wavfile as wav
+
+from benchmarks.voice_bench import synthetic_voice
+from voice_features import to_float_mono
+
+
+def video_frames(path, max_frames=None, loop=False):
+    """BGR frames of a recorded video, optionally looped until ``max_frames``."""
+    count = 0
+    while True:
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open video {path}")
+        read_any = False
+        while max_frames is None or count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            read_any = True
+            count += 1
+            yield frame
+        cap.release()
+        if not loop or not read_any or (max_frames is not None and count >= max_frames):
+            return
+
+
+def video_fps(path, default=30.0):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return fps if fps and fps > 0 else default
+
+
+def synthetic_frames(count, size=(640, 480), face=160, seed=0):
+    """Frames with one textured, slowly moving 'face' on a dark background.
+
+    The face is a bright, sharp patch that BlobDetector (see stubs) finds, so
+    the tracker, quality gate and models all see realistic box sizes.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    texture = cv2.GaussianBlur(rng.integers(0, 256, (face, face, 3), dtype=np.uint8), (3, 3), 0)
+    texture = cv2.normalize(texture, None, 90, 230, cv2.NORM_MINMAX)
+    background = np.full((height, width, 3), 20, dtype=np.uint8)
+    for i in range(count):
+        x = int((width - face) / 2 + (width - face) / 4 * np.sin(i / 40.0))
+        y = int((height - face) / 2 + (height - face) / 6 * np.cos(i / 55.0))
+        frame = background.copy()
+        frame[y:y + face, x:x + face] = texture
+        yield frame
+
+
+def audio_chunks(samples, sr, fps):
+    """Split audio into one chunk per video frame, like WebRTC callbacks deliver it."""
+    step = max(int(round(sr / fps)), 1)
+    for start in range(0, len(samples), step):
+        yield samples[start:start + step]
+
+
+def wav_audio(path):
+    sr, y = wav.read(path)
+    return to_float_mono(y), sr
+
+
+def synthetic_audio(seconds, sr=48000):
+    return synthetic_voice(seconds, sr), sr
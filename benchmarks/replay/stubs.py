@@ -0,0 +1,149 @@
+"""Stand-ins for the models, detector and emotion analysis, plus timing hooks.
+
+Stubs are installed with ``model_registry.register`` before anything loads,
+so face_recog runs its real code paths around them without model files,
+TensorFlow or DeepFace. ``instrument`` wraps whatever is registered, stub or
+real, so each stage reports its own latency.
+"""
+import time
+
+import cv2
+import numpy as np
+
+import face_recog
+import model_registry
+from face_preprocess import FacePreprocessor
+from face_search import GallerySearch
+from inference_server import InProcessBackend
+
+EMOTIONS = ("neutral", "happy", "sad", "fear", "surprise", "angry", "disgust")
+
+
+class StubRecognizer:
+    """Softmax over a fixed random projection of the 100x100x3 input."""
+
+    def __init__(self, classes=20, seed=0):
+        rng = np.random.default_rng(seed)
+        self.weights = (rng.standard_normal((100 * 100 * 3, classes)) / 10).astype(np.float32)
+
+    def __call__(self, batch, training=False):
+        logits = np.asarray(batch, dtype=np.float32).reshape(len(batch), -1) @ self.weights
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+class StubGender:
+    def __call__(self, batch, training=False):
+        batch = np.asarray(batch, dtype=np.float32)
+        return 1.0 / (1.0 + np.exp(-8.0 * (batch.reshape(len(batch), -1).mean(axis=1, keepdims=True) - 0.5)))
+
+
+def stub_gallery(classes=20, per_class=10, seed=0):
+    rng = np.random.default_rng(seed)
+    data = rng.integers(0, 256, size=(classes * per_class, 100 * 100 * 3), dtype=np.uint8)
+    return GallerySearch(data, np.repeat(np.arange(classes), per_class))
+
+
+class StubBackend(InProcessBackend):
+    """In-process recognition with a cheap emotion stand-in for DeepFace."""
+
+    def __init__(self, delay_ms=0.0):
+        self.delay = delay_ms / 1000.0
+
+    def emotion(self, face_roi):
+        if self.delay:
+            time.sleep(self.delay)
+        return EMOTIONS[int(face_roi.mean()) % len(EMOTIONS)]
+
+
+class BlobDetector:
+    """Finds the bright synthetic face of sources.synthetic_frames (also in ROI crops)."""
+
+    def __init__(self, threshold=60):
+        self.threshold = threshold
+
+    def __call__(self, gray, frame=None):
+        _, mask = cv2.threshold(gray, self.threshold, 255, cv2.THRESH_BINARY)
+        points = cv2.findNonZero(mask)
+        if points is None:
+            return ()
+        return np.array([cv2.boundingRect(points)])
+
+
+def install_stubs(classes=20, emotion_ms=0.0):
+    model_registry.register("character_model", StubRecognizer(classes))
+    model_registry.register("gender_model", StubGender())
+    model_registry.register("gallery_search", stub_gallery(classes))
+    model_registry.register("inference_backend", StubBackend(emotion_ms))
+    # A quarter of the recogniser's classes have no name, so face_recog falls
+    # back to the gallery kNN for them and that path is measured too
+    face_recog.names = {i: f"person_{i}" for i in range(classes) if i % 4}
+
+
+class TimedGallery:
+    def __init__(self, search, timer):
+        self.search = search
+        self.vote = timer.wrap("knn", search.vote)
+        self.query = timer.wrap("knn", search.query)
+
+    def __len__(self):
+        return len(self.search)
+
+    def __getattr__(self, name):
+        return getattr(self.search, name)
+
+
+class TimedBackend:
+    def __init__(self, backend, timer):
+        self.backend = backend
+        self.identify = timer.wrap("identify", backend.identify)
+        self.emotion = timer.wrap("emotion", backend.emotion)
+
+    def close(self):
+        self.backend.close()
+
+
+class TimedPreprocessor(FacePreprocessor):
+    def __init__(self, timer):
+        super().__init__()
+        self.timer = timer
+        self._depth = 0
+
+    def _timed(self, fn, face_roi):
+        # prepare() calls crop(); count the outer call only
+        if self._depth:
+            return fn(face_roi)
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            return fn(face_roi)
+        finally:
+            self._depth -= 1
+            self.timer.add("preprocess", time.perf_counter() - start)
+
+    def prepare(self, face_roi):
+        return self._timed(super().prepare, face_roi)
+
+    def crop(self, face_roi):
+        return self._timed(super().crop, face_roi)
+
+
+def instrument(timer):
+    """Wrap the registered models, gallery and backend so each stage is timed."""
+    model_registry.register("character_model", timer.wrap("recognize", model_registry.get("character_model")))
+    model_registry.register("gender_model", timer.wrap("gender", model_registry.get("gender_model")))
+    model_registry.register("gallery_search", TimedGallery(model_registry.get("gallery_search"), timer))
+    model_registry.register("inference_backend", TimedBackend(model_registry.get("inference_backend"), timer))
+    # The frame functions run on this thread, so this is the buffer set they use
+    face_recog._local.preprocessor = TimedPreprocessor(timer)
+
+
+def instrument_session(session, timer, detector=None):
+    """Time the session's detector, tracker and quality gate (optionally replacing the detector)."""
+    session.detector = timer.wrap("detect", detector or session.detector)
+    if session.tracker is not None:
+        session.tracker.detector = session.detector
+        session.tracker.update = timer.wrap("locate", session.tracker.update)
+    if session.quality_gate is not None:
+        session.quality_gate.assess = timer.wrap("quality", session.quality_gate.assess)
+    return session
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import numpy as np
+
+PERCENTILES = (50, 90, 99)
+
+
+class StageTimer:
+    """Collects latency samples per named stage, from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}
+
+    def wrap(self, stage, fn):
+        """``fn`` with every call timed under ``stage``."""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: np.array(values) * 1000 for stage, values in self._samples.items()}
+        summary = {}
+        for stage, ms in samples.items():
+            summary[stage] = {"count": int(ms.size), "mean_ms": float(ms.mean()), "max_ms": float(ms.max())}
+            for p in PERCENTILES:
+                summary[stage][f"p{p}_ms"] = float(np.percentile(ms, p))
+        return summary
+
+
+def print_summary(title, summary):
+    print(title)
+    print(f"  {'stage':<12}{'count':>7}{'mean':>9}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES) + f"{'max':>9}  (ms)")
+    for stage, s in summary.items():
+        print(f"  {stage:<12}{s['count']:>7}{s['mean_ms']:>9.2f}"
+              + "".join(f"{s[f'p{p}_ms']:>9.2f}" for p in PERCENTILES) + f"{s['max_ms']:>9.2f}")
+
+
+def compare(previous, current, key="p50_ms"):
+    """Per-stage change of ``key`` between two saved runs of one mode."""
+    rows = []
+    for stage, now in current.items():
+        before = previous.get(stage)
+        if before and before[key]:
+            rows.append((stage, before[key], now[key], now[key] / before[key] - 1))
+    return rows
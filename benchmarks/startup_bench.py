@@ -0,0 +1,79 @@
+"""Measure import time and peak RSS of what the non-video pages load.
+
+Each scenario runs in a fresh interpreter. "eager" reproduces the old startup,
+where importing face_recog loaded both Keras models, DeepFace and the gallery;
+"lazy" is what the login and host pages import now. "pages" is the top of the
+current main.py and "baseline" the top of main.py before lazy loading; run the
+latter with --repo pointing at a checkout of that commit.
+
+Run from the repository root:  python -m benchmarks.startup_bench [--repo PATH] [--repeat N]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+SCENARIOS = {
+    # streamlit_webrtc goes first: pylibsrtp segfaults if imported after TensorFlow.
+    "baseline": (
+        "import streamlit_webrtc, av, streamlit, cv2, time, datetime, database, face_recog\n"
+        "import tempfile, pyperclip, sqlite3, numpy, PIL.Image"
+    ),
+    "pages": "import streamlit, time, datetime, config, database, metrics, pyperclip",
+    "lazy": "import streamlit, database, pyperclip, config",
+    "lazy+face_recog": "import streamlit, database, pyperclip, config, face_recog",
+    "eager": (
+        "import streamlit, database, pyperclip, config, face_recog, model_registry\n"
+        "import cv2, av, streamlit_webrtc, librosa, sounddevice\n"
+        "from deepface import DeepFace\n"
+        "for name in ('character_model', 'gender_model', 'gallery_search'):\n"
+        "    model_registry.get(name)"
+    ),
+}
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec(compile(sys.argv[1], "<scenario>", "exec"))
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "peak_rss_mb": rss_kb / 1024}))
+"""
+
+
+def run(code, cwd=None):
+    out = subprocess.run([sys.executable, "-c", PROBE, code], capture_output=True, text=True, cwd=cwd)
+    if out.returncode != 0:
+        return {"error": out.stderr.strip().splitlines()[-1] if out.stderr else f"exit code {out.returncode}"}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(code, cwd=None, repeat=1):
+    """Median of `repeat` fresh-interpreter runs."""
+    results = [run(code, cwd) for _ in range(repeat)]
+    for result in results:
+        if "error" in result:
+            return result
+    return {key: statistics.median(r[key] for r in results) for key in ("seconds", "peak_rss_mb")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repo", default=None, help="tree to import from (default: current directory)")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario; the median is reported")
+    parser.add_argument("scenarios", nargs="*", help="subset of: " + ", ".join(SCENARIOS))
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenario: " + ", ".join(unknown))
+    for name in args.scenarios or SCENARIOS:
+        result = measure(SCENARIOS[name], args.repo, args.repeat)
+        if "error" in result:
+            print(f"{name:18s} error: {result['error']}")
+        else:
+            print(f"{name:18s} {result['seconds']:7.2f} s  {result['peak_rss_mb']:8.1f} MB peak RSS")
+
+
+if __name__ == "__main__":
+    main()
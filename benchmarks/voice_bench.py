@@ -0,0 +1,72 @@
+"""Cost per second of audio: old librosa file path vs the in-memory VoiceAnalyzer.
+
+The old path writes a WAV, reloads it with librosa (resampling to 22,050 Hz)
+and runs piptrack plus MFCCs. The new path analyses the buffer directly.
+
+Run from the repository root:  python -m benchmarks.voice_bench --seconds 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import scipy.io.wavfile as wav
+
+from voice_features import VoiceAnalyzer
+
+
+def synthetic_voice(seconds, sr, f0=180.0, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    vibrato = f0 * (1 + 0.03 * np.sin(2 * np.pi * 5 * t))
+    phase = 2 * np.pi * np.cumsum(vibrato) / sr
+    y = sum(np.sin(k * phase) / k for k in range(1, 8))
+    return (0.2 * y + 0.005 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def old_path(y, sr):
+    import librosa
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        wav.write(path, sr, y)
+        y2, sr2 = librosa.load(path)
+        librosa.feature.mfcc(y=y2, sr=sr2, n_mfcc=13).mean(axis=1)
+        pitch, _ = librosa.piptrack(y=y2, sr=sr2)
+        return pitch[pitch > 0].mean() if np.any(pitch > 0) else 0
+    finally:
+        os.remove(path)
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--rates', type=int, nargs='+', default=[16000, 44100, 48000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    analyzer = VoiceAnalyzer()
+    for sr in args.rates:
+        y = synthetic_voice(args.seconds, sr)
+        new, pitch = timed(lambda: analyzer.pitch(y, sr), args.repeat)
+        line = f"{sr:6d} Hz  YIN pitch {pitch:6.1f} Hz  {new / args.seconds * 1000:7.2f} ms per audio second"
+        try:
+            old, old_pitch = timed(lambda: old_path(y, sr), args.repeat)
+            line += f"  | librosa path {old_pitch:6.1f} Hz  {old / args.seconds * 1000:7.2f} ms per audio second ({old / new:.0f}x)"
+        except ImportError:
+            line += "  | librosa not installed, old path skipped"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
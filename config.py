@@ -0,0 +1,129 @@
+"""Deployment settings, read from CERTICALL_* environment variables."""
+import os
+
+
+def env_str(name, default):
+    return os.environ.get(name, default)
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name, default):
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+# Load and exercise the models on a background thread as soon as an employee
+# logs in, so the first attendance frame doesn't pay for graph building.
+WARMUP_MODELS = env_bool("CERTICALL_WARMUP", True)
+
+# The attendance check stops as soon as ATTENDANCE_MIN_FRAMES frames agree on
+# one name (each recognised with at least ATTENDANCE_MIN_CONFIDENCE) and that
+# name holds ATTENDANCE_AGREEMENT of the vote. It gives up early when no face
+# is seen for ATTENDANCE_NO_FACE_TIMEOUT_S.
+ATTENDANCE_TIMEOUT_S = env_float("CERTICALL_ATTENDANCE_TIMEOUT_S", 10.0)
+ATTENDANCE_MIN_FRAMES = env_int("CERTICALL_ATTENDANCE_MIN_FRAMES", 5)
+ATTENDANCE_MIN_CONFIDENCE = env_float("CERTICALL_ATTENDANCE_MIN_CONFIDENCE", 0.6)
+ATTENDANCE_AGREEMENT = env_float("CERTICALL_ATTENDANCE_AGREEMENT", 0.8)
+ATTENDANCE_NO_FACE_TIMEOUT_S = env_float("CERTICALL_ATTENDANCE_NO_FACE_TIMEOUT_S", 3.0)
+
+# Runtime for the recognition and gender models: keras (the .keras files,
+# imports TensorFlow), tflite or onnx (files written by model_export.py into
+# MODEL_EXPORT_DIR; MODEL_QUANTIZATION selects "", "float16" or "int8").
+MODEL_RUNTIME = env_str("CERTICALL_MODEL_RUNTIME", "keras")
+MODEL_QUANTIZATION = env_str("CERTICALL_MODEL_QUANTIZATION", "")
+MODEL_EXPORT_DIR = env_str("CERTICALL_MODEL_EXPORT_DIR", "exported_models")
+MODEL_THREADS = env_int("CERTICALL_MODEL_THREADS", 0)
+
+# Face gallery: per-person .npy files in GALLERY_DATASET_PATH compiled into
+# segments in GALLERY_DIR (see face_gallery.py). Running processes check for
+# a newly enrolled snapshot at most every GALLERY_RELOAD_INTERVAL_S seconds.
+# People enrolled after the recognizer was trained are only known to the
+# gallery kNN, which is also consulted when the recognizer's score is below
+# RECOGNIZER_MIN_CONFIDENCE.
+GALLERY_DATASET_PATH = env_str("CERTICALL_GALLERY_DATASET", "./face_dataset/")
+GALLERY_DIR = env_str("CERTICALL_GALLERY_DIR", "./face_gallery/")
+GALLERY_RELOAD_INTERVAL_S = env_float("CERTICALL_GALLERY_RELOAD_INTERVAL_S", 2.0)
+RECOGNIZER_MIN_CONFIDENCE = env_float("CERTICALL_RECOGNIZER_MIN_CONFIDENCE", 0.6)
+
+# Approximate gallery kNN through the IVF index built by `python ann_index.py
+# build` (off: exact search). A query visits ANN_NPROBE partitions and
+# re-ranks its ANN_REFINE best candidates exactly; raise either for recall,
+# lower them for speed.
+ANN_INDEX = env_bool("CERTICALL_ANN_INDEX", False)
+ANN_NPROBE = env_int("CERTICALL_ANN_NPROBE", 8)
+ANN_REFINE = env_int("CERTICALL_ANN_REFINE", 64)
+
+# Hot-path timers and counters (off by default). When on, they are served as
+# Prometheus text on 127.0.0.1:METRICS_PORT (0 = no endpoint) and/or written
+# to METRICS_FILE every METRICS_FILE_INTERVAL_S seconds.
+METRICS_ENABLED = env_bool("CERTICALL_METRICS", False)
+METRICS_PORT = env_int("CERTICALL_METRICS_PORT", 0)
+METRICS_FILE = env_str("CERTICALL_METRICS_FILE", "")
+METRICS_FILE_INTERVAL_S = env_float("CERTICALL_METRICS_FILE_INTERVAL_S", 15.0)
+
+# Face detector backend: haar_default, haar_alt, dnn (needs the SSD prototxt
+# and caffemodel below) or auto (the choice saved by `python face_detectors.py
+# --clip ...`). A scale below 1 detects on a downscaled frame.
+DETECTOR = env_str("CERTICALL_DETECTOR", "haar_default")
+DETECTOR_SCALE = env_float("CERTICALL_DETECTOR_SCALE", 1.0)
+DETECTOR_DNN_PROTOTXT = env_str("CERTICALL_DETECTOR_DNN_PROTOTXT", "deploy.prototxt")
+DETECTOR_DNN_MODEL = env_str("CERTICALL_DETECTOR_DNN_MODEL", "res10_300x300_ssd_iter_140000.caffemodel")
+DETECTOR_DNN_CONFIDENCE = env_float("CERTICALL_DETECTOR_DNN_CONFIDENCE", 0.5)
+DETECTOR_CALIBRATION_PATH = env_str("CERTICALL_DETECTOR_CALIBRATION", "detector_calibration.json")
+
+# Face tracking: run the Haar detector every N frames (or when the tracker
+# loses confidence) and follow the face with optical flow in between.
+TRACKING_ENABLED = env_bool("CERTICALL_TRACKING", True)
+TRACKING_DETECT_EVERY = env_int("CERTICALL_TRACKING_DETECT_EVERY", 10)
+TRACKING_MIN_CONFIDENCE = env_float("CERTICALL_TRACKING_MIN_CONFIDENCE", 0.6)
+TRACKING_ROI_SCALE = env_float("CERTICALL_TRACKING_ROI_SCALE", 1.6)
+
+# Frame quality gate: faces that are blurred (Laplacian variance), too dark
+# or bright (mean grey level), too small (pixels) or jumping between frames
+# (box IoU) are not sent to the models.
+QUALITY_GATE = env_bool("CERTICALL_QUALITY_GATE", True)
+QUALITY_MIN_SHARPNESS = env_float("CERTICALL_QUALITY_MIN_SHARPNESS", 40.0)
+QUALITY_MIN_BRIGHTNESS = env_float("CERTICALL_QUALITY_MIN_BRIGHTNESS", 40.0)
+QUALITY_MAX_BRIGHTNESS = env_float("CERTICALL_QUALITY_MAX_BRIGHTNESS", 220.0)
+QUALITY_MIN_FACE_PX = env_int("CERTICALL_QUALITY_MIN_FACE_PX", 60)
+QUALITY_MIN_STABILITY = env_float("CERTICALL_QUALITY_MIN_STABILITY", 0.5)
+
+# A voice window whose median YIN pitch (true F0, Hz) exceeds this counts as
+# stressed. Typical speaking F0 is ~85-155 Hz for men and ~165-255 Hz for
+# women; tune per deployment.
+VOICE_PITCH_THRESHOLD_HZ = env_float("CERTICALL_VOICE_PITCH_THRESHOLD_HZ", 250.0)
+
+# Emotion results are smoothed by majority vote over this many seconds
+EMOTION_WINDOW_S = env_float("CERTICALL_EMOTION_WINDOW_S", 3.0)
+
+# SQLite database file and how long a writer waits for a lock before failing
+DB_PATH = env_str("CERTICALL_DB", "meetings.db")
+DB_BUSY_TIMEOUT_MS = env_int("CERTICALL_DB_BUSY_TIMEOUT_MS", 5000)
+
+# Suspicious moments are written behind the call in batches of this size, or
+# at least this often; at most EVENT_MAX_PENDING are held in memory per call.
+EVENT_FLUSH_SIZE = env_int("CERTICALL_EVENT_FLUSH_SIZE", 50)
+EVENT_FLUSH_INTERVAL_S = env_float("CERTICALL_EVENT_FLUSH_INTERVAL_S", 5.0)
+EVENT_MAX_PENDING = env_int("CERTICALL_EVENT_MAX_PENDING", 1000)
+
+# How long the host dashboard may serve cached per-meeting queries
+QUERY_CACHE_TTL_S = env_float("CERTICALL_QUERY_CACHE_TTL_S", 30.0)
+
+# Run face recognition and emotion analysis in a pool of worker processes
+# (one per core by default) fed through shared memory, instead of in the
+# Streamlit process. Off by default: single-user setups run in-process.
+INFERENCE_SERVER = env_bool("CERTICALL_INFERENCE_SERVER", False)
+INFERENCE_WORKERS = env_int("CERTICALL_INFERENCE_WORKERS", 0)
+INFERENCE_SLOT_BYTES = env_int("CERTICALL_INFERENCE_SLOT_BYTES", 640 * 640 * 3)
+INFERENCE_TIMEOUT_S = env_float("CERTICALL_INFERENCE_TIMEOUT_S", 10.0)
@@ -1,19 +1,127 @@
 # database.py
+import ast
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 
-def init_db():
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    
-    # Create tables if they don't exist
+import config
+import metrics
+
+DB_PATH = config.DB_PATH
+BUSY_TIMEOUT_MS = config.DB_BUSY_TIMEOUT_MS
+
+# One connection per thread, opened on first use and kept for the thread's
+# lifetime. Connections run in autocommit mode; writes go through transaction().
+_local = threading.local()
+_generation = 0
+
+# Read-through cache for the host dashboard's per-meeting queries. Entries are
+# dropped whenever this process writes attendance or events for the meeting,
+# and expire after QUERY_CACHE_TTL_S to pick up writes from other processes.
+QUERY_CACHE_TTL_S = config.QUERY_CACHE_TTL_S
+_query_cache = {}
+_query_cache_lock = threading.Lock()
+
+def configure(path=None, busy_timeout_ms=None):
+    """Point the module at another database file; existing thread connections are reopened lazily."""
+    global DB_PATH, BUSY_TIMEOUT_MS, _generation
+    if path is not None:
+        DB_PATH = path
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = busy_timeout_ms
+    _generation += 1
+    invalidate_meeting_cache()
+
+def get_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.generation == _generation:
+        return conn
+    if conn is not None:
+        conn.close()
+
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}")
+    _local.conn = conn
+    _local.generation = _generation
+    _local.depth = 0
+    return conn
+
+def _cached(meeting_id, key, query):
+    now = time.monotonic()
+    with _query_cache_lock:
+        entry = _query_cache.get(str(meeting_id), {}).get(key)
+        if entry is not None and now - entry[0] < QUERY_CACHE_TTL_S:
+            metrics.inc("db_cache_hits")
+            return entry[1]
+    metrics.inc("db_cache_misses")
+    result = query()
+    with _query_cache_lock:
+        _query_cache.setdefault(str(meeting_id), {})[key] = (now, result)
+    return result
+
+def invalidate_meeting_cache(meeting_id=None):
+    with _query_cache_lock:
+        if meeting_id is None:
+            _query_cache.clear()
+        else:
+            _query_cache.pop(str(meeting_id), None)
+
+def close_connection():
+    """Close this thread's connection (it is reopened on next use)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    """Run several statements atomically; nested blocks become savepoints.
+
+    Yields a cursor. Commits when the outermost block exits normally and rolls
+    back (to the savepoint, for nested blocks) on any exception.
+    """
+    conn = get_connection()
+    depth = _local.depth
+    started = time.perf_counter()
+    if depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    else:
+        conn.execute(f"SAVEPOINT sp{depth}")
+    _local.depth = depth + 1
+    try:
+        yield conn.cursor()
+    except BaseException:
+        metrics.inc("db_rollbacks")
+        if depth == 0:
+            conn.execute("ROLLBACK")
+        else:
+            conn.execute(f"ROLLBACK TO sp{depth}")
+            conn.execute(f"RELEASE sp{depth}")
+        raise
+    else:
+        if depth == 0:
+            conn.execute("COMMIT")
+        else:
+            conn.execute(f"RELEASE sp{depth}")
+    finally:
+        _local.depth = depth
+        if depth == 0:
+            # Includes waiting for the write lock
+            metrics.observe("db_transaction", time.perf_counter() - started)
+
+def _create_base_schema(c):
+    # The original schema; IF NOT EXISTS so pre-migration databases pass through
     c.execute('''CREATE TABLE IF NOT EXISTS hosts
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                  name TEXT NOT NULL,
                  email TEXT UNIQUE NOT NULL,
                  password TEXT NOT NULL,
                  company TEXT NOT NULL)''')
-    
+
     c.execute('''CREATE TABLE IF NOT EXISTS meetings
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                  host_id INTEGER NOT NULL,
@@ -22,7 +130,7 @@ def init_db():
                  start_time DATETIME NOT NULL,
                  end_time DATETIME,
                  FOREIGN KEY (host_id) REFERENCES hosts (id))''')
-    
+
     c.execute('''CREATE TABLE IF NOT EXISTS employees
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                  meeting_id INTEGER NOT NULL,
@@ -30,7 +138,7 @@ def init_db():
                  emp_id TEXT NOT NULL,
                  password TEXT NOT NULL,
                  FOREIGN KEY (meeting_id) REFERENCES meetings (id))''')
-    
+
     c.execute('''CREATE TABLE IF NOT EXISTS attendance
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
                  meeting_id INTEGER NOT NULL,
@@ -41,113 +149,391 @@ def init_db():
                  lie_detected BOOLEAN DEFAULT FALSE,
                  lie_timestamps TEXT,
                  FOREIGN KEY (meeting_id) REFERENCES meetings (id))''')
-    
-    conn.commit()
-    conn.close()
+
+def _add_hot_query_indexes(c):
+    # add_employee relies on (meeting_id, emp_id) being unique; drop any
+    # duplicates older databases accumulated before enforcing it, keeping the
+    # first registration and logging the others.
+    duplicates = c.execute("""SELECT id, meeting_id, emp_id, name FROM employees WHERE id NOT IN
+                              (SELECT MIN(id) FROM employees GROUP BY meeting_id, emp_id)""").fetchall()
+    for row_id, meeting_id, emp_id, name in duplicates:
+        print(f"Removing duplicate employee row {row_id} (meeting {meeting_id}, emp_id {emp_id!r}, name {name!r})")
+    c.executemany("DELETE FROM employees WHERE id=?", [(row_id,) for row_id, _, _, _ in duplicates])
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_employees_meeting_emp ON employees (meeting_id, emp_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_meeting_emp ON attendance (meeting_id, emp_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_meetings_host ON meetings (host_id)")
+
+_INSERT_EVENT = """INSERT INTO suspicious_events
+                   (attendance_id, meeting_id, emp_id, timestamp, kind, detail, score)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+def _parse_moments(blob):
+    """Parse a legacy str(list_of_tuples) lie_timestamps blob without eval().
+
+    Returns None when the blob is not a list or tuple literal.
+    """
+    if not blob:
+        return []
+    try:
+        moments = ast.literal_eval(blob)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    if not isinstance(moments, (list, tuple)):
+        return None
+    return [m for m in moments if isinstance(m, (tuple, list)) and len(m) >= 2]
+
+def _split_info(info):
+    # "emotion:fear" -> ("emotion", "fear"); "voice_stress" -> ("voice_stress", None)
+    kind, _, detail = str(info).partition(":")
+    return kind, detail or None
+
+def _event_row(attendance_id, meeting_id, emp_id, moment, day):
+    timestamp, info = moment[0], moment[1]
+    score = moment[2] if len(moment) > 2 else None
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime("%Y-%m-%d %H:%M:%S")
+    elif len(str(timestamp)) <= 8:
+        # Bare "HH:MM:SS" from the call: anchor it to the attendance day
+        timestamp = f"{day} {timestamp}"
+    kind, detail = _split_info(info)
+    return (attendance_id, meeting_id, emp_id, str(timestamp), kind, detail, score)
+
+def _create_suspicious_events(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS suspicious_events
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 attendance_id INTEGER,
+                 meeting_id INTEGER NOT NULL,
+                 emp_id TEXT NOT NULL,
+                 timestamp DATETIME NOT NULL,
+                 kind TEXT NOT NULL,
+                 detail TEXT,
+                 score REAL,
+                 FOREIGN KEY (attendance_id) REFERENCES attendance (id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_events_meeting_emp_time ON suspicious_events (meeting_id, emp_id, timestamp)")
+
+    # Move the legacy text blobs into rows, then retire them. Blobs that don't
+    # parse are left in place for a manual look.
+    rows = c.execute("""SELECT id, meeting_id, emp_id, date(join_time), lie_timestamps
+                        FROM attendance WHERE lie_timestamps IS NOT NULL""").fetchall()
+    migrated = []
+    for attendance_id, meeting_id, emp_id, day, blob in rows:
+        moments = _parse_moments(blob)
+        if moments is None:
+            print(f"Could not parse lie_timestamps of attendance row {attendance_id}; left unmigrated")
+            continue
+        c.executemany(_INSERT_EVENT, [_event_row(attendance_id, meeting_id, emp_id, m, day) for m in moments])
+        migrated.append((attendance_id,))
+    c.executemany("UPDATE attendance SET lie_timestamps=NULL WHERE id=?", migrated)
+
+def _create_batch_jobs(c):
+    # One row per recording analysed by batch_analyze.py, written in the same
+    # transaction as its results so a resumed run never records it twice
+    c.execute('''CREATE TABLE IF NOT EXISTS batch_jobs
+                 (source TEXT PRIMARY KEY,
+                 signature TEXT NOT NULL,
+                 meeting_id INTEGER NOT NULL,
+                 emp_id TEXT NOT NULL,
+                 attendance_id INTEGER,
+                 status TEXT NOT NULL,
+                 start_time DATETIME NOT NULL,
+                 end_time DATETIME NOT NULL,
+                 frames INTEGER NOT NULL,
+                 events INTEGER NOT NULL,
+                 finished_at DATETIME NOT NULL,
+                 FOREIGN KEY (attendance_id) REFERENCES attendance (id))''')
+
+def _index_events_by_attendance(c):
+    # Re-running a batch job deletes the events of its attendance row, and the
+    # host view counts events per attendance row
+    c.execute("CREATE INDEX IF NOT EXISTS idx_events_attendance ON suspicious_events (attendance_id)")
+
+# Ordered schema migrations; a database at PRAGMA user_version N has applied
+# the first N steps. Only ever append to this list.
+MIGRATIONS = [
+    _create_base_schema,
+    _add_hot_query_indexes,
+    _create_suspicious_events,
+    _create_batch_jobs,
+    _index_events_by_attendance,
+]
+
+def schema_version():
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """Apply pending migrations in order.
+
+    An up-to-date database is detected with a plain read, so the common case
+    (init_db on every rerun) never takes the write lock. Otherwise the steps
+    run in one write transaction that re-reads the version under the lock, so
+    concurrent processes can't apply a step twice; a failing step leaves the
+    database at its previous version.
+    """
+    if schema_version() == len(MIGRATIONS):
+        return len(MIGRATIONS)
+    with transaction() as c:
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            step(c)
+            c.execute(f"PRAGMA user_version={number}")
+    return schema_version()
+
+def init_db():
+    migrate()
+
+def explain_query_plan(sql, params=()):
+    """Return SQLite's query plan details for a statement, e.g. to check index use."""
+    rows = get_connection().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
 
 def add_host(name, email, password, company):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
     try:
-        c.execute("INSERT INTO hosts (name, email, password, company) VALUES (?, ?, ?, ?)",
-                  (name, email, password, company))
-        conn.commit()
+        with transaction() as c:
+            c.execute("INSERT INTO hosts (name, email, password, company) VALUES (?, ?, ?, ?)",
+                      (name, email, password, company))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
+
+# Statements of the hot paths, shared with benchmarks/db_query_plans.py,
+# which checks that each is served by an index
+VERIFY_HOST_SQL = "SELECT id, name, company FROM hosts WHERE email=? AND password=?"
+VERIFY_EMPLOYEE_SQL = "SELECT name FROM employees WHERE meeting_id=? AND emp_id=? AND password=?"
+EMPLOYEE_PASSWORD_SQL = "SELECT password FROM employees WHERE meeting_id=? AND emp_id=?"
+MEETINGS_FOR_HOST_SQL = "SELECT id, title, start_time FROM meetings WHERE host_id=?"
+ATTENDANCE_FOR_MEETING_SQL = ("SELECT emp_id, name, gender, join_time, lie_detected, lie_timestamps "
+                              "FROM attendance WHERE meeting_id=?")
+ATTENDANCE_SUMMARY_SQL = """
+    SELECT COUNT(*),
+           COUNT(DISTINCT emp_id),
+           COUNT(DISTINCT CASE WHEN gender='Male' THEN emp_id END),
+           COUNT(DISTINCT CASE WHEN gender='Female' THEN emp_id END),
+           COUNT(DISTINCT CASE WHEN lie_detected THEN emp_id END)
+    FROM attendance WHERE meeting_id=?"""
+MEETING_EVENT_COUNT_SQL = "SELECT COUNT(*) FROM suspicious_events WHERE meeting_id=?"
+ATTENDANCE_PAGE_SQL = """
+    SELECT a.emp_id, a.name, a.gender, a.join_time, a.lie_detected,
+           (SELECT COUNT(*) FROM suspicious_events e
+            WHERE e.meeting_id=a.meeting_id AND e.emp_id=a.emp_id AND e.attendance_id=a.id),
+           a.id
+    FROM attendance a WHERE a.meeting_id=?
+    ORDER BY a.join_time DESC, a.id DESC LIMIT ? OFFSET ?"""
+EMPLOYEES_FOR_MEETING_SQL = "SELECT emp_id, name FROM employees WHERE meeting_id=?"
+LATEST_ATTENDANCE_SQL = """SELECT id, date(join_time) FROM attendance
+                           WHERE meeting_id=? AND emp_id=? ORDER BY id DESC LIMIT 1"""
+FLAG_ATTENDANCE_SQL = "UPDATE attendance SET lie_detected=1 WHERE id=?"
+BATCH_JOB_SQL = "SELECT attendance_id, meeting_id, emp_id, start_time, end_time FROM batch_jobs WHERE source=?"
+DELETE_ATTENDANCE_EVENTS_SQL = "DELETE FROM suspicious_events WHERE attendance_id=?"
+DELETE_ATTENDANCE_SQL = "DELETE FROM attendance WHERE id=?"
+DELETE_UNATTRIBUTED_EVENTS_SQL = """DELETE FROM suspicious_events WHERE attendance_id IS NULL
+                                    AND meeting_id=? AND emp_id=? AND timestamp BETWEEN ? AND ?"""
+# Filled in with event_filter()'s WHERE clause
+EVENTS_SQL = ("SELECT timestamp, kind, detail, score FROM suspicious_events WHERE {where} "
+              "ORDER BY timestamp, id LIMIT ? OFFSET ?")
+EVENT_COUNT_SQL = "SELECT COUNT(*) FROM suspicious_events WHERE {where}"
+EVENT_RANGE_SQL = "SELECT MIN(timestamp), MAX(timestamp) FROM suspicious_events WHERE {where}"
 
 def verify_host(email, password):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("SELECT id, name, company FROM hosts WHERE email=? AND password=?", (email, password))
+    c = get_connection().cursor()
+    c.execute(VERIFY_HOST_SQL, (email, password))
     result = c.fetchone()
-    conn.close()
     return result if result else None
 
 def create_meeting(host_id, title, description, start_time, end_time=None):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO meetings (host_id, title, description, start_time, end_time) VALUES (?, ?, ?, ?, ?)",
-              (host_id, title, description, start_time, end_time))
-    meeting_id = c.lastrowid
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("INSERT INTO meetings (host_id, title, description, start_time, end_time) VALUES (?, ?, ?, ?, ?)",
+                  (host_id, title, description, start_time, end_time))
+        meeting_id = c.lastrowid
     return meeting_id
 
 def add_employee(meeting_id, name, emp_id, password):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
     try:
-        c.execute("INSERT INTO employees (meeting_id, name, emp_id, password) VALUES (?, ?, ?, ?)",
-                  (meeting_id, name, emp_id, password))
-        conn.commit()
+        with transaction() as c:
+            c.execute("INSERT INTO employees (meeting_id, name, emp_id, password) VALUES (?, ?, ?, ?)",
+                      (meeting_id, name, emp_id, password))
         return True
     except sqlite3.IntegrityError:
         return False
-    finally:
-        conn.close()
 
 def verify_employee(meeting_id, emp_id, password):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("SELECT name FROM employees WHERE meeting_id=? AND emp_id=? AND password=?", 
-              (meeting_id, emp_id, password))
+    c = get_connection().cursor()
+    c.execute(VERIFY_EMPLOYEE_SQL, (meeting_id, emp_id, password))
+    result = c.fetchone()
+    return result[0] if result else None
+
+def get_employee_password(meeting_id, emp_id):
+    c = get_connection().cursor()
+    c.execute(EMPLOYEE_PASSWORD_SQL, (meeting_id, emp_id))
     result = c.fetchone()
-    conn.close()
     return result[0] if result else None
 
+@metrics.timed("db_record_attendance")
 def record_attendance(meeting_id, emp_id, name, gender, lie_detected=False, lie_timestamps=None):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO attendance (meeting_id, emp_id, name, gender, join_time, lie_detected, lie_timestamps) VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (meeting_id, emp_id, name, gender, datetime.now(), lie_detected, str(lie_timestamps) if lie_timestamps else None))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        now = datetime.now()
+        c.execute("INSERT INTO attendance (meeting_id, emp_id, name, gender, join_time, lie_detected) VALUES (?, ?, ?, ?, ?, ?)",
+                  (meeting_id, emp_id, name, gender, now, bool(lie_detected or lie_timestamps)))
+        if lie_timestamps:
+            day = now.strftime("%Y-%m-%d")
+            c.executemany(_INSERT_EVENT, [_event_row(c.lastrowid, meeting_id, emp_id, m, day) for m in lie_timestamps])
+    invalidate_meeting_cache(meeting_id)
 
 def get_meetings_for_host(host_id):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("SELECT id, title, start_time FROM meetings WHERE host_id=?", (host_id,))
-    result = c.fetchall()
-    conn.close()
-    return result
+    c = get_connection().cursor()
+    c.execute(MEETINGS_FOR_HOST_SQL, (host_id,))
+    return c.fetchall()
 
 def get_attendance_for_meeting(meeting_id):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("SELECT emp_id, name, gender, join_time, lie_detected, lie_timestamps FROM attendance WHERE meeting_id=?", (meeting_id,))
-    result = c.fetchall()
-    conn.close()
-    return result
+    c = get_connection().cursor()
+    c.execute(ATTENDANCE_FOR_MEETING_SQL, (meeting_id,))
+    return c.fetchall()
+
+@metrics.timed("db_get_attendance_summary")
+def get_attendance_summary(meeting_id):
+    """Per-meeting aggregates computed in SQL (cached until the next write)"""
+    def query():
+        c = get_connection().cursor()
+        c.execute(ATTENDANCE_SUMMARY_SQL, (meeting_id,))
+        records, attendees, male, female, flagged = c.fetchone()
+        c.execute(MEETING_EVENT_COUNT_SQL, (meeting_id,))
+        return {
+            "records": records,
+            "attendees": attendees,
+            "male": male,
+            "female": female,
+            "flagged": flagged,
+            "events": c.fetchone()[0],
+        }
+    return _cached(meeting_id, "summary", query)
+
+@metrics.timed("db_get_attendance_page")
+def get_attendance_page(meeting_id, limit=25, offset=0):
+    """One page of (emp_id, name, gender, join_time, lie_detected, event_count, attendance_id) rows, newest first"""
+    def query():
+        c = get_connection().cursor()
+        c.execute(ATTENDANCE_PAGE_SQL, (meeting_id, limit, offset))
+        return c.fetchall()
+    return _cached(meeting_id, ("page", limit, offset), query)
 
 def get_employees_for_meeting(meeting_id):
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("SELECT emp_id, name FROM employees WHERE meeting_id=?", (meeting_id,))
-    result = c.fetchall()
-    conn.close()
-    return result
+    c = get_connection().cursor()
+    c.execute(EMPLOYEES_FOR_MEETING_SQL, (meeting_id,))
+    return c.fetchall()
+
+@metrics.timed("db_record_basic_attendance")
 def record_basic_attendance(meeting_id, emp_id, name, gender):
     """Record basic attendance info before video call"""
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO attendance (meeting_id, emp_id, name, gender, join_time)
-        VALUES (?, ?, ?, ?, datetime('now'))
-    """, (meeting_id, emp_id, name, gender))
-    conn.commit()
-    conn.close()
+    # Local time, like the event timestamps (SQLite's datetime('now') is UTC)
+    join_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction() as c:
+        c.execute("""
+            INSERT INTO attendance (meeting_id, emp_id, name, gender, join_time)
+            VALUES (?, ?, ?, ?, ?)
+        """, (meeting_id, emp_id, name, gender, join_time))
+    invalidate_meeting_cache(meeting_id)
+
+@metrics.timed("db_add_suspicious_events")
+def add_suspicious_events(meeting_id, emp_id, events):
+    """Bulk-insert (timestamp, info[, score]) events against the latest attendance row"""
+    if not events:
+        return 0
+    with transaction() as c:
+        row = c.execute(LATEST_ATTENDANCE_SQL, (meeting_id, emp_id)).fetchone()
+        attendance_id, day = row if row else (None, datetime.now().strftime("%Y-%m-%d"))
+        c.executemany(_INSERT_EVENT, [_event_row(attendance_id, meeting_id, emp_id, e, day) for e in events])
+        if attendance_id is not None:
+            c.execute(FLAG_ATTENDANCE_SQL, (attendance_id,))
+    invalidate_meeting_cache(meeting_id)
+    return len(events)
+
+def get_batch_signatures():
+    """{source: signature} of every recording batch_analyze.py has finished."""
+    c = get_connection().cursor()
+    c.execute("SELECT source, signature FROM batch_jobs")
+    return dict(c.fetchall())
+
+@metrics.timed("db_record_batch_results")
+def record_batch_results(results):
+    """Write several analysed recordings in one transaction.
+
+    Each result is a dict with source, signature, meeting_id, emp_id, name,
+    gender, status, start/end datetimes, frames and (datetime, info[, score])
+    events. The attendance row is only written when ``name`` is set. Whatever
+    an earlier run wrote for the same source is replaced.
+    """
+    with transaction() as c:
+        for r in results:
+            previous = c.execute(BATCH_JOB_SQL, (r["source"],)).fetchone()
+            if previous:
+                attendance_id, meeting_id, emp_id, start, end = previous
+                if attendance_id is not None:
+                    c.execute(DELETE_ATTENDANCE_EVENTS_SQL, (attendance_id,))
+                    c.execute(DELETE_ATTENDANCE_SQL, (attendance_id,))
+                else:
+                    c.execute(DELETE_UNATTRIBUTED_EVENTS_SQL, (meeting_id, emp_id, start, end))
+                invalidate_meeting_cache(meeting_id)
+
+            attendance_id = None
+            if r["name"] is not None:
+                c.execute("""INSERT INTO attendance (meeting_id, emp_id, name, gender, join_time, lie_detected)
+                             VALUES (?, ?, ?, ?, ?, ?)""",
+                          (r["meeting_id"], r["emp_id"], r["name"], r["gender"],
+                           r["start"].strftime("%Y-%m-%d %H:%M:%S"), bool(r["events"])))
+                attendance_id = c.lastrowid
+            day = r["start"].strftime("%Y-%m-%d")
+            c.executemany(_INSERT_EVENT, [_event_row(attendance_id, r["meeting_id"], r["emp_id"], e, day)
+                                          for e in r["events"]])
+            c.execute("""INSERT OR REPLACE INTO batch_jobs
+                         (source, signature, meeting_id, emp_id, attendance_id, status,
+                          start_time, end_time, frames, events, finished_at)
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))""",
+                      (r["source"], r["signature"], r["meeting_id"], r["emp_id"], attendance_id, r["status"],
+                       r["start"].strftime("%Y-%m-%d %H:%M:%S"), r["end"].strftime("%Y-%m-%d %H:%M:%S"),
+                       r["frames"], len(r["events"])))
+    for meeting_id in {r["meeting_id"] for r in results}:
+        invalidate_meeting_cache(meeting_id)
+    return len(results)
 
 def update_suspicious_moments(meeting_id, emp_id, suspicious_moments):
     """Update the suspicious moments after video call"""
-    conn = sqlite3.connect('meetings.db')
-    c = conn.cursor()
-    c.execute("""
-        UPDATE attendance 
-        SET lie_detected=?, lie_timestamps=?
-        WHERE meeting_id=? AND emp_id=?
-    """, (bool(suspicious_moments), suspicious_moments, meeting_id, emp_id))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    if isinstance(suspicious_moments, str):
+        suspicious_moments = _parse_moments(suspicious_moments)
+    add_suspicious_events(meeting_id, emp_id, suspicious_moments)
+
+def event_filter(meeting_id, emp_id=None, start=None, end=None, attendance_id=None):
+    """(WHERE clause, params) selecting suspicious events"""
+    clauses, params = ["meeting_id=?"], [meeting_id]
+    if emp_id is not None:
+        clauses.append("emp_id=?")
+        params.append(emp_id)
+    if attendance_id is not None:
+        clauses.append("attendance_id=?")
+        params.append(attendance_id)
+    if start is not None:
+        clauses.append("timestamp>=?")
+        params.append(start)
+    if end is not None:
+        clauses.append("timestamp<=?")
+        params.append(end)
+    return " AND ".join(clauses), params
+
+@metrics.timed("db_get_suspicious_events")
+def get_suspicious_events(meeting_id, emp_id=None, start=None, end=None, limit=50, offset=0, attendance_id=None):
+    """One page of (timestamp, kind, detail, score) events, oldest first"""
+    where, params = event_filter(meeting_id, emp_id, start, end, attendance_id)
+    c = get_connection().cursor()
+    c.execute(EVENTS_SQL.format(where=where), params + [limit, offset])
+    return c.fetchall()
+
+def count_suspicious_events(meeting_id, emp_id=None, start=None, end=None, attendance_id=None):
+    where, params = event_filter(meeting_id, emp_id, start, end, attendance_id)
+    c = get_connection().cursor()
+    c.execute(EVENT_COUNT_SQL.format(where=where), params)
+    return c.fetchone()[0]
+
+def get_event_range(meeting_id, emp_id=None, attendance_id=None):
+    """(first, last) event timestamps, or (None, None) when there are no events"""
+    where, params = event_filter(meeting_id, emp_id, attendance_id=attendance_id)
+    c = get_connection().cursor()
+    c.execute(EVENT_RANGE_SQL.format(where=where), params)
+    return c.fetchone()
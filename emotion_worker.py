@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import Counter, deque
+
+from face_features import extract_emotion
+
+
+class EmotionWorker:
+    """Runs emotion analysis off the video path with a latest-frame-wins slot.
+
+    ``submit`` never blocks: it overwrites whatever face is waiting, so the
+    worker always analyses the freshest frame and stale ones are counted as
+    dropped. Results are smoothed by majority vote over the last ``window_s``
+    seconds so a single noisy classification doesn't flip the overlay.
+    ``clock`` dates the results for that window (wall time by default).
+    """
+
+    def __init__(self, analyze=extract_emotion, window_s=3.0, clock=time.monotonic):
+        self.analyze = analyze
+        self.window_s = window_s
+        self.clock = clock
+        self._cond = threading.Condition()
+        self._pending = None
+        self._closed = False
+        self._thread = None
+        self._results = deque()
+        self._version = 0
+        self._consumed = 0
+        self.counters = {
+            "submitted": 0,
+            "analyzed": 0,
+            "dropped": 0,
+            "failed": 0,
+            "analysis_seconds": 0.0,
+        }
+
+    def submit(self, face_img):
+        with self._cond:
+            if self._closed:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="emotion-worker", daemon=True)
+                self._thread.start()
+            if self._pending is not None:
+                self.counters["dropped"] += 1
+            # The caller reuses/draws on its frame, so keep a private copy
+            self._pending = face_img.copy()
+            self.counters["submitted"] += 1
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                face_img, self._pending = self._pending, None
+            self._analyze_one(face_img)
+
+    def _analyze_one(self, face_img):
+        started = time.monotonic()
+        emotion = self.analyze(face_img)
+        elapsed = time.monotonic() - started
+
+        with self._cond:
+            self.counters["analysis_seconds"] += elapsed
+            if emotion in (None, "unknown"):
+                self.counters["failed"] += 1
+                return
+            self.counters["analyzed"] += 1
+            self._results.append((self.clock(), emotion))
+            self._version += 1
+
+    def _prune(self, now):
+        while self._results and now - self._results[0][0] > self.window_s:
+            self._results.popleft()
+
+    def current(self):
+        """Smoothed emotion over the time window, or None if nothing recent."""
+        with self._cond:
+            self._prune(self.clock())
+            if not self._results:
+                return None
+            counts = Counter(emotion for _, emotion in self._results)
+            best = max(counts.values())
+            # On a tie prefer the most recent of the leading emotions
+            for _, emotion in reversed(self._results):
+                if counts[emotion] == best:
+                    return emotion
+
+    def take_update(self):
+        """True once per new analysis result, so callers log each result only once."""
+        with self._cond:
+            fresh = self._version != self._consumed
+            self._consumed = self._version
+            return fresh
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+        done = stats["analyzed"] + stats["failed"]
+        stats["avg_analysis_ms"] = stats.pop("analysis_seconds") / done * 1000 if done else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+class InlineEmotionWorker(EmotionWorker):
+    """EmotionWorker for recorded video: analyses on the caller's thread.
+
+    At most one face is analysed per ``interval_s`` of ``clock`` time (the
+    video position), the rest count as dropped, so results don't depend on
+    how fast the machine is.
+    """
+
+    def __init__(self, analyze=extract_emotion, window_s=3.0, clock=time.monotonic, interval_s=0.5):
+        super().__init__(analyze, window_s, clock)
+        self.interval_s = interval_s
+        self._last_analysis = None
+
+    def submit(self, face_img):
+        now = self.clock()
+        self.counters["submitted"] += 1
+        if self._last_analysis is not None and now - self._last_analysis < self.interval_s:
+            self.counters["dropped"] += 1
+            return
+        self._last_analysis = now
+        self._analyze_one(face_img)
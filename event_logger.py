@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+import database as db
+
+
+class EventSink:
+    """Write-behind buffer for one attendee's suspicious moments.
+
+    ``log`` only appends to a bounded in-memory queue, so it is safe and cheap
+    to call from the WebRTC worker thread. A background thread writes the
+    queue to the database in a single transaction whenever ``flush_size``
+    events are waiting or ``flush_interval_s`` has passed, so a crashed tab
+    loses at most one interval of events. After a failed write it retries with
+    exponential backoff (up to ``max_backoff_s``) instead of hammering the
+    database. ``close`` flushes whatever is left.
+    """
+
+    def __init__(self, meeting_id, emp_id, flush_size=50, flush_interval_s=5.0, max_pending=1000,
+                 write=db.add_suspicious_events, max_backoff_s=60.0):
+        self.meeting_id = meeting_id
+        self.emp_id = emp_id
+        self.flush_size = flush_size
+        self.flush_interval_s = flush_interval_s
+        self.max_backoff_s = max_backoff_s
+        self.write = write
+        self._pending = deque(maxlen=max_pending)
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"event-sink-{emp_id}", daemon=True)
+        self.counters = {
+            "logged": 0,
+            "written": 0,
+            "dropped": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "max_queue_depth": 0,
+            "flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+        }
+        self._thread.start()
+
+    def log(self, timestamp, info, score=None):
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._pending) == self._pending.maxlen:
+                # Queue is full (the database is failing); the oldest event is lost
+                self.counters["dropped"] += 1
+            self._pending.append((timestamp, info, score))
+            self.counters["logged"] += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], len(self._pending))
+            if len(self._pending) >= self.flush_size:
+                self._cond.notify()
+        return True
+
+    def flush(self):
+        """Write all queued events now; returns how many were written."""
+        with self._flush_lock:
+            with self._cond:
+                batch = list(self._pending)
+                self._pending.clear()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self.write(self.meeting_id, self.emp_id, batch)
+            except Exception as e:
+                print(f"Event flush error: {e}")
+                with self._cond:
+                    self.counters["failed_flushes"] += 1
+                    # Put the batch back in front of anything logged meanwhile
+                    overflow = len(batch) + len(self._pending) - self._pending.maxlen
+                    self._pending.extendleft(reversed(batch[max(overflow, 0):]))
+                    self.counters["dropped"] += max(overflow, 0)
+                return 0
+
+            elapsed = time.perf_counter() - started
+            with self._cond:
+                self.counters["written"] += len(batch)
+                self.counters["flushes"] += 1
+                self.counters["flush_seconds"] += elapsed
+                self.counters["max_flush_seconds"] = max(self.counters["max_flush_seconds"], elapsed)
+            return len(batch)
+
+    def _run(self):
+        backoff = 0.0
+        while True:
+            with self._cond:
+                if backoff:
+                    # The last write failed: wait even if the queue is full,
+                    # but still wake up at once on close
+                    self._cond.wait_for(lambda: self._closed, backoff)
+                elif not self._closed and len(self._pending) < self.flush_size:
+                    self._cond.wait(self.flush_interval_s)
+                closed = self._closed
+                failures = self.counters["failed_flushes"]
+            self.flush()
+            with self._cond:
+                failed = self.counters["failed_flushes"] > failures
+            backoff = min(max(backoff * 2, self.flush_interval_s), self.max_backoff_s) if failed else 0.0
+            if closed:
+                # Release this thread's database connection
+                db.close_connection()
+                return
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+            stats["queue_depth"] = len(self._pending)
+        stats["avg_flush_ms"] = stats.pop("flush_seconds") / stats["flushes"] * 1000 if stats["flushes"] else 0.0
+        stats["max_flush_ms"] = stats.pop("max_flush_seconds") * 1000
+        return stats
+
+    def close(self):
+        """Flush and stop the background thread; later calls do nothing."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10)
+        # Anything logged after the flusher's final pass
+        self.flush()
@@ -0,0 +1,238 @@
+"""Interchangeable face detectors.
+
+A detector is a callable taking a grayscale frame (and optionally the BGR
+frame it was converted from, which colour models such as the DNN use) and
+returning an array of (x, y, w, h) boxes, largest-confidence first where the
+backend knows it.
+``make_detector`` builds the one configured by CERTICALL_DETECTOR:
+
+- ``haar_default``: OpenCV's frontalface_default cascade (the original)
+- ``haar_alt``: the bundled haarcascade_frontalface_alt.xml
+- ``dnn``: an OpenCV DNN SSD face detector (CERTICALL_DETECTOR_DNN_PROTOTXT /
+  CERTICALL_DETECTOR_DNN_MODEL, e.g. the res10_300x300 Caffe model)
+- ``auto``: whatever the last calibration run picked
+
+CERTICALL_DETECTOR_SCALE < 1 runs the chosen backend on a downscaled frame.
+
+Calibrate on this machine with a sample clip; the result is saved for ``auto``:
+
+    python face_detectors.py --clip sample.mp4 --target-recall 0.95
+"""
+import json
+import os
+import platform
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+HAAR_CASCADES = {
+    "haar_default": cv2.data.haarcascades + "haarcascade_frontalface_default.xml",
+    "haar_alt": os.path.join(os.path.dirname(os.path.abspath(__file__)), "haarcascade_frontalface_alt.xml"),
+}
+
+
+class HaarDetector:
+    def __init__(self, cascade_path, scale_factor=1.3, min_neighbors=5):
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load Haar cascade '{cascade_path}'")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def __call__(self, gray, frame=None):
+        return self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors)
+
+
+class DnnDetector:
+    """OpenCV DNN single-shot face detector (SSD output of shape 1x1xNx7)."""
+
+    def __init__(self, prototxt, model, confidence=0.5, input_size=(300, 300), mean=(104.0, 177.0, 123.0)):
+        if not (os.path.exists(prototxt) and os.path.exists(model)):
+            raise ValueError(f"DNN detector files not found: '{prototxt}', '{model}'")
+        self.net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self.confidence = confidence
+        self.input_size = input_size
+        self.mean = mean
+
+    def __call__(self, gray, frame=None):
+        # The SSD was trained on colour; grey converted back to BGR costs recall
+        if frame is None:
+            frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        height, width = frame.shape[:2]
+        self.net.setInput(cv2.dnn.blobFromImage(frame, 1.0, self.input_size, self.mean))
+        out = self.net.forward()
+        if out.ndim != 4 or out.shape[-1] != 7:
+            # e.g. gender_deploy.prototxt, which is a classifier, not a detector
+            raise ValueError(f"Network output {out.shape} is not an SSD detection output")
+
+        rows = out[0, 0]
+        rows = rows[rows[:, 2] >= self.confidence]
+        rows = rows[np.argsort(-rows[:, 2])]
+        boxes = []
+        for x0, y0, x1, y1 in rows[:, 3:7] * (width, height, width, height):
+            x0, y0 = max(int(x0), 0), max(int(y0), 0)
+            x1, y1 = min(int(x1), width), min(int(y1), height)
+            if x1 > x0 and y1 > y0:
+                boxes.append((x0, y0, x1 - x0, y1 - y0))
+        return np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+
+class DownscaledDetector:
+    """Runs ``detector`` on a frame shrunk by ``scale`` and maps the boxes back."""
+
+    def __init__(self, detector, scale=0.5):
+        self.detector = detector
+        self.scale = scale
+
+    def __call__(self, gray, frame=None):
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if frame is not None:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        faces = np.asarray(self.detector(small, frame), dtype=np.float64).reshape(-1, 4)
+        return np.round(faces / self.scale).astype(np.int32)
+
+
+def load_calibration(path=None):
+    path = path or config.DETECTOR_CALIBRATION_PATH
+    try:
+        with open(path) as f:
+            return json.load(f)["chosen"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"No usable detector calibration in {path} ({e}); using haar_default")
+        return {"backend": "haar_default", "scale": 1.0}
+
+
+def make_detector(backend=None, scale=None):
+    """A new detector instance (they are not thread-safe; use one per session)."""
+    backend = backend or config.DETECTOR
+    scale = config.DETECTOR_SCALE if scale is None else scale
+    if backend == "auto":
+        chosen = load_calibration()
+        backend, scale = chosen["backend"], chosen["scale"]
+
+    if backend in HAAR_CASCADES:
+        detector = HaarDetector(HAAR_CASCADES[backend])
+    elif backend == "dnn":
+        detector = DnnDetector(config.DETECTOR_DNN_PROTOTXT, config.DETECTOR_DNN_MODEL,
+                               confidence=config.DETECTOR_DNN_CONFIDENCE)
+    else:
+        raise ValueError(f"Unknown face detector '{backend}'")
+    return DownscaledDetector(detector, scale) if scale < 1.0 else detector
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = min(ax + aw, bx + bw) - max(ax, bx)
+    h = min(ay + ah, by + bh) - max(ay, by)
+    if w <= 0 or h <= 0:
+        return 0.0
+    return w * h / float(aw * ah + bw * bh - w * h)
+
+
+def read_clip(path, max_frames=300, stride=1):
+    """(grayscale, BGR) frame pairs of a video file (every ``stride``-th, up to ``max_frames``)."""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    index = 0
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % stride == 0:
+            frames.append((cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), frame))
+        index += 1
+    cap.release()
+    return frames
+
+
+def evaluate(detector, frames, reference, min_iou=0.5):
+    """Latency and recall of ``detector`` against per-frame ``reference`` boxes."""
+    timings = []
+    found = expected = 0
+    for (gray, frame), truth in zip(frames, reference):
+        start = time.perf_counter()
+        faces = detector(gray, frame)
+        timings.append(time.perf_counter() - start)
+        expected += len(truth)
+        found += sum(any(_iou(t, f) >= min_iou for f in faces) for t in truth)
+    timings = np.array(timings) * 1000
+    return {
+        "mean_ms": float(timings.mean()),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "recall": found / expected if expected else 0.0,
+    }
+
+
+def calibrate(frames, backends, scales, reference, target_recall=0.95):
+    """Measure every backend/scale pair and choose the fastest that meets ``target_recall``."""
+    truth = [reference(gray) for gray, _ in frames]
+    results = []
+    for backend in backends:
+        for scale in scales:
+            try:
+                detector = make_detector(backend, scale)
+            except ValueError as e:
+                print(f"Skipping {backend}: {e}")
+                break
+            detector(*frames[0])
+            result = {"backend": backend, "scale": scale}
+            result.update(evaluate(detector, frames, truth))
+            results.append(result)
+            print(f"{backend:>12} @ {scale:.2f}: {result['mean_ms']:7.2f} ms mean, "
+                  f"{result['p95_ms']:7.2f} ms p95, recall {result['recall']:.3f}")
+
+    if not results:
+        raise ValueError(f"None of the detector backends {', '.join(backends)} could be created")
+    passing = [r for r in results if r["recall"] >= target_recall]
+    if passing:
+        best = min(passing, key=lambda r: r["mean_ms"])
+    else:
+        print(f"No detector reached recall {target_recall}; choosing the one with the best recall")
+        best = max(results, key=lambda r: (r["recall"], -r["mean_ms"]))
+    return {
+        "chosen": {"backend": best["backend"], "scale": best["scale"]},
+        "target_recall": target_recall,
+        "faces_in_reference": int(sum(len(t) for t in truth)),
+        "frames": len(frames),
+        "machine": {"node": platform.node(), "processor": platform.processor(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pick the fastest face detector that meets a recall target")
+    parser.add_argument('--clip', required=True, help="sample video with people facing the camera")
+    parser.add_argument('--target-recall', type=float, default=0.95)
+    parser.add_argument('--backends', nargs='+', default=["haar_default", "haar_alt", "dnn"])
+    parser.add_argument('--scales', nargs='+', type=float, default=[1.0, 0.75, 0.5])
+    parser.add_argument('--reference', default="haar_thorough",
+                        help="'haar_thorough' (slow full-resolution Haar) or any backend name")
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--stride', type=int, default=1)
+    parser.add_argument('--output', default=config.DETECTOR_CALIBRATION_PATH)
+    args = parser.parse_args()
+
+    frames = read_clip(args.clip, args.max_frames, args.stride)
+    if not frames:
+        raise SystemExit(f"Could not read any frames from {args.clip}")
+    if args.reference == "haar_thorough":
+        reference = HaarDetector(HAAR_CASCADES["haar_default"], scale_factor=1.05, min_neighbors=5)
+    else:
+        reference = make_detector(args.reference, 1.0)
+
+    try:
+        report = calibrate(frames, args.backends, args.scales, reference, args.target_recall)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    report["clip"] = args.clip
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    chosen = report["chosen"]
+    print(f"Chose {chosen['backend']} @ {chosen['scale']}; saved to {args.output}. "
+          f"Set CERTICALL_DETECTOR=auto to use it.")
@@ -1,20 +1,30 @@
 import cv2
-from deepface import DeepFace
 
-# Load the Haar Cascade for face detection
-face_cascade = cv2.CascadeClassifier("haarcascade_frontalface_alt.xml")
+import metrics
+from face_detectors import make_detector
 
-def detect_faces(frame):
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.3, minNeighbors=5)
-    return faces
+# The configured face detector (CERTICALL_DETECTOR), created on first use
+face_detector = None
 
+@metrics.timed("detect")
+def detect_faces(frame, gray=None):
+    global face_detector
+    if face_detector is None:
+        face_detector = make_detector()
+    # Callers that already have the grayscale frame pass it to skip the conversion
+    if gray is None:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return face_detector(gray, frame)
+
+@metrics.timed("emotion_analysis")
 def extract_emotion(face_img):
     try:
-        # Analyze emotion using DeepFace
+        # Analyze emotion using DeepFace (imported here: it pulls in TensorFlow)
+        from deepface import DeepFace
         analysis = DeepFace.analyze(face_img, actions=['emotion'], enforce_detection=False)
         emotion = analysis[0]['dominant_emotion']
         return emotion
     except Exception as e:
+        metrics.inc("emotion_errors")
         print(f"[ERROR] Emotion detection failed: {e}")
         return "unknown"
\ No newline at end of file
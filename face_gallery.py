@@ -0,0 +1,424 @@
+import json
+import os
+import struct
+from contextlib import contextmanager
+
+import numpy as np
+
+# On-disk layout of one gallery segment (a single file):
+#   magic (8 bytes) | format version (uint32) | header length (uint32) | JSON header
+#   then, each aligned to ALIGNMENT bytes: matrix (float32, rows x dim),
+#   squared row norms (float64, rows), labels (int64, rows).
+# The arrays are opened with np.memmap so every process on a host shares the
+# same page-cache copy instead of holding its own.
+MAGIC = b'CCGALLRY'
+FORMAT_VERSION = 2
+ALIGNMENT = 64
+PREAMBLE = struct.Struct('<8sII')
+
+# The gallery directory holds segment files plus snapshot.json, which names
+# the segments that make up the current gallery, their class names and a
+# version. Enrolling a person writes one new segment and replaces
+# snapshot.json atomically; segment files are never modified, so running
+# processes map only the segments they haven't seen yet.
+DEFAULT_DATASET_PATH = './face_dataset/'
+DEFAULT_GALLERY_DIR = './face_gallery/'
+SNAPSHOT_FILE = 'snapshot.json'
+# Name -> class id, kept next to the .npy files so ids never change once given
+IDS_FILE = 'ids.json'
+FACE_SHAPE = (100, 100, 3)
+
+
+class Gallery:
+    def __init__(self, matrix, norms, labels, names, path=None):
+        self.matrix = matrix
+        self.norms = norms
+        self.labels = labels
+        self.names = names
+        self.path = path
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+
+class GallerySnapshot:
+    """One published version of the gallery: its segments and class names."""
+
+    def __init__(self, version, segments, names, sources):
+        self.version = version
+        self.segments = segments
+        self.names = names
+        self.sources = sources
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _write_json(path, obj):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def source_files(dataset_path=DEFAULT_DATASET_PATH):
+    """Per-person .npy files in directory order (only used to seed ids.json)."""
+    return [fx for fx in os.listdir(dataset_path) if fx.endswith('.npy')]
+
+
+def source_signature(dataset_path=DEFAULT_DATASET_PATH):
+    signature = []
+    for fx in sorted(source_files(dataset_path)):
+        st = os.stat(os.path.join(dataset_path, fx))
+        signature.append([fx, st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def load_ids(dataset_path=DEFAULT_DATASET_PATH):
+    try:
+        with open(os.path.join(dataset_path, IDS_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def assign_ids(names, dataset_path=DEFAULT_DATASET_PATH):
+    """Class ids for ``names``, giving new names the next free ids.
+
+    A dataset without ids.json is numbered in directory order, which is
+    how class ids were assigned before, so the recognizer's outputs keep
+    their meaning. Call with the gallery lock held.
+    """
+    ids = load_ids(dataset_path)
+    if not ids:
+        ids = {fx[:-4]: class_id for class_id, fx in enumerate(source_files(dataset_path))}
+    new = [name for name in names if name not in ids]
+    for name in new:
+        ids[name] = max(ids.values(), default=-1) + 1
+    if new or not os.path.exists(os.path.join(dataset_path, IDS_FILE)):
+        _write_json(os.path.join(dataset_path, IDS_FILE), ids)
+    return {name: ids[name] for name in names}
+
+
+@contextmanager
+def gallery_lock(gallery_dir=DEFAULT_GALLERY_DIR):
+    """Serialise writers (enrollments and rebuilds) across processes."""
+    os.makedirs(gallery_dir, exist_ok=True)
+    with open(os.path.join(gallery_dir, '.lock'), 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, version, header_len = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} face gallery segment")
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def write_segment(path, entries):
+    """Pack ``(class_id, name, samples)`` entries into one segment file.
+
+    Source arrays are streamed one at a time, so building never needs the whole
+    gallery in memory. The file is written next to its destination and moved
+    into place atomically, so readers never see a partial segment.
+    """
+    entries = [(class_id, name, data.reshape(data.shape[0], -1)) for class_id, name, data in entries]
+    if not entries:
+        raise ValueError("No face data to write")
+    rows = sum(data.shape[0] for _, _, data in entries)
+    dim = entries[0][2].shape[1]
+
+    header = {
+        'rows': rows,
+        'dim': dim,
+        'classes': [[class_id, name] for class_id, name, _ in entries],
+    }
+    # Offsets depend on the header length, which depends on the offsets; reserve room first.
+    header.update(matrix_offset=0, norms_offset=0, labels_offset=0)
+    header_len = len(json.dumps(header).encode('utf-8')) + 64
+    matrix_offset = _align(PREAMBLE.size + header_len)
+    norms_offset = _align(matrix_offset + rows * dim * 4)
+    labels_offset = _align(norms_offset + rows * 8)
+    header.update(matrix_offset=matrix_offset, norms_offset=norms_offset, labels_offset=labels_offset)
+    header_bytes = json.dumps(header).encode('utf-8').ljust(header_len)
+    total = labels_offset + rows * 8
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(header_bytes)
+        f.truncate(total)
+
+    matrix = np.memmap(tmp_path, dtype=np.float32, mode='r+', offset=matrix_offset, shape=(rows, dim))
+    norms = np.memmap(tmp_path, dtype=np.float64, mode='r+', offset=norms_offset, shape=(rows,))
+    labels = np.memmap(tmp_path, dtype=np.int64, mode='r+', offset=labels_offset, shape=(rows,))
+    start = 0
+    for class_id, name, data in entries:
+        end = start + data.shape[0]
+        if data.shape[1] != dim:
+            raise ValueError(f"{name} has {data.shape[1]} features, expected {dim}")
+        matrix[start:end] = data
+        norms[start:end] = np.einsum('ij,ij->i', matrix[start:end], matrix[start:end], dtype=np.float64)
+        labels[start:end] = class_id
+        start = end
+    for array in (matrix, norms, labels):
+        array.flush()
+    del matrix, norms, labels
+
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_segment(path):
+    header = read_header(path)
+    rows, dim = header['rows'], header['dim']
+    matrix = np.memmap(path, dtype=np.float32, mode='r', offset=header['matrix_offset'], shape=(rows, dim))
+    norms = np.memmap(path, dtype=np.float64, mode='r', offset=header['norms_offset'], shape=(rows,))
+    labels = np.memmap(path, dtype=np.int64, mode='r', offset=header['labels_offset'], shape=(rows,))
+    names = {class_id: name for class_id, name in header['classes']}
+    return Gallery(matrix, norms, labels, names, path)
+
+
+def read_snapshot(gallery_dir=DEFAULT_GALLERY_DIR):
+    try:
+        with open(os.path.join(gallery_dir, SNAPSHOT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def snapshot_stamp(gallery_dir=DEFAULT_GALLERY_DIR):
+    """Changes whenever a new snapshot is published; one stat call."""
+    try:
+        st = os.stat(os.path.join(gallery_dir, SNAPSHOT_FILE))
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _publish(gallery_dir, segments, names, sources):
+    """Make ``segments`` the current gallery; returns the new version."""
+    previous = read_snapshot(gallery_dir)
+    version = previous['version'] + 1 if previous else 1
+    _write_json(os.path.join(gallery_dir, SNAPSHOT_FILE), {
+        'version': version,
+        'segments': segments,
+        'names': {str(class_id): name for class_id, name in sorted(names.items())},
+        'sources': sources,
+    })
+    # Segments dropped by a rebuild. Processes still mapping one keep it
+    # until they reload (deleting a mapped file fails on Windows; it is
+    # then removed by a later rebuild).
+    for fx in os.listdir(gallery_dir):
+        if fx.endswith('.bin') and fx not in segments:
+            try:
+                os.remove(os.path.join(gallery_dir, fx))
+            except OSError:
+                pass
+    return version
+
+
+def _segment_name(gallery_dir):
+    previous = read_snapshot(gallery_dir)
+    return f"segment-{(previous['version'] + 1 if previous else 1):06d}.bin"
+
+
+def _rebuild(dataset_path, gallery_dir):
+    signature = source_signature(dataset_path)
+    if not signature:
+        raise ValueError(f"No .npy face data found in {dataset_path}")
+    people = [fx[:-4] for fx, _, _ in signature]
+    ids = assign_ids(people, dataset_path)
+    segment = _segment_name(gallery_dir)
+    write_segment(os.path.join(gallery_dir, segment),
+                  [(ids[name], name, np.load(os.path.join(dataset_path, f"{name}.npy"), mmap_mode='r'))
+                   for name in people])
+    return _publish(gallery_dir, [segment], {class_id: name for name, class_id in ids.items()}, signature)
+
+
+def rebuild(dataset_path=DEFAULT_DATASET_PATH, gallery_dir=DEFAULT_GALLERY_DIR):
+    """Compile every .npy file into a single new segment (also compacts enrollments)."""
+    with gallery_lock(gallery_dir):
+        return _rebuild(dataset_path, gallery_dir)
+
+
+def is_stale(dataset_path=DEFAULT_DATASET_PATH, gallery_dir=DEFAULT_GALLERY_DIR):
+    """True when .npy files were added or changed other than through ``enroll``."""
+    snapshot = read_snapshot(gallery_dir)
+    if snapshot is None:
+        return True
+    return snapshot['sources'] != source_signature(dataset_path)
+
+
+def _save_npy(path, samples):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, samples)
+    os.replace(tmp_path, path)
+
+
+def _append_npy(path, samples, chunk=4096):
+    """Rewrite ``path`` with ``samples`` appended, streaming the old rows from a memory map."""
+    existing = np.load(path, mmap_mode='r')
+    rows = existing.reshape(existing.shape[0], -1)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.result_type(rows.dtype, samples.dtype),
+                                    shape=(len(rows) + len(samples), rows.shape[1]))
+    for first in range(0, len(rows), chunk):
+        last = min(first + chunk, len(rows))
+        out[first:last] = rows[first:last]
+    out[len(rows):] = samples
+    out.flush()
+    # Windows can't replace a file that is still mapped
+    del out, rows, existing
+    os.replace(tmp_path, path)
+
+
+def enroll(name, samples, dataset_path=DEFAULT_DATASET_PATH, gallery_dir=DEFAULT_GALLERY_DIR):
+    """Add face samples for ``name`` (new or already enrolled) without a rebuild.
+
+    ``samples`` are 100x100 BGR uint8 faces, as an (n, 100, 100, 3) array or
+    flattened rows. They are appended to ``<name>.npy`` and written as one
+    new segment, then a new snapshot is published; running processes pick
+    it up on their next reload check. The first enrollment into an empty
+    dataset publishes version 1. Returns (class_id, version).
+    """
+    samples = np.asarray(samples, dtype=np.uint8)
+    samples = samples.reshape(samples.shape[0] if samples.ndim > 1 else 1, -1)
+    if samples.shape[1] != int(np.prod(FACE_SHAPE)) or not len(samples):
+        raise ValueError(f"Expected 100x100x3 face samples, got {samples.shape}")
+    if not name or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError(f"Invalid name {name!r}")
+
+    os.makedirs(dataset_path, exist_ok=True)
+    with gallery_lock(gallery_dir):
+        if source_signature(dataset_path):
+            if is_stale(dataset_path, gallery_dir):
+                _rebuild(dataset_path, gallery_dir)
+            snapshot = read_snapshot(gallery_dir)
+        else:
+            # Empty dataset: nothing to rebuild or carry over
+            snapshot = None
+        class_id = assign_ids([name], dataset_path)[name]
+
+        npy_path = os.path.join(dataset_path, f"{name}.npy")
+        if os.path.exists(npy_path):
+            _append_npy(npy_path, samples)
+        else:
+            _save_npy(npy_path, samples)
+
+        segment = _segment_name(gallery_dir)
+        write_segment(os.path.join(gallery_dir, segment), [(class_id, name, samples)])
+        segments = snapshot['segments'] if snapshot else []
+        names = {int(i): n for i, n in snapshot['names'].items()} if snapshot else {}
+        names[class_id] = name
+        version = _publish(gallery_dir, segments + [segment], names, source_signature(dataset_path))
+    return class_id, version
+
+
+def open_snapshot(gallery_dir=DEFAULT_GALLERY_DIR, cache=None):
+    """The current snapshot; segments already in ``cache`` (path -> Gallery) are reused."""
+    snapshot = read_snapshot(gallery_dir)
+    if snapshot is None:
+        raise ValueError(f"No gallery snapshot in {gallery_dir}")
+    cache = {} if cache is None else cache
+    segments = []
+    for fx in snapshot['segments']:
+        path = os.path.join(gallery_dir, fx)
+        if path not in cache:
+            cache[path] = open_segment(path)
+        segments.append(cache[path])
+    names = {int(class_id): name for class_id, name in snapshot['names'].items()}
+    return GallerySnapshot(snapshot['version'], segments, names, snapshot['sources'])
+
+
+def load_snapshot(dataset_path=DEFAULT_DATASET_PATH, gallery_dir=DEFAULT_GALLERY_DIR, cache=None):
+    """Open the gallery, rebuilding it first only if the .npy files changed behind its back."""
+    if is_stale(dataset_path, gallery_dir):
+        with gallery_lock(gallery_dir):
+            if is_stale(dataset_path, gallery_dir):
+                _rebuild(dataset_path, gallery_dir)
+    return open_snapshot(gallery_dir, cache)
+
+
+def faces_from_video(path, max_samples=50, stride=5):
+    """100x100 crops of the largest face in every ``stride``-th frame of a video."""
+    import cv2
+    from face_detectors import make_detector
+    from face_preprocess import FacePreprocessor
+
+    detector = make_detector()
+    preprocessor = FacePreprocessor()
+    cap = cv2.VideoCapture(path)
+    faces = []
+    index = 0
+    while len(faces) < max_samples:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        index += 1
+        if (index - 1) % stride:
+            continue
+        boxes = detector(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), frame)
+        if len(boxes):
+            x, y, w, h = max(boxes, key=lambda b: b[2] * b[3])
+            faces.append(preprocessor.crop(frame[y:y+h, x:x+w]).copy())
+    cap.release()
+    return np.array(faces, dtype=np.uint8).reshape(-1, *FACE_SHAPE)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Enroll people and compile ./face_dataset/*.npy into the gallery")
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--gallery', default=DEFAULT_GALLERY_DIR)
+    commands = parser.add_subparsers(dest='command')
+    build = commands.add_parser('compile', help="rebuild the gallery if the .npy files changed (the default)")
+    build.add_argument('--force', action='store_true', help="rebuild (and compact enrollments) even if unchanged")
+    add = commands.add_parser('enroll', help="add one person's face samples to the running gallery")
+    add.add_argument('name')
+    source = add.add_mutually_exclusive_group(required=True)
+    source.add_argument('--npy', help="array of 100x100x3 uint8 BGR faces")
+    source.add_argument('--video', help="clip of the person facing the camera")
+    add.add_argument('--max-samples', type=int, default=50)
+    add.add_argument('--stride', type=int, default=5, help="use every n-th frame of --video")
+    commands.add_parser('list', help="show the enrolled people and their class ids")
+    args = parser.parse_args()
+
+    if args.command == 'enroll':
+        samples = np.load(args.npy) if args.npy else faces_from_video(args.video, args.max_samples, args.stride)
+        if not len(samples):
+            raise SystemExit(f"No faces found in {args.video}")
+        class_id, version = enroll(args.name, samples, args.dataset, args.gallery)
+        print(f"Enrolled {args.name} as class {class_id} with {len(samples)} samples; gallery version {version}")
+    elif args.command == 'list':
+        snapshot = load_snapshot(args.dataset, args.gallery)
+        for class_id, name in sorted(snapshot.names.items()):
+            print(f"{class_id:>5}  {name}")
+        print(f"Version {snapshot.version}: {len(snapshot)} samples in {len(snapshot.segments)} segments")
+    else:
+        if getattr(args, 'force', False) or is_stale(args.dataset, args.gallery):
+            version = rebuild(args.dataset, args.gallery)
+            print(f"Compiled {args.gallery} (version {version})")
+        else:
+            print(f"{args.gallery} is up to date")
+        snapshot = open_snapshot(args.gallery)
+        print(f"{len(snapshot)} samples, {len(snapshot.names)} people, {len(snapshot.segments)} segments")
@@ -0,0 +1,43 @@
+import cv2
+import numpy as np
+
+RECOGNIZER_SIZE = (100, 100)
+GENDER_SIZE = (96, 96)
+
+
+class FacePreprocessor:
+    """Turns one BGR face crop into every model input, each computed once.
+
+    ``prepare`` resizes the crop once per input size and scales it into
+    preallocated float32 buffers that the consumers share:
+
+    - ``face``: the 100x100 uint8 crop, also what emotion analysis gets
+    - ``pixels``: the same crop as a flat float32 vector for the gallery kNN
+    - ``recognizer``: ``pixels`` / 255 in the recogniser's 100x100x3 shape
+    - ``gender``: the 96x96 crop / 255 for the gender classifier
+
+    The buffers are overwritten by the next call, so consumers must be done
+    with them (or copy them) first. Not thread-safe; use one per thread.
+    """
+
+    def __init__(self):
+        width, height = RECOGNIZER_SIZE
+        self.face = np.empty((height, width, 3), dtype=np.uint8)
+        self.pixels = np.empty(height * width * 3, dtype=np.float32)
+        self.recognizer = np.empty((height, width, 3), dtype=np.float32)
+        width, height = GENDER_SIZE
+        self._gender_face = np.empty((height, width, 3), dtype=np.uint8)
+        self.gender = np.empty((height, width, 3), dtype=np.float32)
+
+    def crop(self, face_roi):
+        """Resize the crop into ``face`` only (all the emotion path needs)."""
+        cv2.resize(face_roi, RECOGNIZER_SIZE, dst=self.face)
+        return self.face
+
+    def prepare(self, face_roi):
+        self.crop(face_roi)
+        np.copyto(self.pixels, self.face.reshape(-1))
+        np.divide(self.pixels, 255.0, out=self.recognizer.reshape(-1))
+        cv2.resize(face_roi, GENDER_SIZE, dst=self._gender_face)
+        np.divide(self._gender_face, 255.0, out=self.gender, dtype=np.float32)
+        return self
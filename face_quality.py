@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+
+
+class FrameQualityGate:
+    """Cheap checks that decide whether a face is worth running the models on.
+
+    ``assess`` looks at the face box of a grayscale frame:
+
+    - sharpness: variance of the Laplacian of the face, resized to a fixed
+      ``probe_size`` square so the value doesn't depend on the face size
+    - brightness: mean grey level of the face
+    - size: the shorter side of the box in pixels
+    - stability: overlap (IoU) with the previous frame's box
+
+    Each check scores 0.5 at its threshold and 1.0 at twice the margin. The
+    frame's score is its weakest check, and the frame passes when no check
+    is below its threshold. Callers skip inference for failing frames and
+    can weight results from passing ones by the score. Keeps the previous
+    box, so use one gate per session.
+    """
+
+    def __init__(self, min_sharpness=40.0, min_brightness=40.0, max_brightness=220.0,
+                 min_face_px=60, min_stability=0.5, probe_size=96):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_face_px = min_face_px
+        self.min_stability = min_stability
+        self.probe_size = probe_size
+        self._probe = np.empty((probe_size, probe_size), dtype=np.uint8)
+        self.counters = {
+            "assessed": 0,
+            "passed": 0,
+            "skipped": 0,
+            "blurry": 0,
+            "dark": 0,
+            "bright": 0,
+            "small": 0,
+            "unstable": 0,
+        }
+        self.reset()
+
+    def reset(self):
+        self._prev_box = None
+        self.last = None
+
+    @staticmethod
+    def _margin(value, threshold):
+        return min(value / (2.0 * threshold), 1.0) if threshold > 0 else 1.0
+
+    @staticmethod
+    def _iou(a, b):
+        ax, ay, aw, ah = a
+        bx, by, bw, bh = b
+        w = min(ax + aw, bx + bw) - max(ax, bx)
+        h = min(ay + ah, by + bh) - max(ay, by)
+        if w <= 0 or h <= 0:
+            return 0.0
+        inter = w * h
+        return inter / float(aw * ah + bw * bh - inter)
+
+    def assess(self, gray, box):
+        """Return (score, reasons) for the face ``box``; reasons is empty when it passes."""
+        x, y, w, h = (int(v) for v in box)
+        face = gray[max(y, 0):y + h, max(x, 0):x + w]
+        if face.size == 0:
+            return 0.0, ("small",)
+
+        cv2.resize(face, (self.probe_size, self.probe_size), dst=self._probe, interpolation=cv2.INTER_AREA)
+        _, stddev = cv2.meanStdDev(cv2.Laplacian(self._probe, cv2.CV_32F))
+        sharpness = float(stddev[0, 0]) ** 2
+        brightness = float(cv2.mean(self._probe)[0])
+        size = min(w, h)
+        stability = self._iou(self._prev_box, (x, y, w, h)) if self._prev_box is not None else 1.0
+        self._prev_box = (x, y, w, h)
+
+        scores = {
+            "blurry": self._margin(sharpness, self.min_sharpness),
+            "dark": self._margin(brightness, self.min_brightness),
+            "bright": self._margin(255.0 - brightness, 255.0 - self.max_brightness),
+            "small": self._margin(size, self.min_face_px),
+            "unstable": self._margin(stability, self.min_stability),
+        }
+        reasons = tuple(reason for reason, score in scores.items() if score < 0.5)
+        score = min(scores.values())
+
+        self.counters["assessed"] += 1
+        self.counters["passed" if not reasons else "skipped"] += 1
+        for reason in reasons:
+            self.counters[reason] += 1
+        self.last = {
+            "sharpness": sharpness,
+            "brightness": brightness,
+            "size": size,
+            "stability": stability,
+            "score": score,
+        }
+        return score, reasons
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["inference_avoided_rate"] = stats["skipped"] / stats["assessed"] if stats["assessed"] else 0.0
+        return stats
@@ -2,109 +2,353 @@ import cv2
 import numpy as np
 import os
 import threading
-import sounddevice as sd
-import tempfile
-import scipy.io.wavfile as wavfile
-from datetime import datetime
-from face_features import detect_faces, extract_emotion
-from voice_features import extract_voice_features
-from keras.models import load_model
-
-# Load Keras models
-character_model = load_model("Face_Recognizer.keras")
-gender_model = load_model("Gender_Classifier.keras")
-
-# Initialize models and variables
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-face_dataset = face_labels = []
+import time
+import ann_index
+import config
+import metrics
+import model_registry
+import model_runtime
+from face_detectors import make_detector
+from face_features import extract_emotion
+from face_gallery import load_snapshot, open_snapshot, snapshot_stamp
+from face_preprocess import FacePreprocessor
+from face_quality import FrameQualityGate
+from face_search import GallerySearch, SegmentedGallerySearch
+from face_tracker import FaceTracker
+from emotion_worker import EmotionWorker
+from analysis_session import AnalysisSession
+from inference_batcher import InferenceDispatcher
+from voice_features import extract_voice_features_array
+
+# Heavy models are loaded on first use through model_registry, not at import,
+# so pages that never analyse video don't pay for them. With an exported
+# runtime (CERTICALL_MODEL_RUNTIME) TensorFlow is never imported at all.
+model_registry.register_loader("character_model", lambda: model_runtime.load_model("Face_Recognizer.keras"))
+model_registry.register_loader("gender_model", lambda: model_runtime.load_model("Gender_Classifier.keras"))
+
+# Requests from all sessions in this process are batched per model
+model_registry.register_loader(
+    "character_dispatcher",
+    lambda: InferenceDispatcher(model_registry.get("character_model"), name="recognizer"))
+model_registry.register_loader(
+    "gender_dispatcher",
+    lambda: InferenceDispatcher(model_registry.get("gender_model"), name="gender"))
+
+# Initialize models and variables. Everything here is shared by all sessions
+# and only read on the hot path; per-call state lives in AnalysisSession.
+gallery_search = None
 names = {}
-lie_signs = 0
-audio_lie_signs = 0
-frame_count = 0
-current_analysis = {
-    "name": None,
-    "gender": None,
-    "lie_detected": False,
-    "lie_timestamps": []
-}
+
+# The gallery snapshot this process serves. A newer one (published by
+# face_gallery.enroll) is swapped in by refresh_gallery; only its new
+# segments are mapped, and recognitions already running keep the old one.
+_gallery_stamp = None
+_gallery_checked = 0.0
+_gallery_segments = {}
+_gallery_searches = {}
+_gallery_reload_lock = threading.Lock()
+_ann_indexes = {}
+
+def new_detector():
+    # Each session gets its own detector (CERTICALL_DETECTOR), so concurrent
+    # calls never share one
+    return metrics.timed("detect")(make_detector())
+
+def new_session(voice_monitor=None):
+    """Fresh per-call analysis state sharing this process's models and gallery."""
+    detector = new_detector()
+    tracker = FaceTracker(
+        detector,
+        detect_every=config.TRACKING_DETECT_EVERY,
+        min_confidence=config.TRACKING_MIN_CONFIDENCE,
+        roi_scale=config.TRACKING_ROI_SCALE,
+    ) if config.TRACKING_ENABLED else None
+    quality_gate = FrameQualityGate(
+        min_sharpness=config.QUALITY_MIN_SHARPNESS,
+        min_brightness=config.QUALITY_MIN_BRIGHTNESS,
+        max_brightness=config.QUALITY_MAX_BRIGHTNESS,
+        min_face_px=config.QUALITY_MIN_FACE_PX,
+        min_stability=config.QUALITY_MIN_STABILITY,
+    ) if config.QUALITY_GATE else None
+    return AnalysisSession(
+        detector,
+        tracker=tracker,
+        emotion_worker=EmotionWorker(lambda face: inference_backend().emotion(face),
+                                     window_s=config.EMOTION_WINDOW_S),
+        voice_monitor=voice_monitor,
+        quality_gate=quality_gate,
+        metrics=metrics.session_metrics(),
+    )
+
+# Backs the session-less calls kept for existing callers (single user only)
+_default_session = None
+
+def default_session():
+    global _default_session
+    if _default_session is None:
+        _default_session = new_session()
+    return _default_session
+
+def _gallery_stamp_now():
+    # A rebuilt ANN index is swapped in like a new snapshot
+    stamp = snapshot_stamp(config.GALLERY_DIR)
+    if stamp is not None and config.ANN_INDEX:
+        try:
+            st = os.stat(ann_index.index_path(config.GALLERY_DIR))
+            stamp += (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+    return stamp
+
+def _with_ann_index(snapshot, searches):
+    """Serve the segments the ANN index covers through it; later ones stay exact."""
+    path = ann_index.index_path(config.GALLERY_DIR)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        print(f"CERTICALL_ANN_INDEX is on but {path} is missing; run `python ann_index.py build`")
+        return searches
+    key = (st.st_ino, st.st_mtime_ns)
+    if key not in _ann_indexes:
+        _ann_indexes.clear()
+        _ann_indexes[key] = ann_index.IvfIndex.load(path)
+    index = _ann_indexes[key]
+    if not index.covers([os.path.basename(s.path) for s in snapshot.segments]):
+        print(f"{path} was built for another gallery; rebuild it with `python ann_index.py build`")
+        return searches
+    covered = len(index.segments)
+    return ([ann_index.AnnGallerySearch(index, searches[:covered], config.ANN_NPROBE, config.ANN_REFINE)]
+            + searches[covered:])
+
+def _install_gallery(snapshot, stamp):
+    global names, gallery_search, _gallery_stamp
+    searches = {}
+    for segment in snapshot.segments:
+        search = _gallery_searches.get(segment.path)
+        if search is None:
+            search = GallerySearch(segment.matrix, segment.labels, norms=segment.norms)
+        searches[segment.path] = search
+    # Forget segments a rebuild dropped; they are unmapped once unused
+    _gallery_searches.clear()
+    _gallery_searches.update(searches)
+    for path in list(_gallery_segments):
+        if path not in searches:
+            del _gallery_segments[path]
+
+    parts = list(searches.values())
+    if config.ANN_INDEX:
+        parts = _with_ann_index(snapshot, parts)
+    # Ids are stable and only ever added, so the new names are safe to use
+    # with the old search until it is replaced
+    names = snapshot.names
+    gallery_search = SegmentedGallerySearch(parts)
+    _gallery_stamp = stamp
+    return gallery_search
 
 def load_models():
-    global face_dataset, face_labels, names
-
-    dataset_path = './face_dataset/'
-    face_data = []
-    labels = []
-    class_id = 0
-
-    for fx in os.listdir(dataset_path):
-        if fx.endswith('.npy'):
-            names[class_id] = fx[:-4]
-            data_item = np.load(os.path.join(dataset_path, fx))
-            face_data.append(data_item)
-            labels.extend([class_id] * data_item.shape[0])
-            class_id += 1
-
-    face_dataset = np.concatenate(face_data, axis=0)
-    face_labels = np.array(labels).reshape(-1, 1)
-
-def distance(v1, v2):
-    return np.sqrt(np.sum((v1 - v2) ** 2))
-
-def knn(train, test, k=5):
-    distances = []
-    for i in range(train.shape[0]):
-        dist = distance(train[i, :-1], test)
-        distances.append((dist, train[i, -1]))
-
-    distances = sorted(distances, key=lambda x: x[0])[:k]
-    labels = [item[1] for item in distances]
-    unique_labels, counts = np.unique(labels, return_counts=True)
-    return unique_labels[np.argmax(counts)]
+    # The gallery segments are memory-mapped and shared between processes;
+    # they are rebuilt only when the per-person .npy files change other than
+    # through enrollment.
+    # Stamp first, so a snapshot published while this one opens is picked
+    # up by the next refresh
+    stamp = _gallery_stamp_now()
+    snapshot = load_snapshot(config.GALLERY_DATASET_PATH, config.GALLERY_DIR, _gallery_segments)
+    if stamp is None:
+        # The first snapshot was built just now
+        stamp = _gallery_stamp_now()
+    return _install_gallery(snapshot, stamp)
+
+model_registry.register_loader("gallery_search", load_models)
+
+def refresh_gallery(force=False):
+    """Swap in a newer gallery snapshot if one was published; True when swapped.
+
+    Checks at most every GALLERY_RELOAD_INTERVAL_S (one stat call). Only one
+    thread reloads; the others carry on with the current gallery meanwhile.
+    """
+    global _gallery_checked
+    if _gallery_stamp is None or not model_registry.is_loaded("gallery_search"):
+        return False
+    now = time.monotonic()
+    if not force and now - _gallery_checked < config.GALLERY_RELOAD_INTERVAL_S:
+        return False
+    if not _gallery_reload_lock.acquire(blocking=False):
+        return False
+    try:
+        _gallery_checked = now
+        stamp = _gallery_stamp_now()
+        if stamp is None or stamp == _gallery_stamp:
+            return False
+        with metrics.process.time("gallery_reload"):
+            search = _install_gallery(open_snapshot(config.GALLERY_DIR, _gallery_segments), stamp)
+        model_registry.register("gallery_search", search)
+        metrics.inc("gallery_reloads")
+        return True
+    except (OSError, ValueError) as e:
+        print(f"Gallery reload error: {e}")
+        return False
+    finally:
+        _gallery_reload_lock.release()
+
+def _create_inference_backend():
+    if config.INFERENCE_SERVER:
+        from inference_server import InferenceServer
+        return InferenceServer(
+            workers=config.INFERENCE_WORKERS or None,
+            slot_bytes=config.INFERENCE_SLOT_BYTES,
+            timeout_s=config.INFERENCE_TIMEOUT_S,
+        )
+    from inference_server import InProcessBackend
+    return InProcessBackend()
+
+model_registry.register_loader("inference_backend", _create_inference_backend)
+
+def inference_backend():
+    """Where face crops are analysed: worker processes, or this process (the default)."""
+    return model_registry.get("inference_backend")
+
+# One set of preprocessing buffers per thread; a session is driven by one
+# thread at a time and the models are called synchronously from it.
+_local = threading.local()
+
+def _preprocessor():
+    if not hasattr(_local, "preprocessor"):
+        _local.preprocessor = FacePreprocessor()
+    return _local.preprocessor
+
+def __getattr__(name):
+    # Keep face_recog.character_model / gender_model working without eager loading
+    if name in ("character_model", "gender_model"):
+        return model_registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warm_up(background=True):
+    """Load every model and run one dummy inference so the first real frame is fast."""
+    def run():
+        try:
+            model_registry.get("gallery_search")
+            model_registry.get("character_dispatcher").infer(np.zeros((100, 100, 3), dtype=np.float32))
+            model_registry.get("gender_dispatcher").infer(np.zeros((96, 96, 3), dtype=np.float32))
+            extract_emotion(np.zeros((48, 48, 3), dtype=np.uint8))
+        except Exception as e:
+            print(f"Model warm-up error: {e}")
+    return model_registry.warm_up("face_recog", run, background)
 
 def analyze_voice():
-    global audio_lie_signs
     try:
         duration = 5  # seconds
         fs = 44100
+        import sounddevice as sd
         audio = sd.rec(int(duration * fs), samplerate=fs, channels=1)
         sd.wait()
-        wavfile.write("temp.wav", fs, audio)
-        features = extract_voice_features("temp.wav")
-        return features["pitch"] > 220
+        features = extract_voice_features_array(audio[:, 0], fs, features=("pitch",))
+        return features["pitch"] > config.VOICE_PITCH_THRESHOLD_HZ
     except Exception as e:
         print(f"Voice analysis error: {e}")
         return False
 
-def process_basic_info_frame(frame):
+def locate_face(frame, session, gray=None):
+    """Return the (x, y, w, h) box of the face to analyse, or None."""
+    if gray is None:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if session.tracker is not None:
+        return session.tracker.update(gray, frame)
+    faces = session.detector(gray, frame)
+    return faces[0] if len(faces) else None
+
+def get_tracking_stats(session=None):
+    session = session or default_session()
+    return session.tracker.stats() if session.tracker is not None else None
+
+def assess_quality(gray, box, session):
+    """Score the face before any model runs; returns why to skip it (empty to go ahead)."""
+    if session.quality_gate is None:
+        session.quality = 1.0
+        return ()
+    session.quality, reasons = session.quality_gate.assess(gray, box)
+    return reasons
+
+def get_quality_stats(session=None):
+    session = session or default_session()
+    return session.quality_gate.stats() if session.quality_gate is not None else None
+
+def draw_skipped(frame, box, reasons):
+    x, y, w, h = box
+    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 165, 255), 2)
+    cv2.putText(frame, f"Low quality: {', '.join(reasons)}", (x, y-20),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+
+def identify_face(face_roi, session_metrics=None):
+    """Recognise one BGR face crop with the shared models.
+
+    Returns (name, gender, name_confidence, gender_confidence); confidences
+    are in [0, 1]. The stage timings go to ``session_metrics`` (which rolls
+    up into the process totals) or, when None, to the process totals only,
+    as in the inference server's workers.
+    """
+    m = session_metrics or metrics.process
+    refresh_gallery()
+    gallery_search = model_registry.get("gallery_search")
+    with m.time("preprocess"):
+        inputs = _preprocessor().prepare(face_roi)
+
+    # Character recognition using both Keras model and knn
+    with m.time("recognize"):
+        scores = model_registry.get("character_dispatcher").infer(inputs.recognizer)
+    keras_pred = int(np.argmax(scores))
+
+    # Use keras_pred if in names, else fallback to knn_pred (confidence is then
+    # the neighbours' vote share). People enrolled after the recognizer was
+    # trained have ids it can't output, so the kNN also decides when the
+    # recognizer is unsure and the gallery knows such people.
+    if keras_pred in names and (scores[keras_pred] >= config.RECOGNIZER_MIN_CONFIDENCE
+                                or gallery_search.num_classes <= len(scores)):
+        name, name_confidence = names[keras_pred], float(scores[keras_pred])
+    else:
+        with m.time("knn"):
+            knn_pred, name_confidence = gallery_search.vote(inputs.pixels)
+        name = names.get(knn_pred, "Unknown")
+
+    # Gender detection using keras model (0 = female, 1 = male)
+    with m.time("gender"):
+        gender_pred = model_registry.get("gender_dispatcher").infer(inputs.gender)[0]
+    gender = 'Female' if gender_pred < 0.5 else 'Male'
+    gender_confidence = float(max(gender_pred, 1.0 - gender_pred))
+
+    return name, gender, name_confidence, gender_confidence
+
+def process_basic_info_frame(frame, session=None):
+    session = session or default_session()
+    m = session.metrics
+    started = time.perf_counter()
     try:
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
+        with m.time("locate"):
+            box = locate_face(frame, session, gray)
+        if box is None:
+            session.quality = None
+            m.inc("frames_no_face")
+            return frame, None, None
 
-        if len(faces) == 0:
+        # A blurred, dark, tiny or jumping face would only give a wrong answer
+        with m.time("quality"):
+            reasons = assess_quality(gray, box, session)
+        if reasons:
+            m.inc("frames_low_quality")
+            draw_skipped(frame, box, reasons)
             return frame, None, None
 
-        x, y, w, h = faces[0]
+        x, y, w, h = box
         face_roi = frame[y:y+h, x:x+w]
         cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
 
-        # Character recognition using both Keras model and knn
-        resized_face_flat = cv2.resize(face_roi, (100, 100)).flatten()
-        resized_face_input = cv2.resize(face_roi, (100, 100)) / 255.0
-        resized_face_input = np.expand_dims(resized_face_input, axis=0)
-        keras_pred = np.argmax(character_model.predict(resized_face_input), axis=1)[0]
-        knn_pred = knn(np.hstack((face_dataset, face_labels)), resized_face_flat)
+        with m.time("identify"):
+            name, gender, name_confidence, gender_confidence = inference_backend().identify(face_roi, m)
 
-        # Use keras_pred if in names, else fallback to knn_pred
-        name = names.get(keras_pred) or names.get(int(knn_pred), "Unknown")
-
-        # Gender detection using keras model (0 = female, 1 = male)
-        gender_input = cv2.resize(face_roi, (96, 96)) / 255.0
-        gender_input = np.expand_dims(gender_input, axis=0)
-        gender_pred = gender_model.predict(gender_input)[0][0]
-        gender = 'Female' if gender_pred < 0.5 else 'Male'
-
-        current_analysis["name"] = str(name)
-        current_analysis["gender"] = str(gender)
+        session.name = str(name)
+        session.gender = str(gender)
+        session.name_confidence = name_confidence
+        session.gender_confidence = gender_confidence
 
         cv2.putText(frame, f"Name: {name}", (x, y-40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
         cv2.putText(frame, f"Gender: {gender}", (x, y-20), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
@@ -112,40 +356,63 @@ def process_basic_info_frame(frame):
         return frame, name, gender
 
     except Exception as e:
+        m.inc("frame_errors")
         print(f"Basic info processing error: {e}")
         return frame, None, None
-
-def process_call_frame(frame):
+    finally:
+        m.observe("attendance_frame", time.perf_counter() - started)
+
+def process_call_frame(frame, session=None):
+    session = session or default_session()
+    worker = session.emotion_worker
+    voice_monitor = session.voice_monitor
+    m = session.metrics
+    started = time.perf_counter()
     try:
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-
-        if len(faces) == 0:
+        with m.time("locate"):
+            box = locate_face(frame, session, gray)
+        if box is None:
+            session.quality = None
+            m.inc("frames_no_face")
             return frame, False, None
 
-        x, y, w, h = faces[0]
+        x, y, w, h = box
         face_roi = frame[y:y+h, x:x+w]
-        cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
-
-        emotion = extract_emotion(face_roi)
-        lie_detected = emotion in ['fear', 'disgust', 'sad']
+        with m.time("quality"):
+            reasons = assess_quality(gray, box, session)
+        if reasons:
+            m.inc("frames_low_quality")
+            draw_skipped(frame, box, reasons)
+        else:
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (255, 0, 0), 2)
+            # DeepFace runs on the worker thread (which copies the 100x100
+            # crop); poor frames are not sent, the overlay keeps the last result
+            worker.submit(_preprocessor().crop(face_roi))
+        emotion = worker.current()
+        if emotion:
+            cv2.putText(frame, f"Emotion: {emotion}", (x, y+h+25),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+        # Only a new analysis result counts as a new suspicious moment
+        lie_detected = worker.take_update() and emotion in ['fear', 'disgust', 'sad']
         lie_info = None
 
         if lie_detected:
-            timestamp = datetime.now().strftime("%H:%M:%S")
             lie_info = f"emotion:{emotion}"
-            current_analysis["lie_detected"] = True
-            current_analysis["lie_timestamps"].append((timestamp, lie_info))
-
-        global frame_count
-        frame_count += 1
-        if frame_count % 150 == 0:
-            if analyze_voice():
-                timestamp = datetime.now().strftime("%H:%M:%S")
+            m.inc("suspicious_emotion")
+            session.lie_signs += 1
+            session.record_event(lie_info)
+
+        session.frame_count += 1
+        # Voice stress is analysed from the call's audio track in the background
+        if voice_monitor is not None and voice_monitor.take_update():
+            if voice_monitor.stressed:
                 lie_detected = True
                 lie_info = "voice_stress"
-                current_analysis["lie_detected"] = True
-                current_analysis["lie_timestamps"].append((timestamp, lie_info))
+                m.inc("suspicious_voice")
+                session.audio_lie_signs += 1
+                session.record_event(lie_info)
 
         if lie_detected:
             cv2.putText(frame, f"Alert: {lie_info}", (x, y-60),
@@ -154,30 +421,25 @@ def process_call_frame(frame):
         return frame, lie_detected, lie_info
 
     except Exception as e:
+        m.inc("frame_errors")
         print(f"Call frame processing error: {e}")
         return frame, False, None
+    finally:
+        m.observe("call_frame", time.perf_counter() - started)
+
+def get_inference_stats():
+    return {
+        name: model_registry.get(key).stats()
+        for name, key in (("recognizer", "character_dispatcher"), ("gender", "gender_dispatcher"))
+        if model_registry.is_loaded(key)
+    }
 
-def process_frame(frame):
-    processed_frame, _, _ = process_basic_info_frame(frame)
+def process_frame(frame, session=None):
+    processed_frame, _, _ = process_basic_info_frame(frame, session)
     return processed_frame
 
-def get_analysis_results():
-    return (
-        current_analysis["name"],
-        current_analysis["gender"],
-        current_analysis["lie_detected"],
-        current_analysis["lie_timestamps"]
-    )
-
-def reset_analysis():
-    global current_analysis, frame_count
-    current_analysis = {
-        "name": None,
-        "gender": None,
-        "lie_detected": False,
-        "lie_timestamps": []
-    }
-    frame_count = 0
+def get_analysis_results(session=None):
+    return (session or default_session()).results()
 
-# Load models at startup
-load_models()
+def reset_analysis(session=None):
+    (session or default_session()).reset()
@@ -0,0 +1,116 @@
+import numpy as np
+
+
+def distance(v1, v2):
+    return np.sqrt(np.sum((v1 - v2) ** 2))
+
+
+def knn(train, test, k=5):
+    distances = []
+    for i in range(train.shape[0]):
+        dist = distance(train[i, :-1], test)
+        distances.append((dist, train[i, -1]))
+
+    distances = sorted(distances, key=lambda x: x[0])[:k]
+    labels = [item[1] for item in distances]
+    unique_labels, counts = np.unique(labels, return_counts=True)
+    return unique_labels[np.argmax(counts)]
+
+
+class GallerySearch:
+    """Exact kNN over the enrolled face gallery.
+
+    The gallery matrix and its squared row norms are computed once, so a query
+    costs one matrix product plus an argpartition instead of a Python loop over
+    every enrolled sample. Candidates are re-ranked with exact float64 distances
+    so the vote matches the reference ``knn`` above.
+    """
+
+    def __init__(self, data, labels, norms=None, dtype=np.float32, rerank=16):
+        data = np.asarray(data)
+        self.matrix = data if data.dtype == dtype else data.astype(dtype)
+        self.labels = np.asarray(labels).reshape(-1).astype(np.int64, copy=False)
+        if norms is None:
+            norms = np.einsum('ij,ij->i', self.matrix, self.matrix, dtype=np.float64)
+        self.norms = np.asarray(norms, dtype=np.float64)
+        self.rerank = rerank
+        self.num_classes = int(self.labels.max()) + 1 if self.labels.size else 0
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def _squared_distances(self, queries):
+        q = queries.astype(self.matrix.dtype, copy=False)
+        q_norms = np.einsum('ij,ij->i', queries, queries)
+        d2 = q_norms[:, None] - 2.0 * (q @ self.matrix.T) + self.norms[None, :]
+        return np.maximum(d2, 0.0)
+
+    def neighbours(self, queries, k=5):
+        """Return (indices, squared distances) of the k nearest rows per query, nearest first."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+        n = len(self)
+        k = min(k, n)
+        d2 = self._squared_distances(queries)
+
+        m = min(n, k + self.rerank)
+        if m < n:
+            candidates = np.argpartition(d2, m - 1, axis=1)[:, :m]
+        else:
+            candidates = np.broadcast_to(np.arange(n), (queries.shape[0], n))
+
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        distances = np.empty((queries.shape[0], k), dtype=np.float64)
+        for row, (query, cand) in enumerate(zip(queries, candidates)):
+            diff = self.matrix[cand].astype(np.float64) - query
+            exact = np.einsum('ij,ij->i', diff, diff)
+            # Ties keep gallery order, like the stable sort in the old knn().
+            order = np.lexsort((cand, exact))[:k]
+            indices[row] = cand[order]
+            distances[row] = exact[order]
+        return indices, distances
+
+    def query(self, queries, k=5):
+        """Majority label of the k nearest neighbours for each query row."""
+        single = np.asarray(queries).ndim == 1
+        indices, _ = self.neighbours(queries, k)
+        votes = self.labels[indices]
+        result = np.array([np.bincount(v, minlength=self.num_classes).argmax() for v in votes])
+        return result[0] if single else result
+
+    def vote(self, query, k=5):
+        """Majority label of one query's k nearest neighbours and the share of votes it got."""
+        indices, _ = self.neighbours(query, k)
+        counts = np.bincount(self.labels[indices[0]], minlength=self.num_classes)
+        label = int(counts.argmax())
+        return label, float(counts[label]) / indices.shape[1]
+
+
+class SegmentedGallerySearch(GallerySearch):
+    """Exact kNN over several gallery segments without copying them together.
+
+    Each segment is searched on its own and the per-segment nearest
+    neighbours are merged, so the result equals one search over the
+    concatenated gallery (indices count rows across segments in order).
+    Adding a segment costs nothing for the ones already mapped.
+    """
+
+    def __init__(self, segments):
+        self.segments = [s for s in segments if len(s)]
+        self.offsets = np.cumsum([0] + [len(s) for s in self.segments])
+        self.labels = (np.concatenate([s.labels for s in self.segments]) if self.segments
+                       else np.empty(0, dtype=np.int64))
+        self.num_classes = int(self.labels.max()) + 1 if self.labels.size else 0
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def neighbours(self, queries, k=5):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float64))
+        if len(self.segments) == 1:
+            return self.segments[0].neighbours(queries, k)
+        parts = [segment.neighbours(queries, k) for segment in self.segments]
+        indices = np.concatenate([i + offset for (i, _), offset in zip(parts, self.offsets)], axis=1)
+        distances = np.concatenate([d for _, d in parts], axis=1)
+        # Nearest first; ties keep gallery order, as in a single search
+        order = np.lexsort((indices, distances), axis=1)[:, :min(k, len(self))]
+        return np.take_along_axis(indices, order, axis=1), np.take_along_axis(distances, order, axis=1)
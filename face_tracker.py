@@ -0,0 +1,138 @@
+import cv2
+import numpy as np
+
+
+class FaceTracker:
+    """Runs the face detector only when needed and follows the face in between.
+
+    A full-frame detection seeds the tracker. On the following frames feature
+    points inside the face box are followed with pyramidal Lucas-Kanade optical
+    flow (checked forward and backward), which costs a fraction of a Haar pass.
+    Every ``detect_every`` frames, or as soon as tracking confidence drops below
+    ``min_confidence``, the detector is re-run, first on an enlarged region
+    around the last box and only on the whole frame if that misses.
+    """
+
+    def __init__(self, detector, detect_every=10, min_confidence=0.6, roi_scale=1.6,
+                 max_points=40, max_fb_error=1.5):
+        self.detector = detector
+        self.detect_every = detect_every
+        self.min_confidence = min_confidence
+        self.roi_scale = roi_scale
+        self.max_points = max_points
+        self.max_fb_error = max_fb_error
+        self.counters = {
+            "frames": 0,
+            "full_detections": 0,
+            "roi_detections": 0,
+            "roi_misses": 0,
+            "tracker_hits": 0,
+            "tracker_losses": 0,
+        }
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self._fbox = None
+        self.confidence = 0.0
+        self._prev_gray = None
+        self._points = None
+        self._since_detect = 0
+
+    def _seed_points(self, gray, box):
+        x, y, w, h = box
+        mask = np.zeros_like(gray)
+        mask[y:y+h, x:x+w] = 255
+        points = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, max(3, w // 20), mask=mask)
+        self._points = points if points is not None and len(points) >= 4 else None
+
+    def _accept(self, gray, box, confidence=1.0):
+        self._fbox = tuple(float(v) for v in box)
+        self.box = tuple(int(v) for v in box)
+        self.confidence = confidence
+        self._since_detect = 0
+        self._seed_points(gray, self.box)
+        self._prev_gray = gray
+
+    def _detect_full(self, gray, frame=None):
+        self.counters["full_detections"] += 1
+        faces = self.detector(gray, frame)
+        if len(faces) == 0:
+            self.reset()
+            return None
+        self._accept(gray, faces[0])
+        return self.box
+
+    def _detect_roi(self, gray, frame=None):
+        x, y, w, h = self.box
+        cx, cy = x + w / 2, y + h / 2
+        rw, rh = w * self.roi_scale, h * self.roi_scale
+        x0, y0 = max(int(cx - rw / 2), 0), max(int(cy - rh / 2), 0)
+        x1, y1 = min(int(cx + rw / 2), gray.shape[1]), min(int(cy + rh / 2), gray.shape[0])
+        self.counters["roi_detections"] += 1
+        faces = self.detector(gray[y0:y1, x0:x1], frame[y0:y1, x0:x1] if frame is not None else None)
+        if len(faces) == 0:
+            self.counters["roi_misses"] += 1
+            return None
+        fx, fy, fw, fh = faces[0]
+        self._accept(gray, (fx + x0, fy + y0, fw, fh))
+        return self.box
+
+    def _track(self, gray):
+        if self._points is None:
+            return False
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, self._points, None)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev_gray, new_points, None)
+        fb_error = np.linalg.norm((self._points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        self.confidence = float(good.sum()) / len(self._points)
+        if good.sum() < 4 or self.confidence < self.min_confidence:
+            return False
+
+        old = self._points.reshape(-1, 2)[good]
+        new = new_points.reshape(-1, 2)[good]
+        dx, dy = np.median(new - old, axis=0)
+        old_spread = np.linalg.norm(old - old.mean(axis=0), axis=1)
+        new_spread = np.linalg.norm(new - new.mean(axis=0), axis=1)
+        scale = float(np.median(new_spread[old_spread > 0] / old_spread[old_spread > 0])) if np.any(old_spread > 0) else 1.0
+
+        x, y, w, h = self._fbox
+        nw, nh = w * scale, h * scale
+        nx, ny = x + dx - (nw - w) / 2, y + dy - (nh - h) / 2
+        nx, ny = max(nx, 0), max(ny, 0)
+        nw, nh = min(nw, gray.shape[1] - nx), min(nh, gray.shape[0] - ny)
+        if nw < 8 or nh < 8:
+            return False
+
+        self._fbox = (nx, ny, nw, nh)
+        self.box = tuple(int(round(v)) for v in self._fbox)
+        self._points = new[:, None, :].astype(np.float32)
+        self._prev_gray = gray
+        return True
+
+    def update(self, gray, frame=None):
+        """Return the (x, y, w, h) face box for this grayscale frame, or None.
+
+        ``frame`` is the BGR original, passed on to detectors that use colour.
+        """
+        self.counters["frames"] += 1
+        if self.box is None:
+            return self._detect_full(gray, frame)
+
+        self._since_detect += 1
+        if self._since_detect < self.detect_every:
+            if self._track(gray):
+                self.counters["tracker_hits"] += 1
+                return self.box
+            self.counters["tracker_losses"] += 1
+
+        return self._detect_roi(gray, frame) or self._detect_full(gray, frame)
+
+    def stats(self):
+        stats = dict(self.counters)
+        frames = stats["frames"] or 1
+        stats["tracker_hit_rate"] = stats["tracker_hits"] / frames
+        stats["detector_rate"] = (stats["full_detections"] + stats["roi_detections"]) / frames
+        stats["full_detection_rate"] = stats["full_detections"] / frames
+        return stats
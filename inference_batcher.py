@@ -0,0 +1,145 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class InferenceDispatcher:
+    """Micro-batches single-image requests for one Keras model.
+
+    Callers from any session/thread hand in one preprocessed input; a worker
+    thread gathers pending inputs until ``max_batch`` is reached or the oldest
+    has waited ``max_wait_ms``, runs a single forward pass and resolves each
+    caller's future with its own output row.
+
+    When nothing else is in flight, ``infer`` skips the queue and calls the
+    model directly, so a lone user pays neither the batching deadline nor the
+    fixed overhead of ``model.predict``.
+    """
+
+    def __init__(self, model, max_batch=16, max_wait_ms=5.0, name="model"):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._closed = False
+        self._worker = None
+        self._started = time.perf_counter()
+        self._stats = {
+            "requests": 0,
+            "direct": 0,
+            "batches": 0,
+            "batched_items": 0,
+            "max_batch_seen": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def _forward(self, batch):
+        # Calling the model directly avoids predict()'s per-call setup
+        # (data adapter, callbacks, step function) which dominates small batches.
+        out = self.model(batch, training=False)
+        return out.numpy() if hasattr(out, "numpy") else np.asarray(out)
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+            self._worker.start()
+
+    def _record(self, started):
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._inflight -= 1
+            self._stats["latency_total"] += latency
+            self._stats["latency_max"] = max(self._stats["latency_max"], latency)
+
+    def submit(self, x):
+        """Queue one input (without batch axis); returns a Future for its output row."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} dispatcher is closed")
+            self._inflight += 1
+            self._stats["requests"] += 1
+            self._ensure_worker()
+        self._queue.put((x, future, time.perf_counter()))
+        return future
+
+    def infer(self, x):
+        """Run one input, batching with concurrent callers when there are any."""
+        with self._lock:
+            direct = self._inflight == 0 and not self._closed
+            if direct:
+                self._inflight += 1
+                self._stats["requests"] += 1
+                self._stats["direct"] += 1
+        if not direct:
+            return self.submit(x).result()
+
+        started = time.perf_counter()
+        try:
+            return self._forward(np.expand_dims(x, axis=0))[0]
+        finally:
+            self._record(started)
+
+    def _collect(self):
+        items = [self._queue.get()]
+        if items[0] is None:
+            return None
+        deadline = items[0][2] + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            if items is None:
+                return
+            try:
+                outputs = self._forward(np.stack([x for x, _, _ in items]))
+            except Exception as e:
+                for _, future, started in items:
+                    future.set_exception(e)
+                    self._record(started)
+                continue
+
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["batched_items"] += len(items)
+                self._stats["max_batch_seen"] = max(self._stats["max_batch_seen"], len(items))
+            for (_, future, started), output in zip(items, outputs):
+                future.set_result(output)
+                self._record(started)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["inflight"] = self._inflight
+        completed = stats["requests"] - stats["inflight"]
+        stats["latency_avg_ms"] = stats.pop("latency_total") / completed * 1000 if completed else 0.0
+        stats["latency_max_ms"] = stats.pop("latency_max") * 1000
+        stats["throughput_per_s"] = completed / (time.perf_counter() - self._started)
+        stats["avg_batch_size"] = stats["batched_items"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            worker = self._worker
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
@@ -0,0 +1,236 @@
+"""Local multi-process inference service with shared-memory frame transport.
+
+Each worker process loads the models once and is pinned to its own core, so
+inference scales across the host and runs outside the interpreter serving the
+Streamlit UI. Face crops travel through fixed-size slots in one
+``multiprocessing.shared_memory`` block; only the slot index, shape and the
+small result cross the process boundary through queues, so pixels are never
+pickled. Each worker has its own task queue, so the server always knows
+which worker owns a request: when a worker dies its requests fail at once and
+it is restarted, and a request that times out gives its slot back.
+
+``InProcessBackend`` offers the same interface for single-user setups and is
+what face_recog uses unless CERTICALL_INFERENCE_SERVER is enabled.
+"""
+import atexit
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+
+class InProcessBackend:
+    """Runs inference in the calling process (the fallback mode)."""
+
+    def identify(self, face_roi, session_metrics=None):
+        import face_recog
+        return face_recog.identify_face(face_roi, session_metrics)
+
+    def emotion(self, face_roi):
+        from face_features import extract_emotion
+        return extract_emotion(face_roi)
+
+    def close(self):
+        pass
+
+
+def _worker_main(index, generation, core, shm_name, slot_bytes, tasks, results):
+    if core is not None and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, {core})
+        except OSError:
+            pass
+
+    import face_recog
+    from face_features import extract_emotion
+    face_recog.warm_up(background=False)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            request_id, op, slot, shape = task
+            start = slot * slot_bytes
+            # A view straight into shared memory; nothing is copied or unpickled
+            face = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf[start:start + slot_bytes])
+            try:
+                if op == "identify":
+                    result = face_recog.identify_face(face)
+                elif op == "emotion":
+                    result = extract_emotion(face)
+                else:
+                    raise ValueError(f"Unknown inference op '{op}'")
+                results.put((index, generation, request_id, True, result))
+            except Exception as e:
+                results.put((index, generation, request_id, False, repr(e)))
+            finally:
+                del face
+    finally:
+        shm.close()
+
+
+class InferenceServer:
+    def __init__(self, workers=None, slots=None, slot_bytes=640 * 640 * 3, timeout_s=10.0):
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        workers = workers or max(len(cores) - 1, 1)
+        slots = slots or workers * 4
+        self.slot_bytes = slot_bytes
+        self.timeout_s = timeout_s
+        self._cores = cores
+        self._closed = False
+        self._shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self._free = queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        # request id -> (future, slot, worker index)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        # Per worker: requests sent and not yet answered (timed-out ones
+        # included, so a hung worker stops getting work) and its incarnation
+        self._load = [0] * workers
+        self._generation = [0] * workers
+        spawned = [self._spawn(index, 0) for index in range(workers)]
+        self._workers = [proc for proc, _ in spawned]
+        self._tasks = [tasks for _, tasks in spawned]
+
+        self._collector = threading.Thread(target=self._collect, name="inference-results", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="inference-monitor", daemon=True)
+        self._monitor.start()
+        # Don't leave the shared-memory block behind in /dev/shm
+        atexit.register(self.close)
+
+    def _spawn(self, index, generation):
+        # Leave the first core to the UI process when there are spare ones
+        cores = self._cores
+        core = cores[(index + 1) % len(cores)] if len(cores) > 1 else None
+        tasks = self._ctx.Queue()
+        proc = self._ctx.Process(target=_worker_main, name=f"inference-{index}", daemon=True,
+                                 args=(index, generation, core, self._shm.name, self.slot_bytes, tasks,
+                                       self._results))
+        proc.start()
+        return proc, tasks
+
+    def _watch(self):
+        while not self._closed:
+            wait([proc.sentinel for proc in self._workers], timeout=1.0)
+            if self._closed:
+                return
+            for index, proc in enumerate(self._workers):
+                if proc.is_alive():
+                    continue
+                print(f"Inference worker {proc.name} died (exit code {proc.exitcode}); restarting it")
+                replacement, tasks = self._spawn(index, self._generation[index] + 1)
+                with self._lock:
+                    # Everything sent to the dead worker, running or still queued
+                    lost = [request_id for request_id, (_, _, owner) in self._pending.items() if owner == index]
+                    self._workers[index], self._tasks[index] = replacement, tasks
+                    self._generation[index] += 1
+                    self._load[index] = 0
+                for request_id in lost:
+                    self._fail(request_id, f"{proc.name} died (exit code {proc.exitcode})")
+
+    def _release(self, request_id):
+        """Forget a request and free its slot; returns its future, or None if already released."""
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return None
+        future, slot, _ = entry
+        self._free.put(slot)
+        return future
+
+    def _fail(self, request_id, reason):
+        future = self._release(request_id)
+        if future is not None:
+            future.set_exception(RuntimeError(f"Inference worker failed: {reason}"))
+
+    def _fit(self, face_roi):
+        face = np.ascontiguousarray(face_roi, dtype=np.uint8)
+        if face.nbytes > self.slot_bytes:
+            import cv2
+            scale = (self.slot_bytes / face.nbytes) ** 0.5
+            size = (max(int(face.shape[1] * scale), 1), max(int(face.shape[0] * scale), 1))
+            face = cv2.resize(face, size, interpolation=cv2.INTER_AREA)
+        return face
+
+    def submit(self, op, face_roi):
+        face = self._fit(face_roi)
+        slot = self._free.get(timeout=self.timeout_s)
+        start = slot * self.slot_bytes
+        self._shm.buf[start:start + face.nbytes] = face.reshape(-1).data
+
+        request_id = next(self._ids)
+        future = Future()
+        future.request_id = request_id
+        with self._lock:
+            # The least busy worker; recording the owner before the task is
+            # queued means a worker can't die holding a request we don't know of
+            index = min(range(len(self._load)), key=self._load.__getitem__)
+            self._load[index] += 1
+            self._pending[request_id] = (future, slot, index)
+            self._tasks[index].put((request_id, op, slot, face.shape))
+        return future
+
+    def _collect(self):
+        while True:
+            item = self._results.get()
+            if item is None:
+                return
+            index, generation, request_id, ok, result = item
+            with self._lock:
+                if generation == self._generation[index]:
+                    self._load[index] -= 1
+            # None if it already timed out or its worker died right after answering
+            future = self._release(request_id)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(f"Inference worker failed: {result}"))
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout_s)
+        except FutureTimeout:
+            # Give the slot back now; a late reply is ignored
+            self._release(future.request_id)
+            raise
+
+    def identify(self, face_roi, session_metrics=None):
+        # Stage timings are recorded in the worker's own process totals
+        return self._result(self.submit("identify", face_roi))
+
+    def emotion(self, face_roi):
+        return self._result(self.submit("emotion", face_roi))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        # Stop the monitor first so workers exiting below aren't restarted
+        self._monitor.join(timeout=5)
+        for tasks in self._tasks:
+            tasks.put(None)
+        for proc in self._workers:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._results.put(None)
+        self._collector.join(timeout=5)
+        self._shm.close()
+        self._shm.unlink()
@@ -3,27 +3,23 @@ import streamlit as st
 # Page config must be the first Streamlit command
 st.set_page_config(page_title="CertiCall", layout="wide")
 
-# Now import other modules
-import cv2
+# Now import other modules. OpenCV, WebRTC and face_recog (TensorFlow, DeepFace)
+# are imported inside the employee views so login and host pages start fast.
 import time
 from datetime import datetime
+import config
 import database as db
-import face_recog
-import tempfile
+import metrics
 import pyperclip
-import sqlite3
-import numpy as np
-from PIL import Image
-from streamlit_webrtc import webrtc_streamer, WebRtcMode, RTCConfiguration
-import av
 
 # Initialize database
 db.init_db()
 
+# Metrics endpoint / file, once per process (only when CERTICALL_METRICS is on)
+metrics.start()
+
 # WebRTC configuration
-RTC_CONFIGURATION = RTCConfiguration(
-    {"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]}
-)
+RTC_ICE_SERVERS = {"iceServers": [{"urls": ["stun:stun.l.google.com:19302"]}]}
 
 # Session state
 if 'logged_in' not in st.session_state:
@@ -42,8 +38,6 @@ if 'in_video_call' not in st.session_state:
     st.session_state.in_video_call = False
 if 'basic_info_collected' not in st.session_state:
     st.session_state.basic_info_collected = False
-if 'suspicious_moments' not in st.session_state:
-    st.session_state.suspicious_moments = []
 if 'camera_on' not in st.session_state:
     st.session_state.camera_on = True
 if 'mic_on' not in st.session_state:
@@ -141,7 +135,14 @@ def host_dashboard():
         st.session_state.host_info = None
         st.rerun()
     
-    tab1, tab2, tab3 = st.tabs(["Create Meeting", "Manage Employees", "View Attendance"])
+    tab_names = ["Create Meeting", "Manage Employees", "View Attendance"]
+    if metrics.enabled:
+        tab_names.append("Diagnostics")
+    tabs = st.tabs(tab_names)
+    tab1, tab2, tab3 = tabs[:3]
+    if metrics.enabled:
+        with tabs[3]:
+            show_diagnostics()
     
     with tab1:
         st.header("Create New Meeting")
@@ -231,12 +232,7 @@ def host_dashboard():
                 for emp_id, name in employees:
                     with st.expander(f"{name} (ID: {emp_id})"):
                         # Get employee details
-                        conn = sqlite3.connect('meetings.db')
-                        c = conn.cursor()
-                        c.execute("SELECT password FROM employees WHERE meeting_id=? AND emp_id=?", 
-                                 (meeting_id, emp_id))
-                        password = c.fetchone()[0]
-                        conn.close()
+                        password = db.get_employee_password(meeting_id, emp_id)
                         
                         st.markdown("**Credentials to share:**")
                         st.code(f"Meeting ID: {meeting_id}\nEmployee ID: {emp_id}\nPassword: {password}", 
@@ -263,44 +259,134 @@ def host_dashboard():
             )
             meeting_id = meeting_options[selected_meeting]
             
-            attendance = db.get_attendance_for_meeting(meeting_id)
-            if attendance:
+            summary = db.get_attendance_summary(meeting_id)
+            if summary["records"]:
+                st.subheader("Attendance Summary")
+                cols = st.columns(4)
+                cols[0].metric("Attendees", summary["attendees"])
+                cols[1].metric("Male / Female", f"{summary['male']} / {summary['female']}")
+                cols[2].metric("Flagged", summary["flagged"])
+                cols[3].metric("Suspicious moments", summary["events"])
+
                 st.subheader("Attendance Records")
-                for emp_id, name, gender, join_time, lie_detected, lie_timestamps in attendance:
-                    # Safely format the join time
-                    try:
-                        if isinstance(join_time, str):
-                            join_time_str = join_time
-                        else:
-                            join_time_str = join_time.strftime('%Y-%m-%d %H:%M:%S')
-                    except Exception as e:
-                        join_time_str = str(join_time)
-                    
-                    with st.expander(f"{name} ({gender}) - {join_time_str}"):
-                        st.write(f"**Employee ID:** {emp_id}")
-                        st.write(f"**Join Time:** {join_time_str}")
-                        
-                        if lie_detected:
-                            st.error("**Lie Detection Alert!**")
-                            if lie_timestamps:
-                                try:
-                                    timestamps = eval(lie_timestamps) if isinstance(lie_timestamps, str) else lie_timestamps
-                                    st.write("**Suspicious moments:**")
-                                    for ts in timestamps:
-                                        st.write(f"- {ts[0]}: {ts[1]}")
-                                except:
-                                    st.warning("Could not parse lie timestamps")
-                        else:
-                            st.success("No suspicious behavior detected")
+                pages = (summary["records"] + ATTENDANCE_PAGE_SIZE - 1) // ATTENDANCE_PAGE_SIZE
+                page = 1
+                if pages > 1:
+                    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1,
+                                           key=f"attendance_page_{meeting_id}")
+                rows = db.get_attendance_page(meeting_id, limit=ATTENDANCE_PAGE_SIZE,
+                                              offset=(page - 1) * ATTENDANCE_PAGE_SIZE)
+                st.dataframe(
+                    [{
+                        "Employee ID": emp_id,
+                        "Name": name,
+                        "Gender": gender,
+                        "Join Time": str(join_time),
+                        "Flagged": "Yes" if lie_detected else "No",
+                        "Suspicious moments": event_count,
+                    } for emp_id, name, gender, join_time, lie_detected, event_count, _ in rows],
+                    use_container_width=True,
+                    hide_index=True,
+                )
+
+                # Event details only for the one attendee the host picks
+                flagged = {f"{name} (ID: {emp_id}) - {join_time}": (emp_id, attendance_id)
+                           for emp_id, name, _, join_time, lie_detected, _, attendance_id in rows if lie_detected}
+                if flagged:
+                    selected = st.selectbox("Suspicious moments for", options=list(flagged.keys()),
+                                            key="view_attendance_select_employee")
+                    emp_id, attendance_id = flagged[selected]
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        events_from = st.time_input("Show events from", value=None, key="events_from")
+                    with col2:
+                        events_to = st.time_input("Show events until", value=None, key="events_to")
+                    show_suspicious_events(meeting_id, emp_id, attendance_id,
+                                           events_from, events_to, key="events_page")
+                else:
+                    st.success("No suspicious behavior detected on this page")
             else:
                 st.info("No attendance records yet")
 
+ATTENDANCE_PAGE_SIZE = 25
+EVENTS_PAGE_SIZE = 20
+
+def show_diagnostics():
+    """Timings and counters from the analysis hot paths of this server process"""
+    st.header("Diagnostics")
+    snapshot = metrics.process.snapshot()
+    counters = snapshot["counters"]
+    sessions = [s.snapshot() for s in metrics.active_sessions()]
+
+    cols = st.columns(4)
+    cols[0].metric("Uptime", f"{snapshot['uptime_s'] / 60:.0f} min")
+    cols[1].metric("Active sessions", len(sessions))
+    cols[2].metric("Frames dropped", f"{counters.get('video_frames_dropped', 0)} / {counters.get('video_frames', 0)}")
+    cols[3].metric("Frame errors", counters.get("frame_errors", 0))
+
+    st.subheader("Stage timings")
+    st.dataframe(
+        [{"Stage": name, "Count": t["count"], "Mean (ms)": round(t["mean_ms"], 2), "Max (ms)": round(t["max_ms"], 2)}
+         for name, t in sorted(snapshot["timings"].items())],
+        use_container_width=True,
+        hide_index=True,
+    )
+    if sessions:
+        st.subheader("Active sessions")
+        st.dataframe(
+            [{
+                "Session": i + 1,
+                "Frames": s["counters"].get("video_frames", 0)
+                          or s["timings"].get("attendance_frame", {}).get("count", 0),
+                "Dropped": s["counters"].get("video_frames_dropped", 0),
+                "Mean recv (ms)": round(s["timings"].get("recv", {}).get("mean_ms", 0.0), 2),
+                "No face": s["counters"].get("frames_no_face", 0),
+                "Low quality": s["counters"].get("frames_low_quality", 0),
+                "Errors": s["counters"].get("frame_errors", 0),
+            } for i, s in enumerate(sessions)],
+            use_container_width=True,
+            hide_index=True,
+        )
+    st.subheader("Counters")
+    st.dataframe([{"Counter": name, "Value": value} for name, value in sorted(counters.items())],
+                 use_container_width=True, hide_index=True)
+    with st.expander("Prometheus text"):
+        st.code(metrics.render_prometheus(), language="text")
+
+def show_suspicious_events(meeting_id, emp_id, attendance_id, events_from, events_to, key):
+    """One page of one attendance row's suspicious moments, filtered to a time range"""
+    first, last = db.get_event_range(meeting_id, emp_id, attendance_id)
+    if first is None:
+        st.write("No suspicious moments recorded")
+        return
+    # The times of day apply to the call's own days: "from" to the day of its
+    # first event and "until" to the day of its last (calls may cross midnight)
+    start = f"{first[:10]} {events_from.strftime('%H:%M:%S')}" if events_from else None
+    end = f"{last[:10]} {events_to.strftime('%H:%M:%S')}" if events_to else None
+    total = db.count_suspicious_events(meeting_id, emp_id, start, end, attendance_id)
+    if not total:
+        st.write("No suspicious moments in this time range")
+        return
+
+    pages = (total + EVENTS_PAGE_SIZE - 1) // EVENTS_PAGE_SIZE
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=key) if pages > 1 else 1
+    events = db.get_suspicious_events(meeting_id, emp_id, start, end, limit=EVENTS_PAGE_SIZE,
+                                      offset=(page - 1) * EVENTS_PAGE_SIZE, attendance_id=attendance_id)
+    st.write(f"**Suspicious moments:** {total}")
+    for timestamp, kind, detail, score in events:
+        label = f"{kind}:{detail}" if detail else kind
+        st.write(f"- {timestamp[11:] or timestamp}: {label}")
+
 def employee_interface():
     """Employee interface after joining meeting"""
     if st.session_state.in_video_call:
         video_call_session()
         return
     
+    if config.WARMUP_MODELS:
+        import face_recog
+        face_recog.warm_up(background=True)
+
     emp = st.session_state.employee_info
     st.title(f"Meeting Attendance Portal")
     st.subheader(f"Welcome, {emp['name']}")
@@ -322,10 +408,21 @@ def employee_interface():
 
 def perform_attendance_check():
     """Perform the basic attendance check to collect name and gender"""
+    import cv2
+    import face_recog
+    from attendance_consensus import AttendanceConsensus
+
     emp = st.session_state.employee_info
     
-    # Reset previous analysis
-    face_recog.reset_analysis()
+    # Fresh analysis state for this check only
+    session = face_recog.new_session()
+    consensus = AttendanceConsensus(
+        min_frames=config.ATTENDANCE_MIN_FRAMES,
+        min_confidence=config.ATTENDANCE_MIN_CONFIDENCE,
+        agreement=config.ATTENDANCE_AGREEMENT,
+        timeout_s=config.ATTENDANCE_TIMEOUT_S,
+        no_face_timeout_s=config.ATTENDANCE_NO_FACE_TIMEOUT_S,
+    )
     
     # Initialize webcam
     cap = cv2.VideoCapture(0)
@@ -337,13 +434,11 @@ def perform_attendance_check():
     st_frame = st.empty()
     stop_button = st.button("Cancel Analysis", key="cancel_analysis_button")
     
-    start_time = time.time()
-    analysis_duration = 10  # 10 seconds for basic info collection
-    
     # Display countdown
     countdown_placeholder = st.empty()
     
-    while not stop_button and (time.time() - start_time) < analysis_duration:
+    # Stops as soon as enough frames agree, or early when no face shows up
+    while not stop_button and not consensus.done:
         ret, frame = cap.read()
         if not ret:
             st.error("Failed to capture video frame")
@@ -353,18 +448,23 @@ def perform_attendance_check():
         frame = cv2.flip(frame, 1)
             
         # Process frame for basic info only
-        processed_frame, name, gender = face_recog.process_basic_info_frame(frame)
+        processed_frame, name, gender = face_recog.process_basic_info_frame(frame, session)
+        consensus.add(name, gender, session.name_confidence, session.gender_confidence, session.quality)
         
         # Display the processed frame
         st_frame.image(processed_frame, channels="BGR", use_container_width=True)
         
         # Update countdown
-        remaining_time = max(0, analysis_duration - (time.time() - start_time))
-        countdown_placeholder.write(f"Time remaining: {int(remaining_time)} seconds")
-        
-        time.sleep(0.1)
+        remaining_time = max(0, config.ATTENDANCE_TIMEOUT_S - consensus.elapsed())
+        countdown_placeholder.write(f"Time remaining: {int(remaining_time)} seconds "
+                                    f"(confidence {consensus.confidence():.0%})")
     
+    name, gender = consensus.finish() or (None, None)
+    session.metrics.inc(f"attendance_{consensus.failure or 'decided'}")
+    session.metrics.observe("attendance_check", consensus.elapsed())
+    print(f"Attendance check: {consensus.stats()}, quality gate: {face_recog.get_quality_stats(session)}")
     cap.release()
+    session.close()
     st_frame.empty()
     countdown_placeholder.empty()
     
@@ -390,11 +490,30 @@ def perform_attendance_check():
         time.sleep(2)
         st.session_state.in_video_call = True
         st.rerun()
+    elif consensus.failure == "no_face":
+        st.error("No face was detected. Please face the camera and try again.")
+        st.session_state.analysis_in_progress = False
     else:
         st.error("Face recognition failed. Please ensure good lighting and try again.")
         st.session_state.analysis_in_progress = False
 
+def close_call_resources():
+    """Flush and stop the call's event sink and voice monitor (safe to repeat)"""
+    for name in ('event_sink', 'voice_monitor'):
+        resource = st.session_state.get(name)
+        if resource is not None:
+            resource.close()
+        st.session_state[name] = None
+    st.session_state.call_resources_key = None
+
 def video_call_session():
+    import cv2
+    import av
+    import face_recog
+    from voice_stream import VoiceStressMonitor, audio_frame_to_mono
+    from event_logger import EventSink
+    from streamlit_webrtc import webrtc_streamer, WebRtcMode, RTCConfiguration
+
     emp = st.session_state.employee_info
     st.title("Video Call Session")
     st.write(f"**Name:** {emp.get('detected_name', 'Unknown')}")
@@ -412,22 +531,85 @@ def video_call_session():
             st.session_state.video_call_key = str(time.time())
             st.rerun()
 
+    # A voice monitor (fed by the WebRTC audio track) and an event sink (so
+    # suspicious moments are persisted during the call, not only at "End
+    # Call") per WebRTC stream. The stream's key changes when the camera or
+    # microphone is toggled; the processors close them when their stream
+    # ends, including when the tab is closed or the connection drops.
+    if st.session_state.get('call_resources_key') != st.session_state.video_call_key:
+        close_call_resources()
+        st.session_state.voice_monitor = VoiceStressMonitor(pitch_threshold=config.VOICE_PITCH_THRESHOLD_HZ)
+        st.session_state.event_sink = EventSink(
+            emp['meeting_id'], emp['emp_id'],
+            flush_size=config.EVENT_FLUSH_SIZE,
+            flush_interval_s=config.EVENT_FLUSH_INTERVAL_S,
+            max_pending=config.EVENT_MAX_PENDING,
+        )
+        st.session_state.call_resources_key = st.session_state.video_call_key
+    voice_monitor = st.session_state.voice_monitor
+    event_sink = st.session_state.event_sink
+
     class VideoProcessor:
+        def __init__(self):
+            # Per-call analysis state (tracker, background emotion worker, counters)
+            self.session = face_recog.new_session(voice_monitor=voice_monitor)
+            self._last_time = None
+            self._frame_interval = None
+
+        def _count_frame(self, frame):
+            # Frames the WebRTC worker skipped while recv was busy show up as
+            # gaps in the presentation timestamps
+            m = self.session.metrics
+            m.inc("video_frames")
+            if frame.pts is None or frame.time_base is None:
+                return
+            t = float(frame.pts * frame.time_base)
+            if self._last_time is not None and t > self._last_time:
+                gap = t - self._last_time
+                self._frame_interval = min(self._frame_interval or gap, gap)
+                skipped = int(round(gap / self._frame_interval)) - 1
+                if skipped > 0:
+                    m.inc("video_frames_dropped", skipped)
+            self._last_time = t
+
+        def recv(self, frame):
+            with self.session.metrics.time("recv"):
+                if metrics.enabled:
+                    self._count_frame(frame)
+                img = frame.to_ndarray(format="bgr24")
+                img = cv2.flip(img, 1)
+
+                processed_img, lie_detected, lie_info = face_recog.process_call_frame(img, self.session)
+                if lie_detected:
+                    event_sink.log(datetime.now(), lie_info)
+                return av.VideoFrame.from_ndarray(processed_img, format="bgr24")
+
+        def on_ended(self):
+            stats = self.session.emotion_worker.stats()
+            print(f"Emotion analysis: {stats['analyzed']} analyzed, {stats['dropped']} dropped")
+            quality = face_recog.get_quality_stats(self.session)
+            if quality:
+                print(f"Quality gate: {quality['skipped']} of {quality['assessed']} faces skipped")
+            self.session.close()
+            event_sink.close()
+            voice_monitor.close()
+
+    class AudioProcessor:
         def recv(self, frame):
-            img = frame.to_ndarray(format="bgr24")
-            img = cv2.flip(img, 1)
+            voice_monitor.push(audio_frame_to_mono(frame), frame.sample_rate)
+            return frame
 
-            processed_img, lie_detected, lie_info = face_recog.process_call_frame(img)
-            if lie_detected:
-                timestamp = datetime.now().strftime("%H:%M:%S")
-                st.session_state.suspicious_moments.append((timestamp, lie_info))
-            return av.VideoFrame.from_ndarray(processed_img, format="bgr24")
+        def on_ended(self):
+            # Audio-only calls have no VideoProcessor to do it
+            event_sink.close()
+            voice_monitor.close()
 
     webrtc_ctx = webrtc_streamer(
         key=st.session_state.video_call_key,
         mode=WebRtcMode.SENDRECV,
-        rtc_configuration=RTC_CONFIGURATION,
+        rtc_configuration=RTCConfiguration(RTC_ICE_SERVERS),
         video_processor_factory=VideoProcessor,
+        audio_processor_factory=AudioProcessor,
         media_stream_constraints={
             "video": st.session_state.camera_on,
             "audio": st.session_state.mic_on
@@ -436,12 +618,7 @@ def video_call_session():
     )
 
     if st.button("End Call"):
-        if st.session_state.suspicious_moments:
-            db.update_suspicious_moments(
-                emp['meeting_id'],
-                emp['emp_id'],
-                str(st.session_state.suspicious_moments)
-            )
+        close_call_resources()
         st.success("Call ended. Thank you for your participation.")
         time.sleep(2)
         st.session_state.logged_in = False
@@ -450,7 +627,6 @@ def video_call_session():
         st.session_state.analysis_in_progress = False
         st.session_state.in_video_call = False
         st.session_state.basic_info_collected = False
-        st.session_state.suspicious_moments = []
         st.session_state.camera_on = True
         st.session_state.mic_on = True
         st.rerun()
@@ -0,0 +1,243 @@
+"""Low-overhead timers and counters for the analysis hot paths.
+
+Counters (``inc``) and timings (``observe``, ``time``, ``timed``) are kept per
+process, and per session for objects from ``session_metrics()``; a session's
+observations also count towards the process totals. Everything is off unless
+CERTICALL_METRICS is set: disabled calls return after one flag check and
+``time()`` hands out a shared no-op context manager.
+
+The process totals are rendered in the Prometheus text format, served on
+127.0.0.1:CERTICALL_METRICS_PORT and/or written to CERTICALL_METRICS_FILE
+every CERTICALL_METRICS_FILE_INTERVAL_S seconds (node_exporter's textfile
+collector reads that file as is). ``start()`` starts whichever is configured,
+once per process.
+"""
+import bisect
+import os
+import threading
+import time
+import weakref
+from functools import wraps
+
+import config
+
+enabled = config.METRICS_ENABLED
+PREFIX = "certicall"
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "name", "started")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._counters = {}
+        # name -> [count, total seconds, max seconds, bucket counts]
+        self._timings = {}
+
+    def inc(self, name, value=1):
+        if not enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        if self.parent is not None:
+            self.parent.inc(name, value)
+
+    def observe(self, name, seconds):
+        if not enabled:
+            return
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = [0, 0.0, 0.0, [0] * len(BUCKETS)]
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+            bucket = bisect.bisect_left(BUCKETS, seconds)
+            if bucket < len(BUCKETS):
+                timing[3][bucket] += 1
+        if self.parent is not None:
+            self.parent.observe(name, seconds)
+
+    def time(self, name):
+        """``with metrics.time("stage"):`` records the block's duration."""
+        return _Timer(self, name) if enabled else _NULL_TIMER
+
+    def snapshot(self):
+        """Plain-dict copy: counters and per-timer count/mean/max in milliseconds."""
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: list(t) for name, t in self._timings.items()}
+        return {
+            "uptime_s": time.time() - self.started,
+            "counters": counters,
+            "timings": {
+                name: {"count": count, "mean_ms": total / count * 1000 if count else 0.0, "max_ms": peak * 1000}
+                for name, (count, total, peak, _) in timings.items()
+            },
+        }
+
+    def _raw(self):
+        with self._lock:
+            return dict(self._counters), {name: (t[0], t[1], t[2], list(t[3])) for name, t in self._timings.items()}
+
+
+process = Metrics()
+_sessions = weakref.WeakSet()
+
+
+def session_metrics():
+    """Metrics for one call or attendance check, rolled up into the process totals."""
+    metrics = Metrics(parent=process)
+    _sessions.add(metrics)
+    return metrics
+
+
+def active_sessions():
+    return list(_sessions)
+
+
+def inc(name, value=1):
+    if enabled:
+        process.inc(name, value)
+
+
+def observe(name, seconds):
+    if enabled:
+        process.observe(name, seconds)
+
+
+def timed(name):
+    """Decorator recording each call's duration under ``name`` (process-wide)."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                process.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def render_prometheus(metrics=None):
+    """The totals of ``metrics`` (the process by default) in Prometheus text format."""
+    metrics = metrics or process
+    counters, timings = metrics._raw()
+    lines = [
+        f"# TYPE {PREFIX}_uptime_seconds gauge",
+        f"{PREFIX}_uptime_seconds {time.time() - metrics.started:.3f}",
+        f"# TYPE {PREFIX}_active_sessions gauge",
+        f"{PREFIX}_active_sessions {len(_sessions)}",
+    ]
+    for name in sorted(counters):
+        lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+        lines.append(f"{PREFIX}_{name}_total {counters[name]}")
+    for name in sorted(timings):
+        count, total, peak, buckets = timings[name]
+        metric = f"{PREFIX}_{name}_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, hits in zip(BUCKETS, buckets):
+            cumulative += hits
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+        lines.append(f"{metric}_sum {total:.6f}")
+        lines.append(f"{metric}_count {count}")
+        lines.append(f"# TYPE {metric}_max gauge")
+        lines.append(f"{metric}_max {peak:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+    """Atomically replace ``path`` with the current Prometheus text."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render_prometheus())
+    os.replace(tmp, path)
+
+
+def serve(port, host="127.0.0.1"):
+    """Serve /metrics on a daemon thread; returns the server."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _write_periodically(path, interval_s):
+    while True:
+        time.sleep(interval_s)
+        try:
+            write_file(path)
+        except OSError as e:
+            print(f"Metrics file error: {e}")
+
+
+_start_lock = threading.Lock()
+_started = False
+
+
+def start():
+    """Start the configured exporters once per process (no-op when metrics are off)."""
+    global _started
+    with _start_lock:
+        if _started or not enabled:
+            return
+        _started = True
+    if config.METRICS_PORT:
+        try:
+            serve(config.METRICS_PORT)
+        except OSError as e:
+            # Another process (e.g. an earlier Streamlit worker) holds the port
+            print(f"Metrics endpoint not started on port {config.METRICS_PORT}: {e}")
+    if config.METRICS_FILE:
+        threading.Thread(target=_write_periodically, name="metrics-file", daemon=True,
+                         args=(config.METRICS_FILE, config.METRICS_FILE_INTERVAL_S)).start()
@@ -0,0 +1,217 @@
+"""Export the Keras face models to TFLite or ONNX and check they still agree.
+
+    python model_export.py --runtime tflite --quantize int8
+    python model_export.py --runtime onnx --recognizer-holdout ./Task_B/val
+
+Exporting needs TensorFlow (plus tf2onnx and onnxruntime for ONNX); the
+inference hosts then only need the runtime named in model_runtime.py. int8
+quantization is calibrated on enrolled faces from ./face_dataset/. Parity is
+measured on held-out inputs: an image folder laid out like the training data
+(one subfolder per class) when given, which also reports accuracy, otherwise
+enrolled faces not used for calibration. Each export writes a
+``.parity.json`` report next to the model and the command exits non-zero
+when agreement is below --min-agreement.
+"""
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+import config
+from face_gallery import DEFAULT_DATASET_PATH, load_snapshot
+from model_runtime import EXTENSIONS, OnnxModel, TFLiteModel, exported_path
+
+MODELS = {
+    "recognizer": "Face_Recognizer.keras",
+    "gender": "Gender_Classifier.keras",
+}
+QUANTIZATIONS = {
+    "tflite": ("", "float16", "int8"),
+    "onnx": ("", "int8"),
+}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def enrolled_faces(dataset_path=DEFAULT_DATASET_PATH, count=200, seed=0):
+    """A random sample of enrolled 100x100 BGR faces from the gallery."""
+    snapshot = load_snapshot(dataset_path, config.GALLERY_DIR)
+    matrix = np.concatenate([segment.matrix for segment in snapshot.segments])
+    rng = np.random.default_rng(seed)
+    picks = rng.permutation(len(matrix))[:count]
+    return matrix[np.sort(picks)].reshape(-1, 100, 100, 3).astype(np.uint8)
+
+
+def image_folder(path, limit=None, seed=0):
+    """BGR images and class ids from one subfolder per class (sorted, like Keras).
+
+    With ``limit``, a random sample of that many images across all classes.
+    """
+    entries = []
+    for label, cls in enumerate(sorted(d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d)))):
+        folder = os.path.join(path, cls)
+        entries.extend((os.path.join(folder, fx), label) for fx in sorted(os.listdir(folder))
+                       if fx.lower().endswith(IMAGE_EXTENSIONS))
+    if limit and len(entries) > limit:
+        picks = np.random.default_rng(seed).permutation(len(entries))[:limit]
+        entries = [entries[i] for i in sorted(picks)]
+
+    images, labels = [], []
+    for fx, label in entries:
+        img = cv2.imread(fx)
+        if img is not None:
+            images.append(img)
+            labels.append(label)
+    return images, np.array(labels)
+
+
+def model_inputs(images, input_shape):
+    """Resize and scale faces the way face_recog does, to the model's input size."""
+    height, width = input_shape[1] or 100, input_shape[2] or 100
+    batch = np.empty((len(images), height, width, 3), dtype=np.float32)
+    for row, img in enumerate(images):
+        batch[row] = cv2.resize(img, (width, height))
+    batch /= 255.0
+    return batch
+
+
+def export_tflite(model, output_path, quantize="", calibration=None):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        # Input and output stay float32, so callers feed the same arrays
+        converter.representative_dataset = lambda: ([x[None]] for x in calibration)
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, output_path, quantize=""):
+    import tensorflow as tf
+    import tf2onnx
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+    float_path = output_path + ".float.tmp" if quantize else output_path
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=float_path)
+    if quantize == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(float_path, output_path, weight_type=QuantType.QInt8)
+        os.remove(float_path)
+
+
+def predict(model, inputs, batch_size=32):
+    outputs = []
+    for start in range(0, len(inputs), batch_size):
+        out = model(inputs[start:start + batch_size], training=False)
+        outputs.append(out.numpy() if hasattr(out, "numpy") else np.asarray(out))
+    return np.concatenate(outputs)
+
+
+def single_latency_ms(model, inputs, repeat=20):
+    sample = inputs[:1]
+    model(sample, training=False)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model(sample, training=False)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def check_parity(reference, exported, inputs, labels=None, binary=False):
+    """Agreement and output error of ``exported`` against the Keras ``reference``."""
+    expected = predict(reference, inputs)
+    got = predict(exported, inputs)
+    if binary:
+        ref_pred, got_pred = expected.reshape(-1) >= 0.5, got.reshape(-1) >= 0.5
+    else:
+        ref_pred, got_pred = expected.argmax(axis=1), got.argmax(axis=1)
+    diff = np.abs(expected.astype(np.float64) - got)
+    report = {
+        "samples": len(inputs),
+        "agreement": float((ref_pred == got_pred).mean()),
+        "max_abs_diff": float(diff.max()),
+        "mean_abs_diff": float(diff.mean()),
+        "reference_ms": single_latency_ms(reference, inputs),
+        "exported_ms": single_latency_ms(exported, inputs),
+    }
+    if labels is not None and len(labels):
+        report["reference_accuracy"] = float((ref_pred == labels).mean())
+        report["exported_accuracy"] = float((got_pred == labels).mean())
+    return report
+
+
+def export_model(name, runtime, quantize, holdout=None, samples=200, dataset_path=DEFAULT_DATASET_PATH):
+    from keras.models import load_model
+
+    keras_path = MODELS[name]
+    model = load_model(keras_path)
+    faces = enrolled_faces(dataset_path, count=samples * 2)
+    # Calibrate on one half of the enrolled faces and hold out the other
+    calibration, held_out = faces[:len(faces) // 2], faces[len(faces) // 2:]
+    labels = None
+    if holdout:
+        held_out, labels = image_folder(holdout, limit=samples)
+
+    os.makedirs(config.MODEL_EXPORT_DIR, exist_ok=True)
+    output_path = exported_path(keras_path, runtime, quantize)
+    started = time.perf_counter()
+    if runtime == "tflite":
+        export_tflite(model, output_path, quantize, model_inputs(calibration, model.input_shape))
+        exported = TFLiteModel(output_path)
+    else:
+        export_onnx(model, output_path, quantize)
+        exported = OnnxModel(output_path)
+
+    report = check_parity(model, exported, model_inputs(held_out, model.input_shape), labels,
+                          binary=name == "gender")
+    report.update({
+        "model": keras_path,
+        "runtime": runtime,
+        "quantize": quantize or "none",
+        "path": output_path,
+        "bytes": os.path.getsize(output_path),
+        "keras_bytes": os.path.getsize(keras_path),
+        "export_seconds": time.perf_counter() - started,
+        "holdout": holdout or f"{dataset_path} (not used for calibration)",
+    })
+    with open(output_path + ".parity.json", "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the face models to a lightweight CPU runtime")
+    parser.add_argument('--runtime', choices=sorted(EXTENSIONS), default="tflite")
+    parser.add_argument('--quantize', default="", help="'', 'float16' (TFLite only) or 'int8'")
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--recognizer-holdout', help="image folder with one subfolder per person")
+    parser.add_argument('--gender-holdout', help="image folder with one subfolder per gender")
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--dataset', default=DEFAULT_DATASET_PATH)
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    args = parser.parse_args()
+
+    if args.quantize not in QUANTIZATIONS[args.runtime]:
+        parser.error(f"--quantize {args.quantize!r} is not supported for {args.runtime}")
+
+    failed = False
+    for name in args.models:
+        holdout = args.recognizer_holdout if name == "recognizer" else args.gender_holdout
+        report = export_model(name, args.runtime, args.quantize, holdout, args.samples, args.dataset)
+        print(f"{name}: {report['path']} ({report['bytes'] / 1e6:.1f} MB, Keras {report['keras_bytes'] / 1e6:.1f} MB), "
+              f"agreement {report['agreement']:.3f} on {report['samples']} samples, "
+              f"max |diff| {report['max_abs_diff']:.4f}, "
+              f"{report['reference_ms']:.1f} -> {report['exported_ms']:.1f} ms per face")
+        if "exported_accuracy" in report:
+            print(f"  accuracy: Keras {report['reference_accuracy']:.3f}, exported {report['exported_accuracy']:.3f}")
+        failed |= report["agreement"] < args.min_agreement
+
+    if failed:
+        raise SystemExit(f"Exported models agree with Keras on fewer than {args.min_agreement:.0%} of samples")
+    print(f"Set CERTICALL_MODEL_RUNTIME={args.runtime}"
+          + (f" CERTICALL_MODEL_QUANTIZATION={args.quantize}" if args.quantize else "")
+          + " to serve these models.")
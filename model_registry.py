@@ -0,0 +1,61 @@
+"""Process-wide registry of lazily loaded models.
+
+Streamlit re-executes main.py on every rerun but keeps imported modules in
+sys.modules, so objects held here are loaded once per process and shared by
+every session and rerun. Nothing is loaded until the first ``get``.
+"""
+import threading
+
+_lock = threading.RLock()
+_loaders = {}
+_instances = {}
+_warmups = {}
+
+
+def register_loader(name, loader):
+    """Declare how to build ``name``; the loader runs on first ``get``."""
+    with _lock:
+        _loaders[name] = loader
+
+
+def register(name, obj):
+    """Install an already built object, e.g. a stub model in benchmarks."""
+    with _lock:
+        _instances[name] = obj
+
+
+def get(name):
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _lock:
+        if name not in _instances:
+            if name not in _loaders:
+                raise KeyError(f"No model registered under '{name}'")
+            _instances[name] = _loaders[name]()
+        return _instances[name]
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def unload(name):
+    with _lock:
+        return _instances.pop(name, None)
+
+
+def warm_up(key, fn, background=True):
+    """Run ``fn`` once per process, optionally on a daemon thread; returns the thread or None."""
+    with _lock:
+        if key in _warmups:
+            return _warmups[key]
+        if not background:
+            _warmups[key] = None
+        else:
+            _warmups[key] = threading.Thread(target=fn, name=f"warmup-{key}", daemon=True)
+    if not background:
+        fn()
+        return None
+    _warmups[key].start()
+    return _warmups[key]
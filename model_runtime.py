@@ -0,0 +1,117 @@
+"""Loads the face models for the configured CPU runtime.
+
+CERTICALL_MODEL_RUNTIME picks ``keras`` (the original .keras files, needs
+TensorFlow), ``tflite`` or ``onnx``. The latter two load the files written
+by model_export.py and never import TensorFlow when a standalone runtime
+(ai-edge-litert / tflite-runtime, or onnxruntime) is installed. Every
+model is called like a Keras model, ``model(batch, training=False)``, and
+returns a NumPy array, so InferenceDispatcher works with any of them.
+"""
+import os
+import threading
+
+import numpy as np
+
+import config
+
+RUNTIMES = ("keras", "tflite", "onnx")
+EXTENSIONS = {"tflite": ".tflite", "onnx": ".onnx"}
+
+
+def exported_path(keras_path, runtime, quantize="", export_dir=None):
+    """Where model_export.py writes ``keras_path`` for ``runtime``/``quantize``."""
+    export_dir = export_dir or config.MODEL_EXPORT_DIR
+    stem = os.path.splitext(os.path.basename(keras_path))[0]
+    suffix = f".{quantize}" if quantize else ""
+    return os.path.join(export_dir, f"{stem}{suffix}{EXTENSIONS[runtime]}")
+
+
+def _tflite_interpreter(path, num_threads=None):
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            # Last resort; this one pulls in TensorFlow
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class TFLiteModel:
+    """A .tflite model resized to each batch size it is called with.
+
+    Quantized input/output tensors are (de)quantized here, so callers always
+    pass and get float32. The interpreter is not thread-safe, so calls are
+    serialised.
+    """
+
+    def __init__(self, path, num_threads=None):
+        self.interpreter = _tflite_interpreter(path, num_threads)
+        self.interpreter.allocate_tensors()
+        self._lock = threading.Lock()
+        self._batch = None
+        self._details()
+
+    def _details(self):
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    def _resize(self, batch_size):
+        if batch_size == self._batch:
+            return
+        shape = list(self._input["shape"])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self._input["index"], shape)
+        self.interpreter.allocate_tensors()
+        self._details()
+        self._batch = batch_size
+
+    def __call__(self, batch, training=False):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(batch.shape[0])
+            dtype = self._input["dtype"]
+            if dtype != np.float32:
+                scale, zero = self._input["quantization"]
+                info = np.iinfo(dtype)
+                batch = np.clip(np.round(batch / scale + zero), info.min, info.max).astype(dtype)
+            self.interpreter.set_tensor(self._input["index"], batch)
+            self.interpreter.invoke()
+            out = self.interpreter.get_tensor(self._output["index"])
+            if self._output["dtype"] != np.float32:
+                scale, zero = self._output["quantization"]
+                out = (out.astype(np.float32) - zero) * scale
+        return out
+
+
+class OnnxModel:
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input = self.session.get_inputs()[0].name
+
+    def __call__(self, batch, training=False):
+        return self.session.run(None, {self._input: np.asarray(batch, dtype=np.float32)})[0]
+
+
+def load_model(keras_path, runtime=None, quantize=None):
+    """Load ``keras_path`` itself or its exported counterpart for ``runtime``."""
+    runtime = runtime or config.MODEL_RUNTIME
+    quantize = config.MODEL_QUANTIZATION if quantize is None else quantize
+    if runtime == "keras":
+        from keras.models import load_model as load_keras_model
+        return load_keras_model(keras_path)
+    if runtime not in EXTENSIONS:
+        raise ValueError(f"Unknown model runtime '{runtime}' (expected one of {', '.join(RUNTIMES)})")
+
+    path = exported_path(keras_path, runtime, quantize)
+    if not os.path.exists(path):
+        flag = f" --quantize {quantize}" if quantize else ""
+        raise FileNotFoundError(f"{path} not found; create it with: python model_export.py --runtime {runtime}{flag}")
+    threads = config.MODEL_THREADS or None
+    return TFLiteModel(path, threads) if runtime == "tflite" else OnnxModel(path, threads)
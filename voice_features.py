@@ -1,25 +1,158 @@
-import librosa
+import threading
+
 import numpy as np
-import sounddevice as sd
 import scipy.io.wavfile as wav
-import tempfile
+
+import metrics
+
+ALL_FEATURES = ("mfcc", "pitch")
+
 
 def record_audio(duration=5, sr=22050):
+    """Record from the local microphone and return a mono float32 buffer (no temp files)."""
+    import sounddevice as sd
     print(f"🎙️ Recording voice for {duration} seconds...")
-    audio = sd.rec(int(duration * sr), samplerate=sr, channels=1)
+    audio = sd.rec(int(duration * sr), samplerate=sr, channels=1, dtype='float32')
     sd.wait()
-    temp_wav = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    wav.write(temp_wav.name, sr, audio)
-    return temp_wav.name
+    return audio[:, 0]
+
+
+def to_float_mono(y):
+    y = np.asarray(y)
+    if y.ndim > 1:
+        y = y.mean(axis=1)
+    if np.issubdtype(y.dtype, np.integer):
+        return y.astype(np.float32) / float(np.iinfo(y.dtype).max)
+    return y.astype(np.float32, copy=False)
+
+
+class VoiceAnalyzer:
+    """Cheap voice features from an in-memory buffer at its native sample rate.
+
+    Pitch uses the YIN difference function, evaluated for all frames at once
+    with FFT cross-correlation. Audio above ``max_rate`` is first decimated by
+    block averaging (pitch is well below 1 kHz). Frame matrices are kept
+    between calls and reused while the buffer shape stays the same, which is
+    the common case for fixed-size streaming windows. Not thread-safe; use one
+    instance per thread.
+    """
+
+    def __init__(self, fmin=65.0, fmax=500.0, hop_s=0.01, threshold=0.15, max_rate=16000):
+        self.fmin = fmin
+        self.fmax = fmax
+        self.hop_s = hop_s
+        self.threshold = threshold
+        self.max_rate = max_rate
+        self._scratch_key = None
+        self._frames = None
+
+    def _decimate(self, y, sr):
+        factor = int(sr // self.max_rate)
+        if factor <= 1:
+            return y, sr
+        n = len(y) // factor * factor
+        return y[:n].reshape(-1, factor).mean(axis=1), sr / factor
+
+    def _frame_matrix(self, y, span, hop):
+        count = (len(y) - span) // hop + 1
+        key = (count, span, hop)
+        if key != self._scratch_key:
+            self._frames = np.empty((count, span), dtype=np.float32)
+            self._scratch_key = key
+        windows = np.lib.stride_tricks.sliding_window_view(y, span)[::hop][:count]
+        np.copyto(self._frames, windows)
+        return self._frames
+
+    def pitch_track(self, y, sr):
+        """Per-frame fundamental frequency in Hz (0 for unvoiced frames)."""
+        y, sr = self._decimate(to_float_mono(y), sr)
+        tau_min = max(int(sr / self.fmax), 2)
+        tau_max = int(sr / self.fmin)
+        width = tau_max
+        span = width + tau_max
+        hop = max(int(sr * self.hop_s), 1)
+        if len(y) < span:
+            return np.zeros(0, dtype=np.float32)
+
+        frames = self._frame_matrix(y, span, hop)
+        nfft = 1 << int(np.ceil(np.log2(span + width)))
+        spectrum = np.fft.rfft(frames, nfft, axis=1)
+        head = np.fft.rfft(frames[:, :width], nfft, axis=1)
+        acf = np.fft.irfft(np.conj(head) * spectrum, nfft, axis=1)[:, :tau_max + 1]
+
+        energy = np.cumsum(np.pad(frames * frames, ((0, 0), (1, 0))), axis=1)
+        window_energy = energy[:, width:width + tau_max + 1] - energy[:, :tau_max + 1]
+        diff = window_energy[:, :1] + window_energy - 2.0 * acf
+
+        # Cumulative mean normalised difference
+        taus = np.arange(1, tau_max + 1)
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        cmnd = np.ones_like(diff)
+        np.divide(diff[:, 1:] * taus, cumulative, out=cmnd[:, 1:], where=cumulative > 0)
+
+        search = cmnd[:, tau_min:]
+        below = search < self.threshold
+        first = np.where(below.any(axis=1), below.argmax(axis=1), search.argmin(axis=1))
+        rows = np.arange(len(first))
+        # Walk down to the local minimum after the first dip below threshold
+        last = search.shape[1] - 1
+        while True:
+            step = (first < last) & (search[rows, np.minimum(first + 1, last)] < search[rows, first])
+            if not step.any():
+                break
+            first = first + step
+        voiced = search[rows, first] < self.threshold
+        tau = (first + tau_min).astype(np.float64)
+
+        # Parabolic interpolation around the chosen lag
+        inner = (tau > 1) & (tau < tau_max)
+        t = tau.astype(int)
+        left = cmnd[rows, np.clip(t - 1, 0, tau_max)]
+        centre = cmnd[rows, t]
+        right = cmnd[rows, np.clip(t + 1, 0, tau_max)]
+        denom = left - 2.0 * centre + right
+        shift = np.zeros_like(tau)
+        np.divide(left - right, 2.0 * denom, out=shift, where=inner & (np.abs(denom) > 1e-12))
+        f0 = sr / (tau + np.clip(shift, -1.0, 1.0))
+        return np.where(voiced, f0, 0.0).astype(np.float32)
+
+    def pitch(self, y, sr):
+        """Median fundamental frequency over voiced frames, or 0 if none are voiced."""
+        track = self.pitch_track(y, sr)
+        voiced = track[track > 0]
+        return float(np.median(voiced)) if voiced.size else 0.0
+
+    @metrics.timed("voice_features")
+    def features(self, y, sr, features=("pitch",)):
+        """Compute only the requested features ("pitch", "mfcc") of a mono buffer."""
+        result = {}
+        if "pitch" in features:
+            result["pitch"] = self.pitch(y, sr)
+        if "mfcc" in features:
+            import librosa
+            result["mfcc"] = librosa.feature.mfcc(y=to_float_mono(y), sr=sr, n_mfcc=13).mean(axis=1)
+        return result
+
+
+_local = threading.local()
+
+
+def _analyzer():
+    if not hasattr(_local, "analyzer"):
+        _local.analyzer = VoiceAnalyzer()
+    return _local.analyzer
+
 
-def extract_voice_features(audio_path):
-    y, sr = librosa.load(audio_path)
+def extract_voice_features_array(y, sr, features=ALL_FEATURES):
+    """Requested features of an in-memory buffer at its native sample rate."""
+    return _analyzer().features(y, sr, features)
 
-    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13).mean(axis=1)
-    pitch, _ = librosa.piptrack(y=y, sr=sr)
-    pitch_mean = pitch[pitch > 0].mean() if np.any(pitch > 0) else 0
 
-    return {
-        "mfcc": mfccs,
-        "pitch": pitch_mean
-    }
+def extract_voice_features(audio_path, features=ALL_FEATURES):
+    try:
+        sr, y = wav.read(audio_path)
+    except ValueError:
+        # Not a WAV file scipy can read; let librosa decode it at its native rate
+        import librosa
+        y, sr = librosa.load(audio_path, sr=None)
+    return extract_voice_features_array(y, sr, features)
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import numpy as np
+
+from voice_features import VoiceAnalyzer
+
+
+def audio_frame_to_mono(frame):
+    """Convert an av.AudioFrame to a mono float32 array in [-1, 1]."""
+    pcm = frame.to_ndarray()
+    channels = len(frame.layout.channels)
+    if frame.format.is_planar:
+        mono = pcm.reshape(channels, -1).mean(axis=0)
+    else:
+        mono = pcm.reshape(-1, channels).mean(axis=1)
+    if np.issubdtype(pcm.dtype, np.integer):
+        mono = mono / float(np.iinfo(pcm.dtype).max)
+    return mono.astype(np.float32, copy=False)
+
+
+class VoiceStressMonitor:
+    """Voice-stress analysis over a sliding window of the call's own audio track.
+
+    Audio callbacks ``push`` samples into a fixed-size ring buffer, which is
+    cheap and never blocks. A background thread analyses the most recent
+    ``window_s`` seconds every ``hop_s`` seconds of new audio, entirely in
+    memory. Quiet windows (below ``min_rms``) are skipped.
+    """
+
+    def __init__(self, window_s=3.0, hop_s=1.0, buffer_s=10.0, pitch_threshold=250.0,
+                 min_rms=0.01, analyze=None):
+        self.window_s = window_s
+        self.hop_s = hop_s
+        self.buffer_s = max(buffer_s, window_s)
+        self.pitch_threshold = pitch_threshold
+        self.min_rms = min_rms
+        # Pitch only, on the worker thread's own analyzer and scratch buffers
+        self.analyze = analyze or VoiceAnalyzer().features
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._sample_rate = None
+        self._ring = None
+        self._written = 0
+        self._analyzed_upto = 0
+        self._version = 0
+        self._consumed = 0
+        self.pitch = None
+        self.stressed = False
+        self.counters = {
+            "samples": 0,
+            "windows": 0,
+            "silent_windows": 0,
+            "stressed_windows": 0,
+            "analysis_seconds": 0.0,
+        }
+
+    def push(self, samples, sample_rate):
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        with self._cond:
+            if self._closed:
+                return
+            if sample_rate != self._sample_rate:
+                self._sample_rate = sample_rate
+                self._ring = np.zeros(int(self.buffer_s * sample_rate), dtype=np.float32)
+                self._written = self._analyzed_upto = 0
+            size = len(self._ring)
+            if len(samples) > size:
+                samples = samples[-size:]
+            start = self._written % size
+            first = min(len(samples), size - start)
+            self._ring[start:start + first] = samples[:first]
+            self._ring[:len(samples) - first] = samples[first:]
+            self._written += len(samples)
+            self.counters["samples"] += len(samples)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="voice-stress", daemon=True)
+                self._thread.start()
+            if self._ready():
+                self._cond.notify()
+
+    def _ready(self):
+        window = int(self.window_s * self._sample_rate)
+        hop = int(self.hop_s * self._sample_rate)
+        return self._written >= window and self._written - self._analyzed_upto >= hop
+
+    def _window(self):
+        size = len(self._ring)
+        n = int(self.window_s * self._sample_rate)
+        end = self._written % size
+        if end >= n:
+            return self._ring[end - n:end].copy()
+        return np.concatenate((self._ring[size - (n - end):], self._ring[:end]))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._sample_rate is None or not self._ready()):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                y = self._window()
+                sr = self._sample_rate
+                self._analyzed_upto = self._written
+
+            started = time.monotonic()
+            if np.sqrt(np.mean(y * y)) < self.min_rms:
+                with self._cond:
+                    self.counters["silent_windows"] += 1
+                continue
+            try:
+                pitch = float(self.analyze(y, sr)["pitch"])
+            except Exception as e:
+                print(f"Voice analysis error: {e}")
+                continue
+
+            with self._cond:
+                self.counters["windows"] += 1
+                self.counters["analysis_seconds"] += time.monotonic() - started
+                self.pitch = pitch
+                self.stressed = pitch > self.pitch_threshold
+                if self.stressed:
+                    self.counters["stressed_windows"] += 1
+                self._version += 1
+
+    def take_update(self):
+        """True once per newly analysed window."""
+        with self._cond:
+            fresh = self._version != self._consumed
+            self._consumed = self._version
+            return fresh
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.counters)
+        stats["avg_analysis_ms"] = stats.pop("analysis_seconds") / stats["windows"] * 1000 if stats["windows"] else 0.0
+        return stats
+
+    def close(self):
+        """Stop the analysis thread and drop the buffer; later calls do nothing."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+        with self._cond:
+            self._ring = None